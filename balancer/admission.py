@@ -0,0 +1,251 @@
+import asyncio
+import math
+from collections import deque
+from typing import Callable, Deque, Dict, Generic, Optional, TypeVar
+
+import metrics
+
+T = TypeVar('T')
+
+
+class AdmissionError(Exception):
+    """
+    Запрос не допущен к расчету. retry_after - через сколько секунд клиенту стоит повторить запрос.
+    """
+    retry_after: int
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class QueueFullError(AdmissionError):
+    """
+    Очередь ожидания переполнена, запрос отброшен сразу.
+    """
+
+
+class QueueTimeoutError(AdmissionError):
+    """
+    Запрос не дождался свободного слота за отведенное время.
+    """
+
+
+class AdmissionQueue(Generic[T]):
+    """Ограниченная очередь ожидания свободного воркера с честным разделением между классами трафика.
+
+    Если свободный воркер есть и очередь пуста - запрос проходит сразу. Иначе запрос
+    встает в очередь своего класса и ждет, пока балансер не разбудит его через wake_one() (освободился
+    слот или ожил воркер), но не дольше timeout секунд. Новые запросы не обгоняют ожидающих.
+    Если очередь заполнена, запрос отбрасывается сразу (QueueFullError).
+
+    Внутри класса очередь - FIFO, а между классами слоты раздаются по Deficit Round Robin: за круг класс
+    получает weight слотов (дробный вес копится между кругами), так что при weight 8 и 1 интерактивный
+    трафик получает 8 из 9 освободившихся слотов, а пакетный не голодает. Незнакомый класс считается DEFAULT_CLASS.
+
+    Attributes
+    ----------
+    DEFAULT_CLASS : str
+        Класс запросов без класса или с незнакомым классом
+    max_size : int
+        Максимальное число ожидающих запросов
+    timeout : float
+        Максимальное время ожидания в очереди в секундах
+    retry_after : float
+        Значение Retry-After для отброшенных запросов в секундах
+    admitted : int
+        Сколько запросов допущено всего
+    queued : int
+        Сколько из допущенных запросов ждали в очереди
+    rejected : int
+        Сколько запросов отброшено из-за переполнения очереди
+    timed_out : int
+        Сколько запросов не дождались слота
+    total_wait : float
+        Суммарное время ожидания допущенных запросов в секундах
+    max_wait : float
+        Максимальное время ожидания допущенного запроса в секундах
+    weights : Dict[str, float]
+        Вес класса трафика: сколько слотов он получает за круг
+    _queues : Dict[str, Deque[asyncio.Future]]
+        Ожидающие запросы по классам
+    _deficits : Dict[str, float]
+        Сколько слотов класс еще может получить в текущем круге
+    _active : Deque[str]
+        Классы с ожидающими запросами в порядке обхода, текущий - первый
+    _credited : bool
+        Получил ли текущий класс свой вес на этом ходу
+    _depth : int
+        Число ожидающих запросов во всех классах
+
+    Methods
+    -------
+    admit(self, select: Callable[[], Optional[T]], traffic_class: Optional[str] = None) -> T
+        Дождаться, пока select() вернет воркера, и вернуть его.
+    depth_of(self, traffic_class: str) -> int
+        Число ожидающих запросов класса.
+    wake_one(self) -> None
+        Разбудить следующего ожидающего по Deficit Round Robin.
+    """
+    DEFAULT_CLASS: str = "default"
+
+    max_size: int
+    timeout: float
+    retry_after: float
+    admitted: int
+    queued: int
+    rejected: int
+    timed_out: int
+    total_wait: float
+    max_wait: float
+    weights: Dict[str, float]
+    _queues: Dict[str, Deque[asyncio.Future]]
+    _deficits: Dict[str, float]
+    _active: Deque[str]
+    _credited: bool
+    _depth: int
+
+    def __init__(self, max_size: int, timeout: float, retry_after: float, weights: Optional[Dict[str, float]] = None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.weights = {self.DEFAULT_CLASS: 1.0}
+        self.weights.update(weights or {})
+        self._queues = {name: deque() for name in self.weights}
+        self._deficits = {name: 0.0 for name in self.weights}
+        self._active = deque()
+        self._credited = False
+        self._depth = 0
+
+    @property
+    def depth(self) -> int:
+        """
+        Текущее число ожидающих запросов.
+
+        :return: int
+        """
+        return self._depth
+
+    def depth_of(self, traffic_class: str) -> int:
+        """
+        Текущее число ожидающих запросов класса.
+
+        :param traffic_class: str, класс трафика.
+        :return: int
+        """
+        queue = self._queues.get(traffic_class)
+        return 0 if queue is None else len(queue)
+
+    async def admit(self, select: Callable[[], Optional[T]], traffic_class: Optional[str] = None) -> T:
+        """
+        Дождаться, пока select() вернет воркера, и вернуть его. select() вызывается синхронно,
+        поэтому между выбором воркера и его занятием вызывающим кодом другие запросы не вклиниваются.
+
+        :param select: Callable[[], Optional[T]], выбор воркера, None - если свободных нет.
+        :param traffic_class: Optional[str], класс трафика (см. weights), None или незнакомый - DEFAULT_CLASS.
+        :return: T, выбранный воркер.
+        """
+        if traffic_class not in self._queues:
+            traffic_class = self.DEFAULT_CLASS
+        if not self._depth:
+            item = select()
+            if item is not None:
+                self.admitted += 1
+                metrics.QUEUE_WAIT.observe(0.0, traffic_class)
+                return item
+        if self._depth >= self.max_size:
+            self.rejected += 1
+            raise QueueFullError("Admission queue is full!", self.retry_after)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.timeout
+        first_attempt = True
+        while True:
+            waiter = loop.create_future()
+            self._enqueue(traffic_class, waiter, first_attempt)
+            first_attempt = False
+            try:
+                await asyncio.wait_for(waiter, deadline - loop.time())
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise QueueTimeoutError("Timed out waiting for a free worker!", self.retry_after)
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Нас уже разбудили, но клиент ушел - передаем сигнал следующему.
+                    self.wake_one()
+                raise
+            finally:
+                queue = self._queues[traffic_class]
+                if waiter in queue:
+                    queue.remove(waiter)
+                    self._depth -= 1
+
+            item = select()
+            if item is not None:
+                wait = loop.time() - started
+                self.admitted += 1
+                self.queued += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                metrics.QUEUE_WAIT.observe(wait, traffic_class)
+                if self._depth:
+                    # Свободных слотов могло стать больше одного - будим следующего по цепочке.
+                    self.wake_one()
+                return item
+
+    def wake_one(self) -> None:
+        """
+        Разбудить следующего ожидающего по Deficit Round Robin. Ничего не делает, если очередь пуста.
+
+        :return: None
+        """
+        while self._active:
+            traffic_class = self._active[0]
+            queue = self._queues[traffic_class]
+            if not queue:
+                self._active.popleft()
+                self._deficits[traffic_class] = 0.0
+                self._credited = False
+                continue
+            if not self._credited:
+                # Ход класса начался: добавляем ему квант.
+                self._deficits[traffic_class] += self.weights[traffic_class]
+                self._credited = True
+            if self._deficits[traffic_class] < 1:
+                self._active.rotate(-1)
+                self._credited = False
+                continue
+            waiter = queue.popleft()
+            self._depth -= 1
+            if waiter.done():
+                continue
+            self._deficits[traffic_class] -= 1
+            waiter.set_result(None)
+            return
+
+    def _enqueue(self, traffic_class: str, waiter: asyncio.Future, first_attempt: bool) -> None:
+        """
+        Поставить запрос в очередь его класса.
+
+        :param traffic_class: str, класс трафика.
+        :param waiter: asyncio.Future, сигнал пробуждения запроса.
+        :param first_attempt: bool, False - запрос разбудили зря (слот успел занять кто-то другой): он возвращается
+            в начало очереди класса, а потраченный на него слот возвращается классу.
+        :return: None
+        """
+        queue = self._queues[traffic_class]
+        if first_attempt:
+            queue.append(waiter)
+        else:
+            queue.appendleft(waiter)
+            self._deficits[traffic_class] += 1
+        self._depth += 1
+        if traffic_class not in self._active:
+            self._active.append(traffic_class)
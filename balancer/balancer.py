@@ -1,11 +1,75 @@
 import asyncio
-import json
-from typing import List, Optional, Sequence
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Mapping, Optional, Tuple, TypeVar
 import aiohttp
+import xml.etree.ElementTree as ElementTree
 from aiohttp import ClientConnectionError
 
-from models import TaskRequest, WorkerStatus, Task
-from config import BalancerConfig, WorkerConfig
+from models import TaskRequest, WorkerStatus, Task, TaskStatus
+from admission import AdmissionQueue, AdmissionError
+from breaker import BreakerState, CircuitBreaker, EjectionLimit
+from cache import ResultCache
+from config import (BalancerConfig, WorkerConfig, ConnectionPoolConfig, AdmissionConfig, TasksConfig, CacheConfig,
+                    RetryConfig, OutlierDetectionConfig, ProxyConfig, AffinityConfig, HedgingConfig, RateLimitConfig,
+                    ReplicationConfig)
+import codec
+import metrics
+from gossip import Gossip, WorkerState
+from hash_ring import HashRing
+from latency import LatencyWindow, PeakEwma
+from load_index import LoadIndex
+from profiling import ConnectTiming, LoopLagMonitor, connection_trace
+from rate_limit import RateLimiter, RateLimitedError
+from retry import RetryBudget
+from routing import TaskRoutes
+from shared import SharedState
+from strategies import Strategy, LeastConnectionsStrategy, strategy_from_name
+
+formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s')
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.DEBUG)
+handler.setFormatter(formatter)
+logger = logging.getLogger("Balancer")
+logger.setLevel(logging.DEBUG)
+logger.addHandler(handler)
+
+T = TypeVar('T')
+# Сколько секунд осталось у запроса до дедлайна: принимается от клиента и передается воркеру.
+TIMEOUT_HEADER = "X-Request-Timeout"
+# Нагрузка воркера в ответе /compute (см. worker.Worker.load_headers).
+ACTIVE_HEADER = "X-Worker-Active"
+QUEUED_HEADER = "X-Worker-Queued"
+CAPACITY_HEADER = "X-Worker-Capacity"
+# Ключ привязки запроса к воркеру (см. AffinityConfig), по умолчанию - payload.
+ROUTING_KEY_HEADER = "X-Routing-Key"
+# Класс трафика (см. AdmissionQueue) и тенант для лимитов запросов (см. RateLimiter).
+PRIORITY_HEADER = "X-Priority"
+TENANT_HEADER = "X-Tenant"
+
+
+class WorkerUnavailableError(Exception):
+    """
+    Не удалось соединиться с воркером (или соединение оборвалось). Запрос можно повторить на другом воркере.
+    """
+
+
+class DeadlineExceededError(Exception):
+    """
+    Дедлайн запроса истек: воркер прервал расчет по X-Request-Timeout или время вышло до отправки воркеру.
+    """
+
+
+class TaskNotFoundError(Exception):
+    """
+    Балансер не отправлял таску с таким идентификатором (в несколько процессов - ее нет ни на одном живом воркере).
+    """
 
 
 class Worker:
@@ -22,60 +86,565 @@ class Worker:
     _HEALTHCHECK_TIMEOUT: int
         Таймаут для проверки состояния воркера. Если воркер не отвечает в течение заданного времени -
         выставляем ему статус DEAD
+    _REQUEST_TIMEOUT: int
+        Таймаут для коротких запросов к воркеру (отправка асинхронной таски, получение таски без ожидания)
+    _DEADLINE_GRACE: float
+        Насколько таймаут ожидания ответа больше дедлайна, переданного воркеру в X-Request-Timeout:
+        воркер должен успеть сам прервать расчет и ответить 504
     address : str
         Адрес endpoint'а
     number_of_connections : int
-        Число единовременных подключений к воркеру
+        Число единовременных подключений к воркеру (по всем процессам балансера, см. shared)
+    local_connections : int
+        Число единовременных подключений к воркеру из этого процесса балансера
+    peer_connections : int
+        Число подключений к воркеру других реплик балансера (по данным gossip, см. gossip.py)
+    external_load : int
+        Сколько тасок воркера пришло не от балансеров (напрямую или от балансеров вне gossip): оценка по нагрузке,
+        которую воркер сообщает в ответах /compute и /status, за вычетом подключений наших и других реплик
+    reported_capacity : int
+        Сколько тасок воркер считает одновременно по его же словам, 0 - без ограничений или неизвестно
+    max_connections : int
+        Максимальное число единовременных подключений к воркеру, 0 - без ограничений
+    weight : float
+        Вес воркера для взвешенных стратегий (больше - мощнее воркер)
+    latency : PeakEwma
+        Оценка времени ответа /compute воркера
+    last_status : WorkerStatus
+        Последний известный статус воркера (кэш результата status()). До первой проверки - DEAD
+    last_checked : Optional[float]
+        Время последней проверки состояния (time.monotonic()), None - если проверок еще не было
+    status_updated : Optional[float]
+        Когда (time.monotonic()) получен last_status: проверкой, неудачной пересылкой или от другой реплики,
+        None - статуса еще нет
+    breaker : CircuitBreaker
+        Автомат отключения воркера по ошибкам и выбросам задержки (по умолчанию - никогда не размыкается)
+    draining : bool
+        Воркер выводится из пула: новые запросы ему не отправляются, текущие досчитываются
+    registered_until : Optional[float]
+        До какого момента (time.monotonic()) действует регистрация воркера через /register,
+        None - воркер из config.xml
+    shared : Optional[SharedState]
+        Общее состояние процессов балансера, None - балансер работает в одном процессе
+    shared_slot : Optional[int]
+        Слот воркера в общем состоянии
     protocol : str
         По умолчанию - http://
+    session : Optional[aiohttp.ClientSession]
+        Общий пул соединений для пересылки задач. Выдается балансером в Balancer.start()
+    healthcheck_session : Optional[aiohttp.ClientSession]
+        Отдельный пул соединений для проверок состояния, чтобы хелсчеки не ждали освобождения
+        соединений, занятых долгими расчетами. Выдается балансером в Balancer.start()
+    on_state_changed : Optional[Callable[[Worker], None]]
+        Вызывается при изменении number_of_connections или last_status (балансер обновляет индекс загруженности)
 
     Methods
     -------
-    compute(self, task_request: TaskRequest) -> Optional[Task]
+    compute(self, task_request: TaskRequest, timeout: Optional[float] = None) -> Optional[Task]
         Переслать task_request на расчет. Вернет Task в случае успеха, None
         в случае ошибки или таймаута. Вызов этого метода мы считаем за активное подключение!
     status(self) -> WorkerStatus
         Возвращает статус воркера, отсылая запрос к соответствующему endpoint.
         В случае возврата со стороны endpoint BUSY и IDLE возвращает их же, иначе -
         DEAD(как и в случае отсутствия ответа).
+    compute_batch(self, items: List[Tuple[int, TaskRequest]]) -> AsyncIterator[Tuple[int, Optional[Task]]]
+        Переслать пакет запросов одним вызовом и отдавать таски по мере готовности.
+        Слоты под запросы занимаются заранее через acquire().
+    acquire(self) -> None
+        Занять слот под задачу, которая будет отправлена позже.
+    submit(self, task_request: TaskRequest) -> Optional[Task]
+        Отправить task_request на асинхронный расчет. Таска остается учтенной в number_of_connections
+        до вызова release().
+    release(self) -> None
+        Освободить слот, занятый через acquire() или асинхронной таской из submit().
+    get_task(self, task_uuid: str, wait: float = 0) -> Optional[Task]
+        Получить таску с воркера, дождавшись окончания расчета, но не дольше wait секунд.
+    check(self, min_age: float = 0) -> WorkerStatus
+        Проверяет состояние воркера через status() и кэширует результат в last_status.
+    sync_shared(self) -> bool
+        Подтягивает число подключений и статус воркера из общего состояния процессов балансера.
+    apply_peer_state(self, connections: int, status: Optional[Tuple[WorkerStatus, float]]) -> None
+        Учитывает подключения к воркеру других реплик балансера и их более свежий статус воркера.
+    mark_suspect(self) -> None
+        Помечает воркера как DEAD до следующей проверки состояния.
+    has_capacity(self) -> bool
+        Можно ли отправить воркеру еще одну задачу, не превысив max_connections.
     from_config(config: WorkerConfig) -> Worker
         Создает воркера с конфигурацией, указанной в экземпляре WorkerConfig.
     """
     _TIMEOUT: int = 50
     _HEALTHCHECK_TIMEOUT: int = 1
+    _REQUEST_TIMEOUT: int = 5
+    _DEADLINE_GRACE: float = 0.5
     address: str
     number_of_connections: int
+    local_connections: int
+    peer_connections: int
+    external_load: int
+    reported_capacity: int
+    max_connections: int
+    weight: float
+    latency: PeakEwma
+    last_status: WorkerStatus
+    last_checked: Optional[float]
+    status_updated: Optional[float]
+    breaker: CircuitBreaker
+    draining: bool
+    registered_until: Optional[float]
+    shared: Optional[SharedState]
+    shared_slot: Optional[int]
     protocol: str = "http://"  # noqa
+    session: Optional[aiohttp.ClientSession]
+    healthcheck_session: Optional[aiohttp.ClientSession]
+    on_state_changed: Optional[Callable[['Worker'], None]]
 
-    def __init__(self, address: str):
+    def __init__(self,
+                 address: str,
+                 weight: float = WorkerConfig.DEFAULT_WEIGHT,
+                 max_connections: int = WorkerConfig.DEFAULT_MAX_CONNECTIONS):
         self.address = address
         self.number_of_connections = 0
+        self.local_connections = 0
+        self.peer_connections = 0
+        self.external_load = 0
+        self.reported_capacity = 0
+        self.max_connections = max_connections
+        self.weight = weight
+        self.latency = PeakEwma()
+        self.last_status = WorkerStatus.DEAD
+        self.last_checked = None
+        self.status_updated = None
+        self.breaker = CircuitBreaker()
+        self.draining = False
+        self.registered_until = None
+        self.shared = None
+        self.shared_slot = None
+        self.session = None
+        self.healthcheck_session = None
+        self.on_state_changed = None
+
+    @property
+    def is_alive(self) -> bool:
+        """
+        Жив ли воркер по результатам последней проверки. Сетевых запросов не делает.
+
+        :return: bool
+        """
+        return self.last_status != WorkerStatus.DEAD
+
+    @property
+    def total_connections(self) -> int:
+        """
+        Подключения к воркеру всех реплик балансера: наши и других реплик (peer_connections).
 
-    async def compute(self, task_request: TaskRequest) -> Optional[Task]:
+        :return: int
+        """
+        return self.number_of_connections + self.peer_connections
+
+    @property
+    def load(self) -> int:
+        """
+        Полная загруженность воркера, по которой его выбирают стратегии: подключения всех реплик балансера
+        и таски, пришедшие к воркеру не от них (external_load).
+
+        :return: int
+        """
+        return self.total_connections + self.external_load
+
+    @property
+    def has_capacity(self) -> bool:
+        """
+        Можно ли отправить воркеру еще одну задачу, не превысив max_connections (на все реплики балансера)
+        и с учетом автомата отключения (отключен, пробный запрос, медленный старт).
+
+        :return: bool
+        """
+        if 0 < self.max_connections <= self.total_connections:
+            return False
+        return self.breaker.allows(self.total_connections, time.monotonic())
+
+    async def compute(self, task_request: TaskRequest, timeout: Optional[float] = None) -> Optional[Task]:
         """
         Переслать task_request на расчет. Вернет Task в случае успеха, None
         в случае ошибки или таймаута. Вызов этого метода мы считаем за активное подключение!
 
         :param task_request: TaskRequest, исходные данные для расчета.
+        :param timeout: Optional[float], таймаут расчета в секундах, None - _TIMEOUT.
         :return: экземпляр Task в случае успешного расчета, None - в случае таймаута или ошибки со стороны Worker
+        :raises WorkerUnavailableError: если не удалось соединиться с воркером или соединение оборвалось.
+        :raises DeadlineExceededError: если воркер прервал расчет по дедлайну.
         """
-        self.number_of_connections += 1
-        result: Optional[Task] = None
+        started = time.monotonic()
+        body = codec.dumps(task_request.dict())
+        metrics.DISPATCH_PHASE.observe(time.monotonic() - started, "serialize")
+        response = await self.compute_raw(body, timeout)
+        if response is None or response[0] != 200:
+            return None
+        started = time.monotonic()
+        task = Task.parse_obj(codec.loads(response[1]))
+        metrics.DISPATCH_PHASE.observe(time.monotonic() - started, "serialize")
+        return task
+
+    async def compute_raw(self, body: bytes, timeout: Optional[float] = None) -> Optional[Tuple[int, bytes]]:
+        """
+        Переслать на расчет тело запроса как есть и вернуть тело ответа как есть, не разбирая JSON.
+        Ответы 4xx (воркер не принял запрос) считаются ошибкой клиента, а не воркера, и возвращаются вызывающему.
+        Таймаут передается воркеру в X-Request-Timeout: по его истечении воркер сам прерывает расчет и отвечает 504,
+        что не считается отказом воркера. Если вызов отменен (клиент ушел), соединение с воркером закрывается,
+        и воркер тоже прерывает расчет.
+
+        :param body: bytes, JSON запроса на расчет.
+        :param timeout: Optional[float], таймаут расчета в секундах, None - _TIMEOUT.
+        :return: Optional[Tuple[int, bytes]], код и тело ответа воркера: 200 - в случае успешного расчета,
+            4xx - если воркер отклонил запрос; None - в случае таймаута или ошибки со стороны Worker
+        :raises WorkerUnavailableError: если не удалось соединиться с воркером или соединение оборвалось.
+        :raises DeadlineExceededError: если воркер прервал расчет по дедлайну.
+        """
+        if self.session is None:
+            return None
+        if timeout is None:
+            timeout = self._TIMEOUT
+        self._add_connections(1)
+        result: Optional[Tuple[int, bytes]] = None
+        reported: Optional[Tuple[int, int, int]] = None
+        unavailable = False
+        expired = False
+        connect = ConnectTiming()
+        started = time.monotonic()
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self._TIMEOUT)) as client:
-                async with client.post(f"{self.protocol}{self.address}/compute",
-                                       json=json.loads(task_request.json())) as response:
+            async with self.session.post(f"{self.protocol}{self.address}/compute",
+                                         data=body,
+                                         headers={"Content-Type": "application/json",
+                                                  TIMEOUT_HEADER: f"{timeout:.3f}"},
+                                         timeout=aiohttp.ClientTimeout(total=timeout + self._DEADLINE_GRACE),
+                                         trace_request_ctx=connect) as response:
+                reported = self._parse_load(response.headers)
+                if response.status == 200:
+                    result = response.status, await response.read()
+                    elapsed = time.monotonic() - started
+                    metrics.DISPATCH_PHASE.observe(connect.seconds, "connect")
+                    metrics.DISPATCH_PHASE.observe(elapsed - connect.seconds, "upstream")
+                    self._dispatch_succeeded()
+                    self.latency.observe(elapsed)
+                    metrics.DISPATCH_LATENCY.observe(elapsed, self.address, "compute")
+                elif 400 <= response.status < 500:
+                    result = response.status, await response.read()
+                elif response.status == 504:
+                    metrics.DISPATCH_ERRORS.inc(self.address, "compute", "deadline")
+                    expired = True
+                else:
+                    self._dispatch_failed("compute", "bad_status")
+        except ClientConnectionError:
+            self._dispatch_failed("compute", "connection_error")
+            self.mark_suspect()
+            unavailable = True
+        except asyncio.TimeoutError:
+            self._dispatch_failed("compute", "timeout")
+        finally:
+            self._add_connections(-1)
+        if reported is not None:
+            self._report_load(*reported)
+        if unavailable:
+            raise WorkerUnavailableError(f"Worker {self.address} is unavailable!")
+        if expired:
+            raise DeadlineExceededError(f"Deadline exceeded on worker {self.address}!")
+        return result
+
+    async def compute_batch(self,
+                            items: List[Tuple[int, TaskRequest]]) -> AsyncIterator[Tuple[int, Optional[Task]]]:
+        """
+        Переслать пакет запросов одним вызовом /compute/batch и отдавать таски по мере готовности (NDJSON).
+        Перед вызовом на каждый запрос должен быть занят слот через acquire(): слоты освобождаются по одному
+        по мере получения результатов, а оставшиеся - при ошибке или досрочном закрытии генератора.
+
+        :param items: List[Tuple[int, TaskRequest]], пары (индекс запроса в исходном пакете, запрос).
+        :return: AsyncIterator[Tuple[int, Optional[Task]]], пары (индекс, Task),
+            для неудавшихся запросов - (индекс, None)
+        """
+        remaining = dict(items)
+        try:
+            if self.session is None:
+                return
+            started = time.monotonic()
+            try:
+                async with self.session.post(f"{self.protocol}{self.address}/compute/batch",
+                                             data=codec.dumps([task_request.dict() for _, task_request in items]),
+                                             headers={"Content-Type": "application/json"},
+                                             timeout=aiohttp.ClientTimeout(total=self._TIMEOUT)) as response:
                     if response.status == 200:
-                        response_json = await response.json()
-                        result = Task(**response_json)
+                        async for line in response.content:
+                            if not line.strip():
+                                continue
+                            response_json = codec.loads(line)
+                            index = items[response_json["index"]][0]
+                            task = Task.parse_obj(response_json["task"])
+                            elapsed = time.monotonic() - started
+                            self._dispatch_succeeded()
+                            self.latency.observe(elapsed)
+                            metrics.DISPATCH_LATENCY.observe(elapsed, self.address, "compute_batch")
+                            del remaining[index]
+                            self.release()
+                            yield index, task
+                    else:
+                        self._dispatch_failed("compute_batch", "bad_status")
+            except ClientConnectionError:
+                self._dispatch_failed("compute_batch", "connection_error")
+                self.mark_suspect()
+            except asyncio.TimeoutError:
+                self._dispatch_failed("compute_batch", "timeout")
+            except ValueError:
+                self._dispatch_failed("compute_batch", "bad_response")
+                logger.exception(f"Worker {self.address} returned malformed batch response.")
+            for index in list(remaining):
+                del remaining[index]
+                self.release()
+                yield index, None
+        finally:
+            for _ in remaining:
+                self.release()
+
+    def acquire(self) -> None:
+        """
+        Занять слот под задачу, которая будет отправлена позже (см. compute_batch).
+
+        :return: None
+        """
+        self._add_connections(1)
+
+    async def submit(self, task_request: TaskRequest) -> Optional[Task]:
+        """
+        Отправить task_request на асинхронный расчет. Воркер отвечает сразу, не дожидаясь расчета.
+        В случае успеха таска остается учтенной в number_of_connections до вызова release().
+
+        :param task_request: TaskRequest, исходные данные для расчета.
+        :return: экземпляр Task (еще не посчитанный) в случае успеха, None - в случае таймаута или ошибки
+        """
+        if self.session is None:
+            return None
+        self._add_connections(1)
+        result: Optional[Task] = None
+        started = time.monotonic()
+        try:
+            async with self.session.post(f"{self.protocol}{self.address}/tasks",
+                                         data=codec.dumps(task_request.dict()),
+                                         headers={"Content-Type": "application/json"},
+                                         timeout=aiohttp.ClientTimeout(total=self._REQUEST_TIMEOUT)) as response:
+                if response.status == 202:
+                    result = Task.parse_obj(codec.loads(await response.read()))
+                    self._dispatch_succeeded()
+                    metrics.DISPATCH_LATENCY.observe(time.monotonic() - started, self.address, "submit")
+                else:
+                    self._dispatch_failed("submit", "bad_status")
         except ClientConnectionError:
-            pass  # noqa
+            self._dispatch_failed("submit", "connection_error")
+            self.mark_suspect()
         except asyncio.TimeoutError:
-            pass  # noqa
+            self._dispatch_failed("submit", "timeout")
         finally:
-            self.number_of_connections -= 1
+            if result is None:
+                self._add_connections(-1)
             return result
 
+    def release(self) -> None:
+        """
+        Освободить слот, занятый через acquire() или асинхронной таской из submit().
+
+        :return: None
+        """
+        self._add_connections(-1)
+
+    async def get_task(self, task_uuid: str, wait: float = 0) -> Optional[Task]:
+        """
+        Получить таску с воркера, дождавшись окончания расчета, но не дольше wait секунд (long-poll).
+
+        :param task_uuid: str, идентификатор таски.
+        :param wait: float, сколько секунд ждать окончания расчета, 0 - не ждать.
+        :return: экземпляр Task, None - если таски нет, воркер недоступен или не ответил вовремя
+        """
+        if self.session is None:
+            return None
+        try:
+            async with self.session.get(f"{self.protocol}{self.address}/tasks/{task_uuid}",
+                                        params={"wait": wait},
+                                        timeout=aiohttp.ClientTimeout(
+                                            total=wait + self._REQUEST_TIMEOUT)) as response:
+                if response.status == 200:
+                    return Task.parse_obj(codec.loads(await response.read()))
+            return None
+        except ClientConnectionError:
+            return None
+        except asyncio.TimeoutError:
+            return None
+
+    def _dispatch_succeeded(self) -> None:
+        """
+        Учитывает успешный вызов воркера в автомате отключения. Если это был пробный запрос,
+        воркер возвращается в ротацию, а старая оценка задержки сбрасывается.
+
+        :return: None
+        """
+        if self.breaker.record_success(time.monotonic()):
+            logger.info(f"Worker {self.address} is back in rotation.")
+            self.latency = PeakEwma(decay=self.latency.decay)
+            self._notify_state_changed()
+
+    def _dispatch_failed(self, endpoint: str, reason: str) -> None:
+        """
+        Учитывает неудачный вызов воркера в метриках, логах и автомате отключения.
+
+        :param endpoint: str, какой endpoint воркера вызывали.
+        :param reason: str, причина: connection_error, timeout, bad_status или bad_response.
+        :return: None
+        """
+        metrics.DISPATCH_ERRORS.inc(self.address, endpoint, reason)
+        logger.warning(f"Call to {endpoint} of worker {self.address} failed: {reason}.")
+        if self.breaker.record_failure(time.monotonic()):
+            logger.warning(f"Worker {self.address} ejected for {self.breaker.consecutive_failures} "
+                           f"consecutive failures.")
+            self._notify_state_changed()
+
+    def _add_connections(self, delta: int) -> None:
+        """
+        Изменяет число подключений и сообщает об этом балансеру. Если балансер запущен в несколько процессов,
+        number_of_connections становится общим числом подключений к воркеру по всем процессам.
+
+        :param delta: int, на сколько изменить число подключений.
+        :return: None
+        """
+        self.local_connections += delta
+        if self.shared is None:
+            self.number_of_connections = self.local_connections
+        else:
+            self.number_of_connections = self.shared.add_connections(self.shared_slot, delta)
+        self._notify_state_changed()
+
+    @staticmethod
+    def _parse_load(headers: Mapping[str, str]) -> Optional[Tuple[int, int, int]]:
+        """
+        Разбирает нагрузку воркера из заголовков ответа /compute.
+
+        :param headers: Mapping[str, str], заголовки ответа.
+        :return: Optional[Tuple[int, int, int]], (таски в расчете, в очереди, емкость), None - если заголовков нет.
+        """
+        active = headers.get(ACTIVE_HEADER)
+        if active is None:
+            return None
+        try:
+            return int(active), int(headers.get(QUEUED_HEADER, 0)), int(headers.get(CAPACITY_HEADER, 0))
+        except ValueError:
+            return None
+
+    def _report_load(self, active: int, queued: int, capacity: int) -> None:
+        """
+        Учитывает нагрузку, которую сообщил воркер: все, что сверх подключений реплик балансера, - чужие таски
+        (external_load).
+        Сообщает балансеру, если оценка изменилась.
+
+        :param active: int, сколько тасок воркер сейчас считает.
+        :param queued: int, сколько тасок ждут у воркера свободного слота.
+        :param capacity: int, сколько тасок воркер считает одновременно, 0 - без ограничений.
+        :return: None
+        """
+        self.reported_capacity = capacity
+        external_load = max(0, active + queued - self.total_connections)
+        if external_load != self.external_load:
+            self.external_load = external_load
+            self._notify_state_changed()
+
+    def attach_shared(self, shared: SharedState) -> None:
+        """
+        Подключает воркера к общему состоянию процессов балансера.
+
+        :param shared: SharedState, общее состояние.
+        :return: None
+        """
+        self.shared_slot = shared.attach(self.address)
+        self.shared = shared
+        self.number_of_connections = shared.connections(self.shared_slot)
+
+    def detach_shared(self) -> None:
+        """
+        Отключает воркера от общего состояния процессов балансера.
+
+        :return: None
+        """
+        if self.shared is None:
+            return
+        self.shared.detach(self.shared_slot)
+        self.shared = None
+        self.shared_slot = None
+
+    def sync_shared(self) -> bool:
+        """
+        Подтягивает из общего состояния число подключений к воркеру других процессов балансера
+        (и других реплик, если их узнал процесс 0) и статус воркера, если его поменял другой процесс.
+        Сообщает балансеру, только если что-то изменилось.
+
+        :return: bool, True - если что-то изменилось.
+        """
+        if self.shared is None:
+            return False
+        connections = self.shared.connections(self.shared_slot)
+        peer_connections = self.shared.peer_connections(self.shared_slot)
+        status, _ = self.shared.status(self.shared_slot)
+        if (connections == self.number_of_connections and peer_connections == self.peer_connections
+                and status == self.last_status):
+            return False
+        self.number_of_connections = connections
+        self.peer_connections = peer_connections
+        self._set_status(status)
+        self._notify_state_changed()
+        return True
+
+    def apply_peer_state(self, connections: int, status: Optional[Tuple[WorkerStatus, float]]) -> None:
+        """
+        Учитывает состояние воркера по данным других реплик балансера (см. gossip.py): их подключения к воркеру
+        и статус, если он новее нашего (другая реплика проверила воркера позже или не смогла до него достучаться).
+        Сообщает балансеру, только если что-то изменилось.
+
+        :param connections: int, число подключений к воркеру других реплик.
+        :param status: Optional[Tuple[WorkerStatus, float]], самый свежий статус по данным реплик и когда
+            (time.monotonic()) он получен, None - реплики о воркере не сообщали.
+        :return: None
+        """
+        changed = connections != self.peer_connections
+        self.peer_connections = connections
+        if self.shared is not None:
+            self.shared.set_peer_connections(self.shared_slot, connections)
+        if status is not None and status[0] != self.last_status and (
+                self.status_updated is None or status[1] > self.status_updated):
+            if status[0] == WorkerStatus.DEAD:
+                logger.warning(f"Worker {self.address} reported DEAD by another balancer replica.")
+            self._set_status(status[0])
+            self.status_updated = status[1]
+            if self.shared is not None:
+                self.shared.set_status(self.shared_slot, self.last_status)
+            changed = True
+        if changed:
+            self._notify_state_changed()
+
+    def _set_status(self, status: WorkerStatus) -> None:
+        """
+        Обновляет last_status. Если воркер вернулся (например, после перезапуска), начинает медленный старт,
+        чтобы не завалить его запросами сразу.
+
+        :param status: WorkerStatus, новый статус.
+        :return: None
+        """
+        was_alive = self.is_alive
+        self.last_status = status
+        if self.last_checked is not None and not was_alive and self.is_alive:
+            self.breaker.start_slow_start(time.monotonic())
+
+    def _notify_state_changed(self) -> None:
+        """
+        Вызывает on_state_changed, если он задан.
+
+        :return: None
+        """
+        if self.on_state_changed is not None:
+            self.on_state_changed(self)
+
     async def status(self) -> WorkerStatus:
         """
         Возвращает статус воркера, отсылая запрос к соответствующему endpoint.
@@ -84,18 +653,90 @@ class Worker:
 
         :return: статус воркера (WorkerStatus).
         """
+        if self.healthcheck_session is None:
+            return WorkerStatus.DEAD
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self._HEALTHCHECK_TIMEOUT)) as client:
-                async with client.get(f"{self.protocol}{self.address}/status") as response:
-                    if response.status == 200:
-                        response_json = await response.json()
-                        return WorkerStatus(response_json["status"])
+            async with self.healthcheck_session.get(f"{self.protocol}{self.address}/status",
+                                                    timeout=aiohttp.ClientTimeout(
+                                                        total=self._HEALTHCHECK_TIMEOUT)) as response:
+                if response.status == 200:
+                    response_json = await response.json()
+                    if "active" in response_json:
+                        self._report_load(int(response_json["active"]), int(response_json.get("queued", 0)),
+                                          int(response_json.get("capacity", 0)))
+                    return WorkerStatus(response_json["status"])
             return WorkerStatus.DEAD
         except ClientConnectionError:
             return WorkerStatus.DEAD
         except asyncio.TimeoutError:
             return WorkerStatus.DEAD
 
+    async def check(self, min_age: float = 0) -> WorkerStatus:
+        """
+        Проверяет состояние воркера через status() и кэширует результат в last_status.
+        Если балансер запущен в несколько процессов, воркера проверяет один из них: если другой процесс
+        проверял воркера меньше min_age секунд назад, берется его результат.
+
+        :param min_age: float, через сколько секунд после проверки другим процессом проверять снова.
+        :return: статус воркера (WorkerStatus).
+        """
+        started = time.monotonic()
+        if self.shared is not None and not self.shared.claim_check(self.shared_slot, time.monotonic_ns(),
+                                                                   int(min_age * 1e9)):
+            self.number_of_connections = self.shared.connections(self.shared_slot)
+            self._set_status(self.shared.status(self.shared_slot)[0])
+            self.last_checked = self.status_updated = time.monotonic()
+            self._notify_state_changed()
+            return self.last_status
+        self._set_status(await self.status())
+        if self.shared is not None:
+            self.shared.set_status(self.shared_slot, self.last_status)
+            self.number_of_connections = self.shared.connections(self.shared_slot)
+        self.last_checked = self.status_updated = time.monotonic()
+        metrics.HEALTHCHECK_LATENCY.observe(self.last_checked - started, self.address)
+        if self.last_status == WorkerStatus.DEAD:
+            metrics.HEALTHCHECK_FAILURES.inc(self.address)
+        self._notify_state_changed()
+        return self.last_status
+
+    def eject(self, reason: str) -> bool:
+        """
+        Исключает воркера из ротации через автомат отключения (если позволяет общий лимит отключений).
+
+        :param reason: str, причина (для логов).
+        :return: bool, True - если воркер исключен.
+        """
+        if not self.breaker.eject(time.monotonic()):
+            return False
+        logger.warning(f"Worker {self.address} ejected: {reason}.")
+        self._notify_state_changed()
+        return True
+
+    def tick(self) -> None:
+        """
+        Обрабатывает течение времени в автомате отключения: по окончании отключения пускает пробный запрос,
+        во время медленного старта - поднимает лимит одновременных запросов.
+
+        :return: None
+        """
+        if self.breaker.tick(time.monotonic()):
+            self._notify_state_changed()
+
+    def mark_suspect(self) -> None:
+        """
+        Помечает воркера как DEAD до следующей проверки состояния. Вызывается, когда
+        не удалось переслать воркеру запрос, чтобы не ждать очередного хелсчека.
+
+        :return: None
+        """
+        if self.last_status != WorkerStatus.DEAD:
+            logger.warning(f"Worker {self.address} marked as suspect after failed dispatch.")
+        self.last_status = WorkerStatus.DEAD
+        self.status_updated = time.monotonic()
+        if self.shared is not None:
+            self.shared.set_status(self.shared_slot, WorkerStatus.DEAD)
+        self._notify_state_changed()
+
     @staticmethod
     def from_config(config: WorkerConfig) -> 'Worker':
         """
@@ -104,96 +745,1071 @@ class Worker:
         :param config: WorkerConfig, конфигурация.
         :return: Worker, экземпляр класса Worker с заданной конфигурацией.
         """
-        return Worker(address=config.address)
+        return Worker(address=config.address, weight=config.weight, max_connections=config.max_connections)
 
 
 class Balancer:
-    """Класс Worker взаимодействует с частью API
-    Воркеров, необходимой для работы балансера. Для распределения задач
-    Балансеру необходимо проверять состояние своих воркеров
-    и иметь возможность пересылать им запросы, выполняя роль прокси.
+    """Класс Balancer распределяет запросы на расчет между воркерами
+    по выбранной стратегии (по умолчанию - Least Connections, см. strategies.py).
+    Состояние воркеров проверяется фоновой задачей раз в healthcheck_interval секунд
+    (плюс случайная задержка до healthcheck_jitter секунд, чтобы проверки разных балансеров
+    не синхронизировались), а результат кэшируется в Worker.last_status.
+    Живые воркеры со свободными слотами (см. Worker.max_connections) хранятся в индексе загруженности
+    (LoadIndex), поэтому compute не делает сетевых запросов до пересылки задачи. Если свободных
+    воркеров нет, запрос ждет в ограниченной очереди (AdmissionQueue).
 
     Attributes
     ----------
     workers : List[Worker]
-        Список воркеров (и живых, и мертвых, за статус отвечает Worker.status()).
+        Список воркеров (и живых, и мертвых, за статус отвечает Worker.last_status).
+    healthcheck_interval : float
+        Интервал между проверками состояния воркеров в секундах
+    healthcheck_jitter : float
+        Максимальная случайная добавка к интервалу между проверками в секундах
+    connection_pool : ConnectionPoolConfig
+        Настройки пула соединений с воркерами (лимиты, keep-alive, кэш DNS)
+    strategy : Strategy
+        Стратегия выбора воркера. Можно подменить на лету, стратегии не хранят состояния
+    _session : Optional[aiohttp.ClientSession]
+        Общий для всех воркеров пул соединений для пересылки задач
+    _healthcheck_session : Optional[aiohttp.ClientSession]
+        Общий для всех воркеров пул соединений для проверок состояния
+    admission_queue : AdmissionQueue[Worker]
+        Очередь запросов, ожидающих свободного воркера, с честным разделением слотов между классами трафика
+    rate_limiter : RateLimiter
+        Лимиты запросов по тенантам
+    task_routes : TaskRoutes[Worker]
+        Таблица маршрутизации асинхронных тасок (uuid -> воркер)
+    cache : Optional[ResultCache]
+        Кэш результатов /compute по payload, None - если кэш выключен
+    max_attempts : int
+        Сколько раз всего можно отправить запрос /compute (первая попытка и повторы на других воркерах)
+    request_timeout : float
+        Общий дедлайн запроса /compute в секундах, на все попытки вместе
+    retry_budget : RetryBudget
+        Бюджет повторов, не дающий повторам умножить нагрузку при массовом падении воркеров
+    latency_factor : float
+        Воркер, чья оценка задержки больше медианы по воркерам в latency_factor раз, исключается из ротации,
+        0 - не исключать по задержке
+    ejection_limit : EjectionLimit
+        Общий лимит одновременно исключенных из ротации воркеров
+    outlier_detection : OutlierDetectionConfig
+        Настройки автоматов отключения (нужны для воркеров, добавленных на лету)
+    config_path : Optional[str]
+        Путь к config.xml, изменения списка воркеров в котором подхватываются на лету, None - не следить
+    reload_interval : float
+        Как часто проверять, не изменился ли config.xml, в секундах
+    proxy : ProxyConfig
+        Режим проксирования /compute: разбирать ли запросы и ответы или пересылать тела как есть
+    shared : Optional[SharedState]
+        Общее состояние процессов балансера (число подключений к воркерам, их статус и регистрации),
+        None - балансер работает в одном процессе
+    affinity : AffinityConfig
+        Привязка запросов к воркерам консистентным хэшированием по ключу
+    _hash_ring : HashRing[Worker]
+        Кольцо консистентного хэширования всех воркеров пула (и живых, и мертвых)
+    hedge_latency : Optional[LatencyWindow]
+        Окно задержек /compute, по перцентилю которого отправляется дублирующий запрос, None - дублирование выключено
+    hedge_budget : RetryBudget
+        Бюджет дублирующих запросов: их одновременно не больше budget_ratio (<= 1) от запросов в полете
+    gossip : Optional[Gossip]
+        Обмен подключениями к воркерам и их статусами с другими репликами балансера, None - репликация выключена
+        (или это не процесс 0 балансера в несколько процессов: остальные процессы берут данные реплик из shared)
+    _workers_by_address : Dict[str, Worker]
+        Воркеры по адресу
+    _config_mtime : Optional[float]
+        Время изменения config.xml при последней загрузке
+    _config_watcher_task : Optional[asyncio.Task]
+        Фоновая задача слежения за config.xml
+    _SHARED_SYNC_INTERVAL : float
+        Как часто подтягивать из общего состояния подключения всех воркеров других процессов балансера, в секундах
+    _SELECT_SYNC_ATTEMPTS : int
+        Сколько раз выбирать воркера заново, если выбранный оказался занят другими процессами балансера
+    _shared_sync_task : Optional[asyncio.Task]
+        Фоновая задача, обновляющая индекс загруженности по общему состоянию и будящая очередь,
+        когда слоты освобождаются в других процессах балансера
+    loop_lag_monitor : LoopLagMonitor
+        Монитор задержки event loop
+    _loop_lag_task : Optional[asyncio.Task]
+        Фоновая задача монитора задержки event loop
+    _load_index : LoadIndex[Worker]
+        Индекс загруженности живых воркеров со свободными слотами. Поддерживается
+        через Worker.on_state_changed
+    _health_monitor_task : Optional[asyncio.Task]
+        Фоновая задача проверки состояния воркеров
 
     Methods
     -------
-    compute(self, task_request: TaskRequest) -> Optional[Task]
-        Отправляет запрос самому незагруженному живому воркеру.
-    _get_alive_workers(workers: Sequence[Worker]) -> Sequence[Worker]
-        Получить живых воркеров. Живыми считаются все воркеры со статусом неравным DEAD.
-    _get_least_loaded(workers: Sequence[Worker]) -> Optional[Worker]
-        Получить из переданного списка самого незагруженного воркера.
-    _get_workers_statuses(workers: Sequence[Worker]) -> Sequence[WorkerStatus]
-        Асинхронно узнать статусы воркеров.
-    from_config(config: BalancerConfig) -> Balancer
+    compute(self, task_request: TaskRequest, timeout: Optional[float] = None, routing_key: Optional[str] = None,
+            traffic_class: Optional[str] = None) -> Optional[Task]
+        Отправляет запрос живому воркеру, выбранному стратегией (или по ключу, см. affinity).
+    compute_raw(self, body: bytes, timeout: Optional[float] = None, routing_key: Optional[str] = None,
+                traffic_class: Optional[str] = None) -> Optional[Tuple[int, bytes]]
+        Отправляет тело запроса как есть живому воркеру, выбранному стратегией (или по ключу, см. affinity).
+    compute_batch(self, task_requests: List[TaskRequest], traffic_class: Optional[str] = None
+                  ) -> AsyncIterator[Tuple[int, Optional[Task], Optional[str]]]
+        Распределяет пакет запросов по воркерам и отдает результаты по мере готовности.
+    submit(self, task_request: TaskRequest, traffic_class: Optional[str] = None) -> Optional[Task]
+        Отправляет запрос на асинхронный расчет и запоминает, какому воркеру.
+    check_rate_limit(self, tenant: Optional[str]) -> None
+        Проверяет лимит запросов тенанта.
+    get_task(self, task_uuid: str, wait: float = 0) -> Optional[Task]
+        Получает асинхронную таску с воркера, которому она была отправлена.
+    start(self) -> None
+        Открывает пулы соединений, проверяет состояние воркеров и запускает фоновую проверку.
+    stop(self) -> None
+        Останавливает фоновую проверку состояния воркеров и закрывает пулы соединений.
+    check_workers(self, min_age: float = 0) -> None
+        Асинхронно проверяет состояние всех воркеров и обновляет индекс загруженности.
+    register(self, config: WorkerConfig, ttl: float) -> Worker
+        Добавляет воркера в пул (или продлевает его регистрацию).
+    deregister(self, address: str) -> Optional[Worker]
+        Выводит воркера из пула, дав ему досчитать текущие запросы.
+    reload_config(self) -> None
+        Перечитывает config.xml и применяет изменения списка воркеров.
+    _on_worker_state_changed(self, worker: Worker) -> None
+        Обновляет положение воркера в индексе загруженности и будит ожидающий запрос, если освободился слот.
+    from_config(config: BalancerConfig, config_path: Optional[str] = None,
+                shared: Optional[SharedState] = None) -> Balancer
         Создает балансер с конфигурацией, указанной в экземпляре BalancerConfig.
     """
     workers: List[Worker]
+    healthcheck_interval: float
+    healthcheck_jitter: float
+    connection_pool: ConnectionPoolConfig
+    strategy: Strategy
+    admission_queue: AdmissionQueue[Worker]
+    rate_limiter: RateLimiter
+    task_routes: TaskRoutes[Worker]
+    cache: Optional[ResultCache]
+    max_attempts: int
+    request_timeout: float
+    retry_budget: RetryBudget
+    latency_factor: float
+    ejection_limit: EjectionLimit
+    outlier_detection: OutlierDetectionConfig
+    config_path: Optional[str]
+    reload_interval: float
+    proxy: ProxyConfig
+    shared: Optional[SharedState]
+    affinity: AffinityConfig
+    _hash_ring: HashRing[Worker]
+    hedge_latency: Optional[LatencyWindow]
+    hedge_budget: RetryBudget
+    gossip: Optional[Gossip]
+    _SHARED_SYNC_INTERVAL: float = 0.05
+    _SELECT_SYNC_ATTEMPTS: int = 3
+    _workers_by_address: Dict[str, Worker]
+    _config_mtime: Optional[float]
+    _config_watcher_task: Optional[asyncio.Task]
+    _shared_sync_task: Optional[asyncio.Task]
+    loop_lag_monitor: LoopLagMonitor
+    _loop_lag_task: Optional[asyncio.Task]
+    _session: Optional[aiohttp.ClientSession]
+    _healthcheck_session: Optional[aiohttp.ClientSession]
+    _load_index: LoadIndex[Worker]
+    _health_monitor_task: Optional[asyncio.Task]
 
-    def __init__(self, workers: Optional[List[Worker]] = None):
+    def __init__(self,
+                 workers: Optional[List[Worker]] = None,
+                 healthcheck_interval: float = BalancerConfig.DEFAULT_HEALTHCHECK_INTERVAL,
+                 healthcheck_jitter: float = BalancerConfig.DEFAULT_HEALTHCHECK_JITTER,
+                 connection_pool: Optional[ConnectionPoolConfig] = None,
+                 strategy: Optional[Strategy] = None,
+                 admission: Optional[AdmissionConfig] = None,
+                 tasks: Optional[TasksConfig] = None,
+                 cache: Optional[CacheConfig] = None,
+                 retry: Optional[RetryConfig] = None,
+                 outlier_detection: Optional[OutlierDetectionConfig] = None,
+                 config_path: Optional[str] = None,
+                 reload_interval: float = BalancerConfig.DEFAULT_RELOAD_INTERVAL,
+                 proxy: Optional[ProxyConfig] = None,
+                 shared: Optional[SharedState] = None,
+                 affinity: Optional[AffinityConfig] = None,
+                 hedging: Optional[HedgingConfig] = None,
+                 rate_limit: Optional[RateLimitConfig] = None,
+                 replication: Optional[ReplicationConfig] = None):
         if workers is None:
             workers = []
-        self.workers = workers
+        if connection_pool is None:
+            connection_pool = ConnectionPoolConfig()
+        if strategy is None:
+            strategy = LeastConnectionsStrategy()
+        if admission is None:
+            admission = AdmissionConfig()
+        if tasks is None:
+            tasks = TasksConfig()
+        if cache is None:
+            cache = CacheConfig()
+        if retry is None:
+            retry = RetryConfig()
+        if outlier_detection is None:
+            outlier_detection = OutlierDetectionConfig()
+        if proxy is None:
+            proxy = ProxyConfig()
+        if affinity is None:
+            affinity = AffinityConfig()
+        if hedging is None:
+            hedging = HedgingConfig()
+        if rate_limit is None:
+            rate_limit = RateLimitConfig()
+        if replication is None:
+            replication = ReplicationConfig()
+        self.workers = []
+        self.healthcheck_interval = healthcheck_interval
+        self.healthcheck_jitter = healthcheck_jitter
+        self.connection_pool = connection_pool
+        self.strategy = strategy
+        self.admission_queue = AdmissionQueue(max_size=admission.max_queue_size,
+                                              timeout=admission.queue_timeout,
+                                              retry_after=admission.retry_after,
+                                              weights=admission.classes)
+        self.rate_limiter = RateLimiter(rate=rate_limit.rate, burst=rate_limit.burst, tenants=rate_limit.tenants,
+                                        max_tenants=rate_limit.max_tenants)
+        self.task_routes = TaskRoutes(pending_timeout=tasks.pending_timeout, retention=tasks.retention)
+        self.cache = ResultCache(max_entries=cache.max_entries, max_bytes=cache.max_bytes,
+                                 ttl=cache.ttl) if cache.enabled else None
+        self.max_attempts = retry.max_attempts
+        self.request_timeout = retry.request_timeout
+        self.retry_budget = RetryBudget(ratio=retry.budget_ratio, min_concurrency=retry.min_retry_concurrency)
+        self._session = None
+        self._healthcheck_session = None
+        self._load_index = LoadIndex()
+        self._health_monitor_task = None
+        self.latency_factor = outlier_detection.latency_factor
+        self.ejection_limit = EjectionLimit(max_ratio=outlier_detection.max_ejection_percent / 100, total=0)
+        self.outlier_detection = outlier_detection
+        self.config_path = config_path
+        self.reload_interval = reload_interval
+        self._workers_by_address = {}
+        self._config_mtime = None
+        self._config_watcher_task = None
+        self.proxy = proxy
+        self.shared = shared
+        self._shared_sync_task = None
+        self.loop_lag_monitor = LoopLagMonitor(metrics.LOOP_LAG)
+        self._loop_lag_task = None
+        self.affinity = affinity
+        self._hash_ring = HashRing(virtual_nodes=affinity.virtual_nodes)
+        self.hedge_latency = LatencyWindow(percentile=hedging.percentile,
+                                           size=hedging.window) if hedging.enabled else None
+        self.hedge_budget = RetryBudget(ratio=hedging.budget_ratio, min_concurrency=0)
+        self.gossip = None
+        if replication.enabled and (shared is None or shared.process_index == 0):
+            self.gossip = Gossip(listen=replication.listen, peers=replication.peers, interval=replication.interval,
+                                 peer_timeout=replication.peer_timeout, snapshot=self._gossip_snapshot,
+                                 on_change=self._on_gossip, secret=replication.secret)
+        for worker in workers:
+            self._add_worker(worker)
 
-    async def compute(self, task_request: TaskRequest) -> Optional[Task]:
+    async def compute(self, task_request: TaskRequest, timeout: Optional[float] = None,
+                      routing_key: Optional[str] = None, traffic_class: Optional[str] = None) -> Optional[Task]:
         """
-        Передает запрос на расчет самому незагруженному живому воркеру.
+        Передает запрос на расчет живому воркеру, выбранному стратегией (по умолчанию - самому незагруженному).
+        Если включена привязка (affinity), запрос с ключом уходит воркеру ключа на кольце, пока тот не перегружен.
+
+        Если свободных воркеров нет, ждет в очереди; при переполнении очереди или истечении времени ожидания
+        выбрасывает AdmissionError, а если истек дедлайн - DeadlineExceededError. Если включен кэш, одинаковые
+        payload считаются один раз.
 
         :param task_request: TaskRequest, запрос на расчет.
+        :param timeout: Optional[float], таймаут клиента в секундах, None - только request_timeout.
+        :param routing_key: Optional[str], ключ привязки от клиента, None - payload (если hash_payload).
+        :param traffic_class: Optional[str], класс трафика для очереди допуска, None - AdmissionQueue.DEFAULT_CLASS.
         :return: экземпляр Task в случае успешного расчета, None - в случае таймаута или ошибки со стороны Worker.
         """
-        least_loaded_worker = self._get_least_loaded(await self._get_alive_workers(self.workers))
-        if least_loaded_worker is not None:
-            return await least_loaded_worker.compute(task_request)
-        return None
+        send = lambda worker, remaining: worker.compute(task_request, remaining)  # noqa
+        routing_key = self._routing_key(routing_key, task_request.payload)
+        if self.cache is not None:
+            return await self.cache.get_or_compute(task_request.payload,
+                                                   lambda: self._dispatch(send, timeout, routing_key, traffic_class))
+        return await self._dispatch(send, timeout, routing_key, traffic_class)
 
-    @staticmethod
-    async def _get_alive_workers(workers: Sequence[Worker]) -> List[Worker]:
+    async def compute_raw(self, body: bytes, timeout: Optional[float] = None, routing_key: Optional[str] = None,
+                          traffic_class: Optional[str] = None) -> Optional[Tuple[int, bytes]]:
         """
-        Получить живых воркеров. Живыми считаются все воркеры со статусом неравным DEAD.
+        Передает тело запроса на расчет как есть (см. Worker.compute_raw) воркеру, выбранному стратегией.
+        Допуск и повторы - как в compute, кэш не используется: для него нужен разобранный запрос.
+        По той же причине привязка работает только по ключу клиента, payload не хэшируется.
 
-        :param workers: Sequence[Worker], список воркеров, из которых следует отобрать живых.
-        :return: List[Worker], список живых воркеров.
+        :param body: bytes, JSON запроса на расчет.
+        :param timeout: Optional[float], таймаут клиента в секундах, None - только request_timeout.
+        :param routing_key: Optional[str], ключ привязки от клиента.
+        :param traffic_class: Optional[str], класс трафика для очереди допуска, None - AdmissionQueue.DEFAULT_CLASS.
+        :return: Optional[Tuple[int, bytes]], код и тело ответа воркера, None - в случае таймаута или ошибки.
         """
-        status_list = await Balancer._get_workers_statuses(workers)
-        return [worker for worker, status in
-                filter(lambda pair: pair[1] != WorkerStatus.DEAD, zip(workers, status_list))]
+        return await self._dispatch(lambda worker, remaining: worker.compute_raw(body, remaining), timeout,
+                                    self._routing_key(routing_key), traffic_class)
+
+    def _routing_key(self, routing_key: Optional[str], payload: Optional[str] = None) -> Optional[str]:
+        """
+        Ключ, по которому запрос привязывается к воркеру: ключ клиента, а без него - payload (если hash_payload).
+
+        :param routing_key: Optional[str], ключ привязки от клиента.
+        :param payload: Optional[str], payload запроса.
+        :return: Optional[str], None - если привязка выключена или ключа нет.
+        """
+        if not self.affinity.enabled:
+            return None
+        if routing_key is not None:
+            return routing_key
+        return payload if self.affinity.hash_payload else None
+
+    async def _dispatch(self, send: Callable[[Worker, float], Awaitable[Optional[T]]],
+                        timeout: Optional[float] = None, routing_key: Optional[str] = None,
+                        traffic_class: Optional[str] = None) -> Optional[T]:
+        """
+        Дожидается допуска и пересылает запрос воркеру, выбранному стратегией (или по ключу привязки).
+
+        Если соединиться с воркером не удалось, воркер помечается мертвым (и выпадает из индекса),
+        а запрос повторяется на следующем по стратегии воркере - не больше max_attempts попыток
+        и пока позволяет бюджет повторов. Каждая попытка получает остаток общего дедлайна: request_timeout
+        или таймаута клиента, если он меньше. Таймауты и ошибки самого расчета не повторяются: дедлайн уже потрачен,
+        а воркер мог посчитать таску. Если включено дублирование (<hedging>), медленный запрос дублируется
+        на другого воркера (см. _send_hedged).
+
+        :param send: Callable[[Worker, float], Awaitable[Optional[T]]], пересылка запроса воркеру
+            с таймаутом в секундах (Worker.compute или Worker.compute_raw).
+        :param timeout: Optional[float], таймаут клиента в секундах, None - только request_timeout.
+        :param routing_key: Optional[str], ключ привязки к воркеру, None - выбирает стратегия.
+        :param traffic_class: Optional[str], класс трафика для очереди допуска.
+        :return: результат send, None - в случае таймаута или ошибки со стороны Worker.
+        :raises DeadlineExceededError: если дедлайн истек.
+        """
+        deadline = time.monotonic() + (self.request_timeout if timeout is None else min(timeout, self.request_timeout))
+        self.retry_budget.request_started()
+        try:
+            for attempt in range(self.max_attempts):
+                if attempt > 0 and not self.retry_budget.try_acquire():
+                    logger.warning("Retry budget is exhausted, giving up.")
+                    return None
+                try:
+                    admission_started = time.monotonic()
+                    worker = await self._admit(deadline if timeout is not None else None, routing_key, traffic_class)
+                    metrics.DISPATCH_PHASE.observe(time.monotonic() - admission_started, "admission")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DeadlineExceededError("Deadline exceeded before the request was sent to a worker!")
+                    if attempt > 0:
+                        logger.info(f"Retrying task on worker {worker.address} (attempt {attempt + 1}).")
+                    try:
+                        if self.hedge_latency is None:
+                            return await send(worker, remaining)
+                        return await self._send_hedged(send, worker, deadline)
+                    except WorkerUnavailableError:
+                        continue
+                finally:
+                    if attempt > 0:
+                        self.retry_budget.release()
+            return None
+        finally:
+            self.retry_budget.request_finished()
+
+    async def _send_hedged(self, send: Callable[[Worker, float], Awaitable[Optional[T]]], worker: Worker,
+                           deadline: float) -> Optional[T]:
+        """
+        Отправляет запрос воркеру, а если тот не ответил за перцентиль недавних задержек (hedge_latency),
+        дублирует запрос второму по загруженности воркеру и берет первый успешный ответ. Проигравший запрос
+        отменяется: соединение с его воркером закрывается, и воркер прерывает расчет. Дубль не отправляется,
+        пока задержек мало, пока в очереди допуска кто-то ждет (свободные слоты нужнее им) и если исчерпан
+        hedge_budget - так дублирование не может больше чем удвоить нагрузку. Воркер дубля выбирается
+        с той же проверкой свободного слота, что и при допуске (см. _select_hedge).
+
+        :param send: Callable[[Worker, float], Awaitable[Optional[T]]], пересылка запроса воркеру.
+        :param worker: Worker, воркер основного запроса.
+        :param deadline: float, дедлайн запроса (time.monotonic()).
+        :return: результат первого успешного запроса, None - если оба не удались.
+        :raises WorkerUnavailableError: если основной воркер недоступен, а дубль не отправлялся или тоже не удался.
+        :raises DeadlineExceededError: если дедлайн истек.
+        """
+        self.hedge_budget.request_started()
+        started = time.monotonic()
+        primary = self._launch(send, worker, deadline - started)
+        attempts = [primary]
+        try:
+            delay = self.hedge_latency.value
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done and not self.admission_queue.depth and time.monotonic() < deadline:
+                hedge_worker = self._select_hedge(worker)
+                if hedge_worker is not None and self.hedge_budget.try_acquire():
+                    logger.info(f"Hedging request to {worker.address} on worker {hedge_worker.address}.")
+                    attempts.append(self._launch(send, hedge_worker, deadline - time.monotonic()))
+            try:
+                pending = set(attempts)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for attempt in done:
+                        if attempt.exception() is None and attempt.result() is not None:
+                            self.hedge_latency.observe(time.monotonic() - started)
+                            if attempt is not primary:
+                                metrics.HEDGES_WON.inc()
+                            return attempt.result()
+                return primary.result()
+            finally:
+                if len(attempts) > 1:
+                    self.hedge_budget.release()
+        finally:
+            for attempt in attempts:
+                if attempt.done() and not attempt.cancelled():
+                    attempt.exception()  # проигравший мог тоже упасть - ошибка уже не нужна
+                attempt.cancel()
+            self.hedge_budget.request_finished()
 
     @staticmethod
-    def _get_least_loaded(workers: Sequence[Worker]) -> Optional[Worker]:
+    def _launch(send: Callable[[Worker, float], Awaitable[Optional[T]]], worker: Worker,
+                remaining: float) -> 'asyncio.Future[Optional[T]]':
+        """
+        Запускает send отдельной задачей, заняв слот воркера сразу. Сам send занимает слот, только когда задача
+        впервые выполнится, и запросы, допущенные до этого, видели бы воркера свободным и превышали
+        max_connections или медленный старт. Заранее занятый слот отпускается после первого шага задачи
+        (к этому моменту send уже занял свой), а если задачу отменили до запуска - при ее отмене.
+
+        :param send: Callable[[Worker, float], Awaitable[Optional[T]]], пересылка запроса воркеру.
+        :param worker: Worker, воркер.
+        :param remaining: float, таймаут запроса в секундах.
+        :return: asyncio.Future[Optional[T]], задача пересылки.
+        """
+        worker.acquire()
+        held = True
+
+        async def run() -> Optional[T]:
+            nonlocal held
+            held = False
+            asyncio.get_running_loop().call_soon(worker.release)
+            return await send(worker, remaining)
+
+        def release_if_not_started(_) -> None:
+            if held:
+                worker.release()
+
+        future = asyncio.ensure_future(run())
+        future.add_done_callback(release_if_not_started)
+        return future
+
+    def _select_hedge(self, worker: Worker) -> Optional[Worker]:
+        """
+        Выбирает воркера для дубля запроса: самого незагруженного, кроме worker, с той же проверкой, что в _select -
+        в несколько процессов воркер подтягивается из общего состояния и выбирается заново, если другие процессы
+        заняли его последний слот.
+
+        :param worker: Worker, воркер основного запроса.
+        :return: Optional[Worker], None - если свободных воркеров нет.
+        """
+        for _ in range(self._SELECT_SYNC_ATTEMPTS):
+            hedge_worker = self._load_index.least_loaded(exclude=worker)
+            if hedge_worker is None or not hedge_worker.sync_shared() or hedge_worker in self._load_index:
+                return hedge_worker
+        return None
+
+    async def _admit(self, deadline: Optional[float], routing_key: Optional[str] = None,
+                     traffic_class: Optional[str] = None) -> Worker:
         """
-        Получить самого незагруженного воркера из списка.
+        Дожидается допуска в очереди, но не позже deadline: клиент, передавший свой таймаут,
+        не должен ждать в очереди дольше него.
 
-        :param workers: Sequence[Worker], список воркеров, из которых следует отобрать самого незагруженного.
-        :return: Worker, если workers не пустой и не равен None, None - иначе.
+        :param deadline: Optional[float], дедлайн запроса (time.monotonic()), None - ждать не дольше queue_timeout.
+        :param routing_key: Optional[str], ключ привязки к воркеру, None - выбирает стратегия.
+        :param traffic_class: Optional[str], класс трафика для очереди допуска.
+        :return: Worker, выбранный воркер.
+        :raises DeadlineExceededError: если дедлайн истек в очереди.
         """
-        if workers is None or not workers:
+        select = self._select if routing_key is None else lambda: self._select(routing_key)
+        if deadline is None:
+            return await self.admission_queue.admit(select, traffic_class)
+        try:
+            return await asyncio.wait_for(self.admission_queue.admit(select, traffic_class),
+                                          deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError("Deadline exceeded while waiting for a free worker!")
+
+    def _select(self, routing_key: Optional[str] = None) -> Optional[Worker]:
+        """
+        Выбирает воркера: по ключу привязки (см. _select_affine), а если ключа нет или воркер ключа
+        перегружен - стратегией. Если балансер запущен в несколько процессов, индекс загруженности обновляется
+        по общему состоянию в фоне (_sync_shared), а здесь из общего состояния подтягивается только выбранный
+        воркер: если другие процессы успели занять его последний слот, воркер выбирается заново.
+
+        :param routing_key: Optional[str], ключ привязки к воркеру, None - выбирает стратегия.
+        :return: Optional[Worker], None - если свободных воркеров нет.
+        """
+        started = time.monotonic()
+        worker = None
+        for _ in range(self._SELECT_SYNC_ATTEMPTS):
+            worker = self._select_affine(routing_key) if routing_key is not None else None
+            if worker is None:
+                worker = self.strategy.select(self._load_index)
+            if worker is None or not worker.sync_shared() or worker in self._load_index:
+                break
+            worker = None
+        metrics.DISPATCH_PHASE.observe(time.monotonic() - started, "select")
+        return worker
+
+    def _select_affine(self, routing_key: str) -> Optional[Worker]:
+        """
+        Консистентное хэширование с ограничением нагрузки: ключ получает первый по кольцу воркер из индекса
+        (живой и со свободным слотом), нагрузка которого меньше
+        ceil(load_factor * (суммарная нагрузка + 1) / число воркеров в индексе). Перегруженный воркер
+        пропускается, и ключ переливается следующему по кольцу: горячий ключ не может перегрузить одного
+        воркера, а перелитые запросы ключа тоже попадают на одного и того же (второго по кольцу) воркера.
+
+        :param routing_key: str, ключ привязки.
+        :return: Optional[Worker], None - если свободных воркеров нет.
+        """
+        index = self._load_index
+        if not index:
             return None
-        return min(workers, key=lambda worker: worker.number_of_connections)
+        bound = math.ceil(self.affinity.load_factor * (index.total_load + 1) / len(index))
+        owner = True
+        for worker in self._hash_ring.walk(routing_key):
+            if worker not in index:
+                continue
+            if worker.load < bound:
+                metrics.AFFINITY.inc("hit" if owner else "spill")
+                return worker
+            owner = False
+        return None
+
+    async def compute_batch(self, task_requests: List[TaskRequest], traffic_class: Optional[str] = None
+                            ) -> AsyncIterator[Tuple[int, Optional[Task], Optional[str]]]:
+        """
+        Распределяет пакет запросов по воркерам по текущей загруженности и отдает результаты по мере готовности,
+        а не после самого медленного. Запросы, попавшие на одного воркера, уходят ему одним вызовом.
+        Если у воркеров кончаются свободные слоты, оставшаяся часть пакета ждет в очереди допуска
+        и уходит следующей волной.
+
+        :param task_requests: List[TaskRequest], запросы на расчет.
+        :param traffic_class: Optional[str], класс трафика для очереди допуска.
+        :return: AsyncIterator[Tuple[int, Optional[Task], Optional[str]]], тройки (индекс запроса, Task, None)
+            в случае успеха и (индекс запроса, None, описание ошибки) - иначе.
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        dispatches: List[asyncio.Task] = []
+        dispatcher = asyncio.create_task(self._dispatch_batch(task_requests, results, dispatches, traffic_class))
+        try:
+            for _ in range(len(task_requests)):
+                yield await results.get()
+        finally:
+            dispatcher.cancel()
+            for dispatch in dispatches:
+                dispatch.cancel()
+
+    async def _dispatch_batch(self, task_requests: List[TaskRequest], results: asyncio.Queue,
+                              dispatches: List[asyncio.Task], traffic_class: Optional[str] = None) -> None:
+        """
+        Раскладывает пакет по воркерам волнами: первый запрос волны ждет допуска, остальные занимают
+        свободные слоты без ожидания, пока они есть и никто другой не ждет в очереди.
+
+        :param task_requests: List[TaskRequest], запросы на расчет.
+        :param results: asyncio.Queue, куда складывать тройки (индекс, Task, описание ошибки).
+        :param dispatches: List[asyncio.Task], куда складывать задачи пересылки групп.
+        :param traffic_class: Optional[str], класс трафика для очереди допуска.
+        :return: None
+        """
+        pending: Deque[Tuple[int, TaskRequest]] = deque(enumerate(task_requests))
+        select = self._select
+        while pending:
+            try:
+                worker = await self.admission_queue.admit(select, traffic_class)
+            except AdmissionError as e:
+                while pending:
+                    index, _ = pending.popleft()
+                    results.put_nowait((index, None, str(e)))
+                return
+            groups: Dict[Worker, List[Tuple[int, TaskRequest]]] = {}
+            while worker is not None:
+                worker.acquire()
+                groups.setdefault(worker, []).append(pending.popleft())
+                if not pending or self.admission_queue.depth:
+                    break
+                worker = select()
+            for worker, items in groups.items():
+                dispatches.append(asyncio.create_task(self._compute_group(worker, items, results)))
 
     @staticmethod
-    def from_config(config: BalancerConfig) -> 'Balancer':
+    async def _compute_group(worker: Worker, items: List[Tuple[int, TaskRequest]], results: asyncio.Queue) -> None:
         """
-        Создает балансер с конфигурацией, указанной в экземпляре BalancerConfig.
+        Пересылает группу запросов одному воркеру и складывает результаты в очередь.
 
-        :param config: BalancerConfig, конфигурация.
-        :return: Balancer, экземпляр класса Balancer с заданной конфигурацией.
+        :param worker: Worker, воркер (слоты под items уже заняты).
+        :param items: List[Tuple[int, TaskRequest]], пары (индекс запроса, запрос).
+        :param results: asyncio.Queue, куда складывать тройки (индекс, Task, описание ошибки).
+        :return: None
+        """
+        async for index, task in worker.compute_batch(items):
+            results.put_nowait((index, task, None if task is not None else
+                                'Task was failed due to internal server error!'))
+
+    async def submit(self, task_request: TaskRequest, traffic_class: Optional[str] = None) -> Optional[Task]:
+        """
+        Отправляет запрос на асинхронный расчет воркеру, выбранному стратегией, и запоминает,
+        какому воркеру. Таска учитывается в нагрузке воркера, пока балансер не увидит ее посчитанной
+        (см. get_task) или не истечет TasksConfig.pending_timeout. Ошибки допуска и привязка по payload - как в compute.
+
+        :param task_request: TaskRequest, запрос на расчет.
+        :param traffic_class: Optional[str], класс трафика для очереди допуска.
+        :return: экземпляр Task (еще не посчитанный) в случае успеха, None - в случае таймаута или ошибки.
+        """
+        routing_key = self._routing_key(None, task_request.payload)
+        worker = await self.admission_queue.admit(self._select if routing_key is None else
+                                                  lambda: self._select(routing_key), traffic_class)
+        task = await worker.submit(task_request)
+        if task is not None:
+            self.task_routes.add(str(task.uuid), worker)
+        return task
+
+    def check_rate_limit(self, tenant: Optional[str]) -> None:
+        """
+        Проверяет и учитывает лимит запросов тенанта (см. RateLimiter). Вызывается до постановки в очередь,
+        так что отброшенный запрос не занимает ни места в очереди, ни воркера.
+
+        :param tenant: Optional[str], тенант, None - запрос без тенанта (не ограничивается).
+        :return: None
+        :raises RateLimitedError: если тенант превысил лимит.
+        """
+        wait = self.rate_limiter.acquire(tenant)
+        if wait > 0:
+            raise RateLimitedError(f"Rate limit of tenant '{tenant}' exceeded!", wait)
+
+    async def get_task(self, task_uuid: str, wait: float = 0) -> Optional[Task]:
+        """
+        Получает асинхронную таску с воркера, которому она была отправлена, дождавшись окончания
+        расчета, но не дольше wait секунд.
+
+        :param task_uuid: str, идентификатор таски.
+        :param wait: float, сколько секунд ждать окончания расчета, 0 - не ждать.
+        :return: экземпляр Task, None - если воркер не ответил.
+        :raises TaskNotFoundError: если маршрута к таске нет (и в несколько процессов ее нет ни на одном воркере).
+        """
+        worker = self.task_routes.get(task_uuid)
+        if worker is None:
+            if self.shared is not None:
+                worker = await self._find_task_worker(task_uuid)
+            if worker is None:
+                raise TaskNotFoundError(f"Task {task_uuid} not found!")
+            return await worker.get_task(task_uuid, wait)
+        task = await worker.get_task(task_uuid, wait)
+        if task is not None and task.status in (TaskStatus.DONE, TaskStatus.ERROR, TaskStatus.CANCELLED):
+            if self.task_routes.complete(task_uuid) is not None:
+                worker.release()
+        return task
+
+    async def _find_task_worker(self, task_uuid: str) -> Optional[Worker]:
+        """
+        Ищет воркера с таской среди всех воркеров. Нужно, когда балансер запущен в несколько процессов:
+        маршруты тасок у каждого процесса свои, и запрос таски мог попасть не в тот процесс, что ее отправил.
+
+        :param task_uuid: str, идентификатор таски.
+        :return: Optional[Worker], None - если таски нет ни на одном воркере.
+        """
+        workers = [worker for worker in self.workers if worker.is_alive]
+        tasks = await asyncio.gather(*(worker.get_task(task_uuid) for worker in workers))
+        for worker, task in zip(workers, tasks):
+            if task is not None:
+                return worker
+        return None
+
+    async def start(self) -> None:
+        """
+        Открывает пулы соединений, проверяет состояние воркеров и запускает фоновую проверку.
+        Должен вызываться внутри работающего event loop'а (на старте приложения). Повторный вызов ничего не делает.
+
+        :return: None
+        """
+        if self._health_monitor_task is not None:
+            return
+        self._session = self._create_session(self.connection_pool.limit, self.connection_pool.limit_per_host,
+                                             [connection_trace()])
+        self._healthcheck_session = self._create_session(0, 1)
+        for worker in self.workers:
+            worker.session = self._session
+            worker.healthcheck_session = self._healthcheck_session
+        await self.check_workers()
+        self._health_monitor_task = asyncio.create_task(self._monitor_health())
+        if self.config_path is not None and self.reload_interval > 0:
+            self._config_mtime = self._read_config_mtime()
+            self._config_watcher_task = asyncio.create_task(self._watch_config())
+        if self.shared is not None:
+            self._shared_sync_task = asyncio.create_task(self._sync_shared())
+        if self.gossip is not None:
+            await self.gossip.start()
+        self._loop_lag_task = asyncio.create_task(self.loop_lag_monitor.run())
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновую проверку состояния воркеров и закрывает пулы соединений.
+
+        :return: None
         """
-        return Balancer(workers=[Worker.from_config(worker_config) for worker_config in config.workers])
+        if self._health_monitor_task is None:
+            return
+        for background_task in (self._health_monitor_task, self._config_watcher_task, self._shared_sync_task,
+                                self._loop_lag_task):
+            if background_task is None:
+                continue
+            background_task.cancel()
+            try:
+                await background_task
+            except asyncio.CancelledError:
+                pass  # noqa
+        self._health_monitor_task = None
+        self._config_watcher_task = None
+        self._shared_sync_task = None
+        self._loop_lag_task = None
+        if self.gossip is not None:
+            await self.gossip.stop()
+        for worker in self.workers:
+            worker.session = None
+            worker.healthcheck_session = None
+        await self._session.close()
+        await self._healthcheck_session.close()
+        self._session = None
+        self._healthcheck_session = None
+
+    def _create_session(self, limit: int, limit_per_host: int,
+                        trace_configs: Optional[List[aiohttp.TraceConfig]] = None) -> aiohttp.ClientSession:
+        """
+        Создает пул соединений с keep-alive и кэшированием DNS по настройкам connection_pool.
+
+        :param limit: int, максимальное число соединений в пуле (0 - без ограничений).
+        :param limit_per_host: int, максимальное число соединений с одним воркером (0 - без ограничений).
+        :param trace_configs: Optional[List[aiohttp.TraceConfig]], трассировка запросов пула.
+        :return: aiohttp.ClientSession
+        """
+        connector = aiohttp.TCPConnector(limit=limit,
+                                         limit_per_host=limit_per_host,
+                                         ttl_dns_cache=self.connection_pool.dns_cache_ttl,
+                                         keepalive_timeout=self.connection_pool.keepalive_timeout)
+        return aiohttp.ClientSession(connector=connector, trace_configs=trace_configs)
+
+    async def check_workers(self, min_age: float = 0) -> None:
+        """
+        Асинхронно проверяет состояние всех воркеров и обновляет индекс загруженности.
+
+        :param min_age: float, воркеров, которых другой процесс балансера проверял меньше min_age секунд назад,
+            не проверять, а взять результат его проверки.
+        :return: None
+        """
+        await asyncio.gather(*(worker.check(min_age) for worker in self.workers))
+
+    async def _monitor_health(self) -> None:
+        """
+        Бесконечный цикл фоновой проверки состояния воркеров. Заодно исключает из ротации воркеров
+        с выбросами задержки, продвигает автоматы отключения и снимает с учета
+        асинхронные таски, о завершении которых балансер так и не узнал.
+
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self.healthcheck_interval + random.uniform(0, self.healthcheck_jitter))
+            try:
+                await self.check_workers(self.healthcheck_interval / 2)
+            except Exception as e:  # noqa
+                logger.exception(f"Health check failed: {e}")
+            self._eject_latency_outliers()
+            if self.shared is not None:
+                self._sync_registrations()
+            now = time.monotonic()
+            for worker in list(self.workers):
+                if worker.registered_until is not None and worker.registered_until < now and not worker.draining:
+                    logger.warning(f"Worker {worker.address} stopped sending heartbeats.")
+                    self._drain(worker)
+                worker.tick()
+            for worker in self.task_routes.expire():
+                worker.release()
+
+    def _eject_latency_outliers(self) -> None:
+        """
+        Исключает из ротации воркеров, чья оценка задержки больше медианы по воркерам в ротации
+        в latency_factor раз. Нужно хотя бы три воркера с оценкой задержки, иначе медиане нельзя доверять.
+
+        :return: None
+        """
+        if self.latency_factor <= 0:
+            return
+        candidates = [worker for worker in self.workers
+                      if worker.is_alive and worker.breaker.state == BreakerState.CLOSED and worker.latency.value > 0]
+        if len(candidates) < 3:
+            return
+        median = statistics.median(worker.latency.value for worker in candidates)
+        for worker in candidates:
+            if worker.latency.value > self.latency_factor * median:
+                worker.eject(f"latency {worker.latency.value:.3f}s is over "
+                             f"{self.latency_factor} x median {median:.3f}s")
+
+    def _on_worker_state_changed(self, worker: Worker) -> None:
+        """
+        Обновляет положение воркера в индексе загруженности: живые воркеры со свободными слотами
+        лежат в индексе, остальные - нет. Если у воркера есть свободный слот, будит ожидающий запрос.
+
+        :param worker: Worker, воркер.
+        :return: None
+        """
+        if worker.draining:
+            self._load_index.remove(worker)
+            if worker.local_connections <= 0:
+                self._remove_worker(worker)
+        elif worker.is_alive and worker.has_capacity:
+            if worker in self._load_index:
+                self._load_index.update(worker)
+            else:
+                self._load_index.add(worker)
+            self.admission_queue.wake_one()
+        else:
+            self._load_index.remove(worker)
+
+    def register(self, config: WorkerConfig, ttl: float) -> Worker:
+        """
+        Добавляет воркера в пул или, если он уже есть, продлевает его регистрацию (heartbeat).
+        Регистрация действует ttl секунд: воркер, не приславший повторную регистрацию, выводится из пула.
+        Воркеры из config.xml регистрацией не истекают. Выводимый из пула воркер возвращается в него.
+
+        :param config: WorkerConfig, адрес и параметры воркера.
+        :param ttl: float, сколько секунд действует регистрация.
+        :return: Worker
+        """
+        worker = self._register(config, time.monotonic() + ttl)
+        if self.shared is not None and worker.registered_until is not None:
+            self.shared.set_registration(worker.shared_slot, int(worker.registered_until * 1e9),
+                                         config.weight, config.max_connections)
+        return worker
+
+    def _register(self, config: WorkerConfig, registered_until: float) -> Worker:
+        """
+        Добавляет воркера в пул этого процесса или продлевает его регистрацию (см. register).
+
+        :param config: WorkerConfig, адрес и параметры воркера.
+        :param registered_until: float, до какого момента (time.monotonic()) действует регистрация.
+        :return: Worker
+        """
+        worker = self._workers_by_address.get(config.address)
+        if worker is None:
+            worker = Worker.from_config(config)
+            worker.registered_until = registered_until
+            self._add_worker(worker)
+            logger.info(f"Worker {worker.address} registered.")
+            return worker
+        if worker.registered_until is not None:
+            worker.registered_until = registered_until
+        if worker.draining:
+            logger.info(f"Worker {worker.address} registered again, drain cancelled.")
+            worker.draining = False
+            self._on_worker_state_changed(worker)
+        return worker
+
+    def deregister(self, address: str) -> Optional[Worker]:
+        """
+        Выводит воркера из пула: новые запросы ему не отправляются, а после того, как досчитаются
+        текущие (включая асинхронные таски), воркер удаляется.
+
+        :param address: str, адрес воркера.
+        :return: Worker, None - если воркера с таким адресом нет.
+        """
+        worker = self._workers_by_address.get(address)
+        if worker is None:
+            return None
+        logger.info(f"Worker {address} deregistered.")
+        if self.shared is not None and worker.registered_until is not None:
+            # Регистрация, истекшая в прошлом, - остальные процессы выведут воркера на следующей проверке.
+            self.shared.set_registration(worker.shared_slot, 1, worker.weight, worker.max_connections)
+        self._drain(worker)
+        return worker
+
+    def _sync_registrations(self) -> None:
+        """
+        Подхватывает регистрации воркеров, пришедшие в другие процессы балансера: добавляет новых воркеров,
+        продлевает регистрацию известных, а для отозванных через /deregister - истекает ее.
+
+        :return: None
+        """
+        now = time.monotonic()
+        for address, until_ns, weight, max_connections in self.shared.registrations():
+            registered_until = until_ns / 1e9
+            worker = self._workers_by_address.get(address)
+            if worker is None:
+                if registered_until > now:
+                    self._register(WorkerConfig(address=address, weight=weight, max_connections=max_connections),
+                                   registered_until)
+            elif worker.registered_until is not None and worker.registered_until != registered_until:
+                if registered_until > now:
+                    self._register(WorkerConfig(address=address, weight=weight, max_connections=max_connections),
+                                   registered_until)
+                else:
+                    worker.registered_until = registered_until
+
+    def reload_config(self) -> None:
+        """
+        Перечитывает config.xml и применяет изменения списка воркеров: новых добавляет, пропавших выводит
+        из пула (дав досчитать текущие запросы), у оставшихся обновляет вес и лимит подключений.
+        Остальные воркеры и их положение в индексе загруженности не трогаются.
+
+        :return: None
+        """
+        config = BalancerConfig.from_xml(self.config_path)
+        configured = {worker_config.address: worker_config for worker_config in config.workers}
+        for worker in list(self.workers):
+            if worker.registered_until is None and worker.address not in configured and not worker.draining:
+                logger.info(f"Worker {worker.address} removed from config.")
+                self._drain(worker)
+        for address, worker_config in configured.items():
+            worker = self._workers_by_address.get(address)
+            if worker is None:
+                logger.info(f"Worker {address} added to config.")
+                self._add_worker(Worker.from_config(worker_config))
+                continue
+            worker.registered_until = None
+            worker.weight = worker_config.weight
+            worker.max_connections = worker_config.max_connections
+            worker.draining = False
+            self._on_worker_state_changed(worker)
+
+    def _add_worker(self, worker: Worker) -> None:
+        """
+        Подключает воркера к балансеру: пулам соединений, кольцу хэширования, индексу загруженности,
+        автомату отключения.
+        Если балансер уже запущен, сразу проверяет состояние воркера.
+
+        :param worker: Worker, воркер.
+        :return: None
+        """
+        detection = self.outlier_detection
+        worker.on_state_changed = self._on_worker_state_changed
+        worker.breaker = CircuitBreaker(failure_threshold=detection.consecutive_failures,
+                                        ejection_time=detection.ejection_time,
+                                        max_ejection_time=detection.max_ejection_time,
+                                        slow_start_duration=detection.slow_start_duration,
+                                        slow_start_initial=detection.slow_start_initial,
+                                        slow_start_doubling=detection.slow_start_doubling,
+                                        limit=self.ejection_limit)
+        worker.session = self._session
+        worker.healthcheck_session = self._healthcheck_session
+        if self.shared is not None:
+            worker.attach_shared(self.shared)
+        self.workers.append(worker)
+        self._workers_by_address[worker.address] = worker
+        self._hash_ring.add(worker.address, worker)
+        self.ejection_limit.total += 1
+        if self._health_monitor_task is not None:
+            asyncio.create_task(worker.check())
+
+    def _drain(self, worker: Worker) -> None:
+        """
+        Выводит воркера из пула. Удаляется он, когда у него не останется подключений (см. _on_worker_state_changed).
+
+        :param worker: Worker, воркер.
+        :return: None
+        """
+        worker.draining = True
+        self._on_worker_state_changed(worker)
+
+    def _remove_worker(self, worker: Worker) -> None:
+        """
+        Удаляет выведенного из пула воркера, у которого не осталось подключений. Маршруты асинхронных тасок
+        на него остаются, так что посчитанные таски еще можно забрать, пока воркер жив.
+
+        :param worker: Worker, воркер.
+        :return: None
+        """
+        if self._workers_by_address.get(worker.address) is not worker:
+            return
+        del self._workers_by_address[worker.address]
+        self.workers.remove(worker)
+        self._hash_ring.remove(worker.address)
+        self.ejection_limit.total -= 1
+        if worker.breaker.state != BreakerState.CLOSED:
+            self.ejection_limit.restore()
+        worker.on_state_changed = None
+        worker.detach_shared()
+        logger.info(f"Worker {worker.address} drained and removed.")
+
+    def _read_config_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.config_path).st_mtime
+        except OSError:
+            return None
+
+    async def _watch_config(self) -> None:
+        """
+        Бесконечный цикл слежения за config.xml: раз в reload_interval секунд сравнивает время изменения файла
+        и при изменении применяет новый список воркеров. Ошибки в файле логируются, текущий пул не меняется.
+
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            mtime = self._read_config_mtime()
+            if mtime is None or mtime == self._config_mtime:
+                continue
+            self._config_mtime = mtime
+            try:
+                self.reload_config()
+            except (OSError, ValueError, ElementTree.ParseError) as e:
+                logger.error(f"Failed to reload config {self.config_path}: {e}")
+
+    async def _sync_shared(self) -> None:
+        """
+        Бесконечный цикл для балансера в несколько процессов: раз в _SHARED_SYNC_INTERVAL секунд подтягивает
+        из общего состояния подключения других процессов ко всем воркерам, чтобы стратегия видела общую
+        загруженность. Слот, освободившийся в другом процессе, этот процесс иначе не заметит и не разбудит ожидающих.
+
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self._SHARED_SYNC_INTERVAL)
+            for worker in list(self.workers):
+                worker.sync_shared()
+
+    def _gossip_snapshot(self) -> Dict[str, WorkerState]:
+        """
+        Состояние воркеров для других реплик: по адресу - (подключения этой реплики (всех ее процессов),
+        статус, возраст статуса в секундах). Воркеры без статуса пропускаются.
+
+        :return: Dict[str, WorkerState]
+        """
+        now = time.monotonic()
+        snapshot = {}
+        for worker in list(self.workers):
+            worker.sync_shared()
+            if worker.status_updated is not None:
+                snapshot[worker.address] = (worker.number_of_connections, int(worker.last_status),
+                                            now - worker.status_updated)
+        return snapshot
+
+    def _on_gossip(self) -> None:
+        """
+        Применяет к воркерам состояние других реплик, когда оно изменилось (см. Worker.apply_peer_state).
+
+        :return: None
+        """
+        for worker in list(self.workers):
+            worker.apply_peer_state(self.gossip.connections(worker.address),
+                                    self.gossip.freshest_status(worker.address))
 
     @staticmethod
-    async def _get_workers_statuses(workers: Sequence[Worker]) -> Sequence[WorkerStatus]:
+    def from_config(config: BalancerConfig, config_path: Optional[str] = None,
+                    shared: Optional[SharedState] = None) -> 'Balancer':
         """
-        Узнать статусы воркеров.
+        Создает балансер с конфигурацией, указанной в экземпляре BalancerConfig.
 
-        :param workers: Sequence[Worker], список воркеров, статусы которых нужно узнать.
-        :return: Sequence[WorkerStatus], статусы воркеров.
+        :param config: BalancerConfig, конфигурация.
+        :param config_path: Optional[str], путь к файлу конфигурации, чтобы подхватывать его изменения на лету.
+        :param shared: Optional[SharedState], общее состояние процессов балансера, None - один процесс.
+        :return: Balancer, экземпляр класса Balancer с заданной конфигурацией.
         """
-        gather_tasks = []
-        for worker in workers:
-            gather_tasks.append(asyncio.create_task(worker.status()))
-        status_list = await asyncio.gather(*gather_tasks)
-        return status_list
+        return Balancer(workers=[Worker.from_config(worker_config) for worker_config in config.workers],
+                        healthcheck_interval=config.healthcheck_interval,
+                        healthcheck_jitter=config.healthcheck_jitter,
+                        connection_pool=config.connection_pool,
+                        strategy=strategy_from_name(config.strategy),
+                        admission=config.admission,
+                        tasks=config.tasks,
+                        cache=config.cache,
+                        retry=config.retry,
+                        outlier_detection=config.outlier_detection,
+                        config_path=config_path,
+                        reload_interval=config.reload_interval,
+                        proxy=config.proxy,
+                        shared=shared,
+                        affinity=config.affinity,
+                        hedging=config.hedging,
+                        rate_limit=config.rate_limit,
+                        replication=config.replication)
@@ -0,0 +1,238 @@
+import math
+from enum import Enum
+from typing import Optional
+
+
+class BreakerState(str, Enum):
+    """
+    Состояние автомата отключения воркера.
+    """
+    CLOSED = "closed"  # воркер в ротации
+    OPEN = "open"  # воркер исключен из ротации до истечения времени отключения
+    HALF_OPEN = "half_open"  # воркеру отправляется один пробный запрос
+
+
+class EjectionLimit:
+    """
+    Общий для всех воркеров балансера лимит отключений: одновременно может быть отключено
+    не больше max_ratio от всех воркеров (но один - всегда можно). Не дает автоматам вывести
+    из ротации всех воркеров, если ошибки вызваны не воркерами (например, плохими запросами).
+    """
+    max_ratio: float
+    total: int
+    ejected: int
+
+    def __init__(self, max_ratio: float, total: int):
+        self.max_ratio = max_ratio
+        self.total = total
+        self.ejected = 0
+
+    def try_eject(self) -> bool:
+        """
+        Занять место под отключение.
+
+        :return: bool, True - если отключение разрешено.
+        """
+        if self.ejected >= max(1, int(self.max_ratio * self.total)):
+            return False
+        self.ejected += 1
+        return True
+
+    def restore(self) -> None:
+        self.ejected -= 1
+
+
+class CircuitBreaker:
+    """Автомат отключения воркера (closed / open / half-open) с плавным возвращением в ротацию.
+
+    После failure_threshold неудачных расчетов подряд (или по решению детектора выбросов балансера)
+    автомат размыкается: воркер исключается из ротации на ejection_time секунд, причем каждое следующее
+    отключение подряд длится дольше (ejection_time * номер отключения, но не больше max_ejection_time).
+    Затем воркеру отправляется один пробный запрос: успех замыкает автомат, неудача - снова размыкает.
+
+    Вернувшийся в ротацию воркер (после отключения или после того, как был DEAD) проходит медленный
+    старт: первые slow_start_duration секунд число одновременных запросов к нему ограничено
+    slow_start_initial и удваивается каждые slow_start_doubling секунд, чтобы его не завалило запросами сразу.
+
+    Attributes
+    ----------
+    failure_threshold : int
+        Сколько неудачных расчетов подряд размыкают автомат, 0 - не размыкать по ошибкам
+    ejection_time : float
+        Время первого отключения в секундах
+    max_ejection_time : float
+        Максимальное время отключения в секундах
+    slow_start_duration : float
+        Длительность медленного старта в секундах, 0 - без медленного старта
+    slow_start_initial : int
+        Лимит одновременных запросов в начале медленного старта
+    slow_start_doubling : float
+        Через сколько секунд медленного старта лимит удваивается
+    state : BreakerState
+        Текущее состояние
+    consecutive_failures : int
+        Неудачных расчетов подряд
+    ejections : int
+        Отключений подряд (сбрасывается, когда пробный запрос прошел)
+    open_until : float
+        До какого момента (time.monotonic()) автомат разомкнут
+    recovered_at : Optional[float]
+        Начало медленного старта (time.monotonic()), None - если медленного старта нет
+    _limit : Optional[EjectionLimit]
+        Общий лимит отключений, None - без ограничений
+
+    Methods
+    -------
+    allows(self, connections: int, now: float) -> bool
+        Можно ли отправить воркеру еще один запрос.
+    record_success(self, now: float) -> bool
+        Учесть успешный расчет.
+    record_failure(self, now: float) -> bool
+        Учесть неудачный расчет.
+    eject(self, now: float) -> bool
+        Разомкнуть автомат.
+    tick(self, now: float) -> bool
+        Обработать течение времени (конец отключения, рост лимита медленного старта).
+    start_slow_start(self, now: float) -> None
+        Начать медленный старт.
+    """
+    failure_threshold: int
+    ejection_time: float
+    max_ejection_time: float
+    slow_start_duration: float
+    slow_start_initial: int
+    slow_start_doubling: float
+    state: BreakerState
+    consecutive_failures: int
+    ejections: int
+    open_until: float
+    recovered_at: Optional[float]
+    _limit: Optional[EjectionLimit]
+
+    def __init__(self,
+                 failure_threshold: int = 0,
+                 ejection_time: float = 30.0,
+                 max_ejection_time: float = 300.0,
+                 slow_start_duration: float = 0.0,
+                 slow_start_initial: int = 1,
+                 slow_start_doubling: float = 5.0,
+                 limit: Optional[EjectionLimit] = None):
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.slow_start_duration = slow_start_duration
+        self.slow_start_initial = slow_start_initial
+        self.slow_start_doubling = slow_start_doubling
+        self.state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.open_until = 0.0
+        self.recovered_at = None
+        self._limit = limit
+
+    def allows(self, connections: int, now: float) -> bool:
+        """
+        Можно ли отправить воркеру еще один запрос при текущем числе подключений.
+
+        :param connections: int, текущее число подключений к воркеру.
+        :param now: float, текущее время (time.monotonic()).
+        :return: bool
+        """
+        if self.state == BreakerState.OPEN:
+            return False
+        if self.state == BreakerState.HALF_OPEN:
+            return connections < 1
+        limit = self.slow_start_limit(now)
+        return limit is None or connections < limit
+
+    def slow_start_limit(self, now: float) -> Optional[int]:
+        """
+        Текущий лимит одновременных запросов медленного старта.
+
+        :param now: float, текущее время (time.monotonic()).
+        :return: Optional[int], None - если медленный старт не идет.
+        """
+        if self.recovered_at is None:
+            return None
+        elapsed = now - self.recovered_at
+        if elapsed >= self.slow_start_duration:
+            self.recovered_at = None
+            return None
+        return math.floor(self.slow_start_initial * 2 ** (elapsed / self.slow_start_doubling))
+
+    def record_success(self, now: float) -> bool:
+        """
+        Учесть успешный расчет. Успешный пробный запрос замыкает автомат.
+
+        :param now: float, текущее время (time.monotonic()).
+        :return: bool, True - если автомат замкнулся.
+        """
+        self.consecutive_failures = 0
+        if self.state != BreakerState.HALF_OPEN:
+            return False
+        self.state = BreakerState.CLOSED
+        self.ejections = 0
+        if self._limit is not None:
+            self._limit.restore()
+        self.start_slow_start(now)
+        return True
+
+    def record_failure(self, now: float) -> bool:
+        """
+        Учесть неудачный расчет. Неудачный пробный запрос или failure_threshold неудач подряд размыкают автомат.
+
+        :param now: float, текущее время (time.monotonic()).
+        :return: bool, True - если автомат разомкнулся.
+        """
+        self.consecutive_failures += 1
+        if self.state == BreakerState.HALF_OPEN:
+            self._open(now)
+            return True
+        if self.state == BreakerState.CLOSED and 0 < self.failure_threshold <= self.consecutive_failures:
+            return self.eject(now)
+        return False
+
+    def eject(self, now: float) -> bool:
+        """
+        Разомкнуть замкнутый автомат, если позволяет общий лимит отключений.
+
+        :param now: float, текущее время (time.monotonic()).
+        :return: bool, True - если автомат разомкнулся.
+        """
+        if self.state != BreakerState.CLOSED:
+            return False
+        if self._limit is not None and not self._limit.try_eject():
+            return False
+        self._open(now)
+        return True
+
+    def tick(self, now: float) -> bool:
+        """
+        Обработать течение времени: по истечении отключения перевести автомат в half-open.
+
+        :param now: float, текущее время (time.monotonic()).
+        :return: bool, True - если воркер может принять больше запросов, чем раньше
+            (автомат перешел в half-open или идет медленный старт).
+        """
+        if self.state == BreakerState.OPEN:
+            if now < self.open_until:
+                return False
+            self.state = BreakerState.HALF_OPEN
+            return True
+        return self.slow_start_limit(now) is not None
+
+    def start_slow_start(self, now: float) -> None:
+        """
+        Начать медленный старт (если он включен).
+
+        :param now: float, текущее время (time.monotonic()).
+        :return: None
+        """
+        if self.slow_start_duration > 0:
+            self.recovered_at = now
+
+    def _open(self, now: float) -> None:
+        self.ejections += 1
+        self.state = BreakerState.OPEN
+        self.open_until = now + min(self.ejection_time * self.ejections, self.max_ejection_time)
+        self.recovered_at = None
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from models import Task, TaskStatus
+
+
+class CacheEntry:
+    """
+    Запись кэша: посчитанная таска, когда она протухнет и сколько примерно занимает памяти.
+    """
+    __slots__ = ("task", "expires", "size")
+
+    task: Task
+    expires: float
+    size: int
+
+    def __init__(self, task: Task, expires: float, size: int):
+        self.task = task
+        self.expires = expires
+        self.size = size
+
+
+class ResultCache:
+    """Кэш результатов расчета по payload с объединением одинаковых запросов (single-flight).
+
+    Ключ - хэш payload. Посчитанные таски (DONE) хранятся в LRU, ограниченном числом записей
+    (max_entries) и примерным объемом памяти (max_bytes), и живут ttl секунд. Если одинаковый
+    запрос уже считается, новые запросы не уходят на воркер, а ждут результата первого.
+    Если все, кто ждал расчет, ушли (отключились), расчет отменяется.
+
+    Attributes
+    ----------
+    max_entries : int
+        Максимальное число записей
+    max_bytes : int
+        Максимальный примерный объем записей в байтах
+    ttl : float
+        Время жизни записи в секундах
+    hits : int
+        Сколько запросов получили результат из кэша
+    misses : int
+        Сколько запросов ушли на воркер
+    coalesced : int
+        Сколько запросов дождались результата такого же запроса, уже ушедшего на воркер
+    evictions : int
+        Сколько записей вытеснено (по объему, числу записей или ttl)
+    size : int
+        Текущий примерный объем записей в байтах
+    _entries : OrderedDict[bytes, CacheEntry]
+        Записи в порядке последнего обращения
+    _in_flight : Dict[bytes, asyncio.Task]
+        Запросы, которые сейчас считаются
+    _waiters : Dict[asyncio.Task, int]
+        Сколько запросов ждут каждый расчет
+
+    Methods
+    -------
+    get_or_compute(self, payload: str, compute: Callable[[], Awaitable[Optional[Task]]]) -> Optional[Task]
+        Вернуть таску из кэша, дождаться такого же запроса или посчитать через compute().
+    """
+    ENTRY_OVERHEAD: int = 256
+
+    max_entries: int
+    max_bytes: int
+    ttl: float
+    hits: int
+    misses: int
+    coalesced: int
+    evictions: int
+    size: int
+    _entries: 'OrderedDict[bytes, CacheEntry]'
+    _in_flight: Dict[bytes, asyncio.Task]
+    _waiters: Dict[asyncio.Task, int]
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._waiters = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_compute(self, payload: str, compute: Callable[[], Awaitable[Optional[Task]]]) -> Optional[Task]:
+        """
+        Вернуть таску из кэша, дождаться результата такого же запроса или посчитать через compute().
+        Ошибки compute() получают все, кто ждал этот запрос. Если все ожидающие ушли, расчет отменяется.
+
+        :param payload: str, payload запроса.
+        :param compute: Callable[[], Awaitable[Optional[Task]]], расчет на воркере.
+        :return: Task, None - в случае ошибки расчета.
+        """
+        key = hashlib.blake2b(payload.encode(), digest_size=16).digest()
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.task
+            self._remove(key)
+            self.evictions += 1
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None and not in_flight.done():
+            self.coalesced += 1
+            return await self._wait(key, in_flight)
+
+        self.misses += 1
+        # Расчет идет отдельной задачей: если первый клиент уйдет, остальные все равно получат результат.
+        computation = asyncio.create_task(self._compute(key, compute))
+        computation.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._in_flight[key] = computation
+        return await self._wait(key, computation)
+
+    async def _wait(self, key: bytes, computation: asyncio.Task) -> Optional[Task]:
+        self._waiters[computation] = self._waiters.get(computation, 0) + 1
+        try:
+            return await asyncio.shield(computation)
+        finally:
+            waiters = self._waiters.pop(computation) - 1
+            if waiters > 0:
+                self._waiters[computation] = waiters
+            elif not computation.done():
+                # Ждать результата больше некому - отменяем расчет, чтобы освободить воркера. Из _in_flight
+                # он убирается сразу: отмена завершится не сразу, и новый такой же запрос не должен ее дождаться.
+                if self._in_flight.get(key) is computation:
+                    del self._in_flight[key]
+                computation.cancel()
+
+    async def _compute(self, key: bytes, compute: Callable[[], Awaitable[Optional[Task]]]) -> Optional[Task]:
+        try:
+            task = await compute()
+        finally:
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+        if task is not None and task.status == TaskStatus.DONE:
+            self._put(key, task, time.monotonic())
+        return task
+
+    def _put(self, key: bytes, task: Task, now: float) -> None:
+        size = len(task.payload) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(task, now + self.ttl, size)
+        self.size += size
+        while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes or
+                                 next(iter(self._entries.values())).expires <= now):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: bytes) -> None:
+        entry = self._entries.pop(key)
+        self.size -= entry.size
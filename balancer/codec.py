@@ -0,0 +1,35 @@
+import json
+from typing import Any, Union
+
+from pydantic.json import pydantic_encoder
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость, без нее работает стандартный json
+    orjson = None
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Разобрать JSON. Если установлен orjson - через него (в несколько раз быстрее json).
+
+    :param data: Union[bytes, str], JSON.
+    :return: Any
+    :raises ValueError: если data - не JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Сериализовать в JSON сразу в байты, без промежуточной строки. UUID, даты и перечисления
+    сериализуются так же, как в pydantic.
+
+    :param value: Any, значение (dict от модели, а не сама модель - см. BaseModel.dict()).
+    :return: bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=pydantic_encoder)
+    return json.dumps(value, default=pydantic_encoder).encode()
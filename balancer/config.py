@@ -1,6 +1,6 @@
 from abc import abstractmethod
 import xml.etree.ElementTree as ElementTree
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 
 
 class Config:
@@ -14,11 +14,26 @@ class Config:
 
 
 class WorkerConfig(Config):
+    DEFAULT_WEIGHT: float = 1.0
+    DEFAULT_MAX_CONNECTIONS: int = 0
+
     address: str
+    weight: float
+    max_connections: int
 
-    def __init__(self, address: str, *args, **kwargs):
+    def __init__(self,
+                 address: str,
+                 weight: float = DEFAULT_WEIGHT,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if weight <= 0:
+            raise ValueError("Weight must be positive!")
+        if max_connections < 0:
+            raise ValueError("Max connections must not be negative!")
         self.address = address
+        self.weight = weight
+        self.max_connections = max_connections
 
     @staticmethod
     def from_xml(xml_path: str) -> List['WorkerConfig']:
@@ -43,16 +58,615 @@ class WorkerConfig(Config):
         if address_element is None:
             return WorkerConfig(address="")
         address = address_element.text.strip()
-        return WorkerConfig(address=address)
+        weight = float(element.findtext('weight', WorkerConfig.DEFAULT_WEIGHT))
+        max_connections = int(element.findtext('max_connections', WorkerConfig.DEFAULT_MAX_CONNECTIONS))
+        return WorkerConfig(address=address, weight=weight, max_connections=max_connections)
+
+
+class ConnectionPoolConfig(Config):
+    DEFAULT_LIMIT: int = 0
+    DEFAULT_LIMIT_PER_HOST: int = 0
+    DEFAULT_DNS_CACHE_TTL: int = 10
+    DEFAULT_KEEPALIVE_TIMEOUT: float = 30.0
+
+    limit: int
+    limit_per_host: int
+    dns_cache_ttl: int
+    keepalive_timeout: float
+
+    def __init__(self,
+                 limit: int = DEFAULT_LIMIT,
+                 limit_per_host: int = DEFAULT_LIMIT_PER_HOST,
+                 dns_cache_ttl: int = DEFAULT_DNS_CACHE_TTL,
+                 keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'ConnectionPoolConfig':
+        if xml_path is None:
+            return ConnectionPoolConfig()
+        return ConnectionPoolConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('connection_pool'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'ConnectionPoolConfig':
+        if element is None:
+            return ConnectionPoolConfig()
+        return ConnectionPoolConfig(
+            limit=int(element.findtext('limit', ConnectionPoolConfig.DEFAULT_LIMIT)),
+            limit_per_host=int(element.findtext('limit_per_host', ConnectionPoolConfig.DEFAULT_LIMIT_PER_HOST)),
+            dns_cache_ttl=int(element.findtext('dns_cache_ttl', ConnectionPoolConfig.DEFAULT_DNS_CACHE_TTL)),
+            keepalive_timeout=float(element.findtext('keepalive_timeout',
+                                                     ConnectionPoolConfig.DEFAULT_KEEPALIVE_TIMEOUT)),
+        )
+
+
+class AdmissionConfig(Config):
+    DEFAULT_MAX_QUEUE_SIZE: int = 1000
+    DEFAULT_QUEUE_TIMEOUT: float = 30.0
+    DEFAULT_RETRY_AFTER: float = 1.0
+
+    max_queue_size: int
+    queue_timeout: float
+    retry_after: float
+    classes: Dict[str, float]
+
+    def __init__(self,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 queue_timeout: float = DEFAULT_QUEUE_TIMEOUT,
+                 retry_after: float = DEFAULT_RETRY_AFTER,
+                 classes: Optional[Dict[str, float]] = None,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if classes is None:
+            classes = {}
+        for name, weight in classes.items():
+            if weight <= 0:
+                raise ValueError(f"Weight of traffic class '{name}' must be positive!")
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.classes = classes
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'AdmissionConfig':
+        if xml_path is None:
+            return AdmissionConfig()
+        return AdmissionConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('admission'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'AdmissionConfig':
+        if element is None:
+            return AdmissionConfig()
+        classes = {}
+        classes_xml_element = element.find('classes')
+        if classes_xml_element is not None:
+            for class_xml_element in classes_xml_element.iterfind('class'):
+                classes[class_xml_element.findtext('name', '').strip()] = float(
+                    class_xml_element.findtext('weight', 1.0))
+        return AdmissionConfig(
+            max_queue_size=int(element.findtext('max_queue_size', AdmissionConfig.DEFAULT_MAX_QUEUE_SIZE)),
+            queue_timeout=float(element.findtext('queue_timeout', AdmissionConfig.DEFAULT_QUEUE_TIMEOUT)),
+            retry_after=float(element.findtext('retry_after', AdmissionConfig.DEFAULT_RETRY_AFTER)),
+            classes=classes,
+        )
+
+
+class RateLimitConfig(Config):
+    DEFAULT_RATE: float = 0.0
+    DEFAULT_BURST: float = 0.0
+    DEFAULT_MAX_TENANTS: int = 10000
+
+    rate: float
+    burst: float
+    tenants: Dict[str, Tuple[float, float]]
+    max_tenants: int
+
+    def __init__(self,
+                 rate: float = DEFAULT_RATE,
+                 burst: float = DEFAULT_BURST,
+                 tenants: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_tenants: int = DEFAULT_MAX_TENANTS,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if tenants is None:
+            tenants = {}
+        if rate < 0 or burst < 0 or any(limit < 0 for limits in tenants.values() for limit in limits):
+            raise ValueError("Rate limits must not be negative!")
+        if max_tenants < 1:
+            raise ValueError("Max tenants must be at least 1!")
+        self.rate = rate
+        self.burst = burst
+        self.tenants = tenants
+        self.max_tenants = max_tenants
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'RateLimitConfig':
+        if xml_path is None:
+            return RateLimitConfig()
+        return RateLimitConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('rate_limit'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'RateLimitConfig':
+        if element is None:
+            return RateLimitConfig()
+        rate = float(element.findtext('rate', RateLimitConfig.DEFAULT_RATE))
+        burst = float(element.findtext('burst', RateLimitConfig.DEFAULT_BURST))
+        tenants = {}
+        for tenant_xml_element in element.iterfind('tenant'):
+            tenant_rate = float(tenant_xml_element.findtext('rate', rate))
+            tenants[tenant_xml_element.findtext('name', '').strip()] = (
+                tenant_rate, float(tenant_xml_element.findtext('burst', tenant_rate)))
+        return RateLimitConfig(
+            rate=rate,
+            burst=burst,
+            tenants=tenants,
+            max_tenants=int(element.findtext('max_tenants', RateLimitConfig.DEFAULT_MAX_TENANTS)),
+        )
+
+
+class TasksConfig(Config):
+    DEFAULT_PENDING_TIMEOUT: float = 50.0
+    DEFAULT_RETENTION: float = 3600.0
+
+    pending_timeout: float
+    retention: float
+
+    def __init__(self,
+                 pending_timeout: float = DEFAULT_PENDING_TIMEOUT,
+                 retention: float = DEFAULT_RETENTION,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending_timeout = pending_timeout
+        self.retention = retention
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'TasksConfig':
+        if xml_path is None:
+            return TasksConfig()
+        return TasksConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('tasks'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'TasksConfig':
+        if element is None:
+            return TasksConfig()
+        return TasksConfig(
+            pending_timeout=float(element.findtext('pending_timeout', TasksConfig.DEFAULT_PENDING_TIMEOUT)),
+            retention=float(element.findtext('retention', TasksConfig.DEFAULT_RETENTION)),
+        )
+
+
+class CacheConfig(Config):
+    DEFAULT_ENABLED: bool = False
+    DEFAULT_MAX_ENTRIES: int = 10000
+    DEFAULT_MAX_BYTES: int = 64 * 1024 * 1024
+    DEFAULT_TTL: float = 300.0
+
+    enabled: bool
+    max_entries: int
+    max_bytes: int
+    ttl: float
+
+    def __init__(self,
+                 enabled: bool = DEFAULT_ENABLED,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: float = DEFAULT_TTL,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'CacheConfig':
+        if xml_path is None:
+            return CacheConfig()
+        return CacheConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('cache'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'CacheConfig':
+        if element is None:
+            return CacheConfig()
+        return CacheConfig(
+            enabled=element.findtext('enabled', str(CacheConfig.DEFAULT_ENABLED)).strip().lower() == 'true',
+            max_entries=int(element.findtext('max_entries', CacheConfig.DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(element.findtext('max_bytes', CacheConfig.DEFAULT_MAX_BYTES)),
+            ttl=float(element.findtext('ttl', CacheConfig.DEFAULT_TTL)),
+        )
+
+
+class RetryConfig(Config):
+    DEFAULT_MAX_ATTEMPTS: int = 3
+    DEFAULT_BUDGET_RATIO: float = 0.2
+    DEFAULT_MIN_RETRY_CONCURRENCY: int = 3
+    DEFAULT_REQUEST_TIMEOUT: float = 50.0
+
+    max_attempts: int
+    budget_ratio: float
+    min_retry_concurrency: int
+    request_timeout: float
+
+    def __init__(self,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 budget_ratio: float = DEFAULT_BUDGET_RATIO,
+                 min_retry_concurrency: int = DEFAULT_MIN_RETRY_CONCURRENCY,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if max_attempts < 1:
+            raise ValueError("Max attempts must be at least 1!")
+        if request_timeout <= 0:
+            raise ValueError("Request timeout must be positive!")
+        self.max_attempts = max_attempts
+        self.budget_ratio = budget_ratio
+        self.min_retry_concurrency = min_retry_concurrency
+        self.request_timeout = request_timeout
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'RetryConfig':
+        if xml_path is None:
+            return RetryConfig()
+        return RetryConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('retry'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'RetryConfig':
+        if element is None:
+            return RetryConfig()
+        return RetryConfig(
+            max_attempts=int(element.findtext('max_attempts', RetryConfig.DEFAULT_MAX_ATTEMPTS)),
+            budget_ratio=float(element.findtext('budget_ratio', RetryConfig.DEFAULT_BUDGET_RATIO)),
+            min_retry_concurrency=int(element.findtext('min_retry_concurrency',
+                                                       RetryConfig.DEFAULT_MIN_RETRY_CONCURRENCY)),
+            request_timeout=float(element.findtext('request_timeout', RetryConfig.DEFAULT_REQUEST_TIMEOUT)),
+        )
+
+
+class OutlierDetectionConfig(Config):
+    DEFAULT_CONSECUTIVE_FAILURES: int = 0
+    DEFAULT_EJECTION_TIME: float = 30.0
+    DEFAULT_MAX_EJECTION_TIME: float = 300.0
+    DEFAULT_MAX_EJECTION_PERCENT: float = 50.0
+    DEFAULT_LATENCY_FACTOR: float = 0.0
+    DEFAULT_SLOW_START_DURATION: float = 30.0
+    DEFAULT_SLOW_START_INITIAL: int = 1
+    DEFAULT_SLOW_START_DOUBLING: float = 5.0
+
+    consecutive_failures: int
+    ejection_time: float
+    max_ejection_time: float
+    max_ejection_percent: float
+    latency_factor: float
+    slow_start_duration: float
+    slow_start_initial: int
+    slow_start_doubling: float
+
+    def __init__(self,
+                 consecutive_failures: int = DEFAULT_CONSECUTIVE_FAILURES,
+                 ejection_time: float = DEFAULT_EJECTION_TIME,
+                 max_ejection_time: float = DEFAULT_MAX_EJECTION_TIME,
+                 max_ejection_percent: float = DEFAULT_MAX_EJECTION_PERCENT,
+                 latency_factor: float = DEFAULT_LATENCY_FACTOR,
+                 slow_start_duration: float = DEFAULT_SLOW_START_DURATION,
+                 slow_start_initial: int = DEFAULT_SLOW_START_INITIAL,
+                 slow_start_doubling: float = DEFAULT_SLOW_START_DOUBLING,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if slow_start_initial < 1:
+            raise ValueError("Slow start initial connections must be at least 1!")
+        if slow_start_doubling <= 0:
+            raise ValueError("Slow start doubling interval must be positive!")
+        self.consecutive_failures = consecutive_failures
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.max_ejection_percent = max_ejection_percent
+        self.latency_factor = latency_factor
+        self.slow_start_duration = slow_start_duration
+        self.slow_start_initial = slow_start_initial
+        self.slow_start_doubling = slow_start_doubling
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'OutlierDetectionConfig':
+        if xml_path is None:
+            return OutlierDetectionConfig()
+        return OutlierDetectionConfig.from_xml_element(
+            ElementTree.parse(xml_path).getroot().find('outlier_detection'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'OutlierDetectionConfig':
+        if element is None:
+            return OutlierDetectionConfig()
+        return OutlierDetectionConfig(
+            consecutive_failures=int(element.findtext('consecutive_failures',
+                                                      OutlierDetectionConfig.DEFAULT_CONSECUTIVE_FAILURES)),
+            ejection_time=float(element.findtext('ejection_time', OutlierDetectionConfig.DEFAULT_EJECTION_TIME)),
+            max_ejection_time=float(element.findtext('max_ejection_time',
+                                                     OutlierDetectionConfig.DEFAULT_MAX_EJECTION_TIME)),
+            max_ejection_percent=float(element.findtext('max_ejection_percent',
+                                                        OutlierDetectionConfig.DEFAULT_MAX_EJECTION_PERCENT)),
+            latency_factor=float(element.findtext('latency_factor', OutlierDetectionConfig.DEFAULT_LATENCY_FACTOR)),
+            slow_start_duration=float(element.findtext('slow_start_duration',
+                                                       OutlierDetectionConfig.DEFAULT_SLOW_START_DURATION)),
+            slow_start_initial=int(element.findtext('slow_start_initial',
+                                                    OutlierDetectionConfig.DEFAULT_SLOW_START_INITIAL)),
+            slow_start_doubling=float(element.findtext('slow_start_doubling',
+                                                       OutlierDetectionConfig.DEFAULT_SLOW_START_DOUBLING)),
+        )
+
+
+class ProxyConfig(Config):
+    DEFAULT_PASSTHROUGH: bool = False
+    DEFAULT_VALIDATE: bool = True
+
+    passthrough: bool
+    validate: bool
+
+    def __init__(self,
+                 passthrough: bool = DEFAULT_PASSTHROUGH,
+                 validate: bool = DEFAULT_VALIDATE,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.passthrough = passthrough
+        self.validate = validate
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'ProxyConfig':
+        if xml_path is None:
+            return ProxyConfig()
+        return ProxyConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('proxy'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'ProxyConfig':
+        if element is None:
+            return ProxyConfig()
+        return ProxyConfig(
+            passthrough=element.findtext('passthrough', str(ProxyConfig.DEFAULT_PASSTHROUGH)).strip().lower() == 'true',
+            validate=element.findtext('validate', str(ProxyConfig.DEFAULT_VALIDATE)).strip().lower() == 'true',
+        )
+
+
+class AffinityConfig(Config):
+    DEFAULT_ENABLED: bool = False
+    DEFAULT_VIRTUAL_NODES: int = 100
+    DEFAULT_LOAD_FACTOR: float = 1.25
+    DEFAULT_HASH_PAYLOAD: bool = True
+
+    enabled: bool
+    virtual_nodes: int
+    load_factor: float
+    hash_payload: bool
+
+    def __init__(self,
+                 enabled: bool = DEFAULT_ENABLED,
+                 virtual_nodes: int = DEFAULT_VIRTUAL_NODES,
+                 load_factor: float = DEFAULT_LOAD_FACTOR,
+                 hash_payload: bool = DEFAULT_HASH_PAYLOAD,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if virtual_nodes < 1:
+            raise ValueError("Virtual nodes must be at least 1!")
+        if load_factor < 1:
+            raise ValueError("Load factor must be at least 1!")
+        self.enabled = enabled
+        self.virtual_nodes = virtual_nodes
+        self.load_factor = load_factor
+        self.hash_payload = hash_payload
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'AffinityConfig':
+        if xml_path is None:
+            return AffinityConfig()
+        return AffinityConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('affinity'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'AffinityConfig':
+        if element is None:
+            return AffinityConfig()
+        return AffinityConfig(
+            enabled=element.findtext('enabled', str(AffinityConfig.DEFAULT_ENABLED)).strip().lower() == 'true',
+            virtual_nodes=int(element.findtext('virtual_nodes', AffinityConfig.DEFAULT_VIRTUAL_NODES)),
+            load_factor=float(element.findtext('load_factor', AffinityConfig.DEFAULT_LOAD_FACTOR)),
+            hash_payload=element.findtext('hash_payload',
+                                          str(AffinityConfig.DEFAULT_HASH_PAYLOAD)).strip().lower() == 'true',
+        )
+
+
+class HedgingConfig(Config):
+    DEFAULT_ENABLED: bool = False
+    DEFAULT_PERCENTILE: float = 95.0
+    DEFAULT_BUDGET_RATIO: float = 0.1
+    DEFAULT_WINDOW: int = 1000
+
+    enabled: bool
+    percentile: float
+    budget_ratio: float
+    window: int
+
+    def __init__(self,
+                 enabled: bool = DEFAULT_ENABLED,
+                 percentile: float = DEFAULT_PERCENTILE,
+                 budget_ratio: float = DEFAULT_BUDGET_RATIO,
+                 window: int = DEFAULT_WINDOW,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not 0 < percentile < 100:
+            raise ValueError("Hedging percentile must be between 0 and 100!")
+        if not 0 < budget_ratio <= 1:
+            raise ValueError("Hedging budget ratio must be in (0, 1]!")
+        if window < 1:
+            raise ValueError("Hedging window must be at least 1!")
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.window = window
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'HedgingConfig':
+        if xml_path is None:
+            return HedgingConfig()
+        return HedgingConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('hedging'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'HedgingConfig':
+        if element is None:
+            return HedgingConfig()
+        return HedgingConfig(
+            enabled=element.findtext('enabled', str(HedgingConfig.DEFAULT_ENABLED)).strip().lower() == 'true',
+            percentile=float(element.findtext('percentile', HedgingConfig.DEFAULT_PERCENTILE)),
+            budget_ratio=float(element.findtext('budget_ratio', HedgingConfig.DEFAULT_BUDGET_RATIO)),
+            window=int(element.findtext('window', HedgingConfig.DEFAULT_WINDOW)),
+        )
+
+
+class ReplicationConfig(Config):
+    DEFAULT_ENABLED: bool = False
+    DEFAULT_LISTEN: str = "127.0.0.1:9100"
+    DEFAULT_INTERVAL: float = 0.1
+    DEFAULT_PEER_TIMEOUT: float = 1.0
+    DEFAULT_SECRET: Optional[str] = None
+
+    enabled: bool
+    listen: str
+    peers: List[str]
+    interval: float
+    peer_timeout: float
+    secret: Optional[str]
+
+    def __init__(self,
+                 enabled: bool = DEFAULT_ENABLED,
+                 listen: str = DEFAULT_LISTEN,
+                 peers: Optional[List[str]] = None,
+                 interval: float = DEFAULT_INTERVAL,
+                 peer_timeout: float = DEFAULT_PEER_TIMEOUT,
+                 secret: Optional[str] = DEFAULT_SECRET,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if peers is None:
+            peers = []
+        for address in [listen] + peers:
+            if not address.rpartition(":")[2].isdigit():
+                raise ValueError(f"Replication address '{address}' must be host:port!")
+        if interval <= 0:
+            raise ValueError("Replication interval must be positive!")
+        if peer_timeout <= interval:
+            raise ValueError("Replication peer timeout must be greater than the interval!")
+        self.enabled = enabled
+        self.listen = listen
+        self.peers = peers
+        self.interval = interval
+        self.peer_timeout = peer_timeout
+        self.secret = secret or None
+
+    @staticmethod
+    def from_xml(xml_path: str) -> 'ReplicationConfig':
+        if xml_path is None:
+            return ReplicationConfig()
+        return ReplicationConfig.from_xml_element(ElementTree.parse(xml_path).getroot().find('replication'))
+
+    @staticmethod
+    def from_xml_element(element: ElementTree.Element) -> 'ReplicationConfig':
+        if element is None:
+            return ReplicationConfig()
+        peers = []
+        peers_xml_element = element.find('peers')
+        if peers_xml_element is not None:
+            peers = [peer.text.strip() for peer in peers_xml_element.iterfind('peer') if peer.text]
+        return ReplicationConfig(
+            enabled=element.findtext('enabled', str(ReplicationConfig.DEFAULT_ENABLED)).strip().lower() == 'true',
+            listen=element.findtext('listen', ReplicationConfig.DEFAULT_LISTEN).strip(),
+            peers=peers,
+            interval=float(element.findtext('interval', ReplicationConfig.DEFAULT_INTERVAL)),
+            peer_timeout=float(element.findtext('peer_timeout', ReplicationConfig.DEFAULT_PEER_TIMEOUT)),
+            secret=(element.findtext('secret') or '').strip() or ReplicationConfig.DEFAULT_SECRET,
+        )
 
 
 class BalancerConfig(Config):
+    DEFAULT_HEALTHCHECK_INTERVAL: float = 2.0
+    DEFAULT_HEALTHCHECK_JITTER: float = 0.5
+    DEFAULT_STRATEGY: str = "least_connections"
+    DEFAULT_RELOAD_INTERVAL: float = 2.0
+
     workers: List[WorkerConfig]
+    healthcheck_interval: float
+    healthcheck_jitter: float
+    reload_interval: float
+    connection_pool: ConnectionPoolConfig
+    strategy: str
+    admission: AdmissionConfig
+    tasks: TasksConfig
+    cache: CacheConfig
+    retry: RetryConfig
+    outlier_detection: OutlierDetectionConfig
+    proxy: ProxyConfig
+    affinity: AffinityConfig
+    hedging: HedgingConfig
+    rate_limit: RateLimitConfig
+    replication: ReplicationConfig
 
-    def __init__(self, workers: Optional[List[WorkerConfig]] = None, *args, **kwargs):
+    def __init__(self,
+                 workers: Optional[List[WorkerConfig]] = None,
+                 healthcheck_interval: float = DEFAULT_HEALTHCHECK_INTERVAL,
+                 healthcheck_jitter: float = DEFAULT_HEALTHCHECK_JITTER,
+                 connection_pool: Optional[ConnectionPoolConfig] = None,
+                 strategy: str = DEFAULT_STRATEGY,
+                 admission: Optional[AdmissionConfig] = None,
+                 tasks: Optional[TasksConfig] = None,
+                 cache: Optional[CacheConfig] = None,
+                 retry: Optional[RetryConfig] = None,
+                 outlier_detection: Optional[OutlierDetectionConfig] = None,
+                 reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+                 proxy: Optional[ProxyConfig] = None,
+                 affinity: Optional[AffinityConfig] = None,
+                 hedging: Optional[HedgingConfig] = None,
+                 rate_limit: Optional[RateLimitConfig] = None,
+                 replication: Optional[ReplicationConfig] = None,
+                 *args, **kwargs):
         if workers is None:
             workers = []
+        if connection_pool is None:
+            connection_pool = ConnectionPoolConfig()
+        if admission is None:
+            admission = AdmissionConfig()
+        if tasks is None:
+            tasks = TasksConfig()
+        if cache is None:
+            cache = CacheConfig()
+        if retry is None:
+            retry = RetryConfig()
+        if outlier_detection is None:
+            outlier_detection = OutlierDetectionConfig()
+        if proxy is None:
+            proxy = ProxyConfig()
+        if affinity is None:
+            affinity = AffinityConfig()
+        if hedging is None:
+            hedging = HedgingConfig()
+        if rate_limit is None:
+            rate_limit = RateLimitConfig()
+        if replication is None:
+            replication = ReplicationConfig()
         self.workers = workers
+        self.healthcheck_interval = healthcheck_interval
+        self.healthcheck_jitter = healthcheck_jitter
+        self.connection_pool = connection_pool
+        self.strategy = strategy
+        self.admission = admission
+        self.tasks = tasks
+        self.cache = cache
+        self.retry = retry
+        self.outlier_detection = outlier_detection
+        self.reload_interval = reload_interval
+        self.proxy = proxy
+        self.affinity = affinity
+        self.hedging = hedging
+        self.rate_limit = rate_limit
+        self.replication = replication
         super().__init__()
 
     @staticmethod
@@ -65,12 +679,39 @@ class BalancerConfig(Config):
     def from_xml_element(element: ElementTree.Element) -> 'BalancerConfig':
         if element is None:
             return BalancerConfig()
-        workers_xml_element = element.find('workers')
-        if workers_xml_element is None:
-            return BalancerConfig()
 
         workers_configs = []
-        for worker_xml_element in workers_xml_element.iterfind('worker'):
-            workers_configs.append(WorkerConfig.from_xml_element(worker_xml_element))
+        workers_xml_element = element.find('workers')
+        if workers_xml_element is not None:
+            for worker_xml_element in workers_xml_element.iterfind('worker'):
+                workers_configs.append(WorkerConfig.from_xml_element(worker_xml_element))
+
+        healthcheck_interval = BalancerConfig.DEFAULT_HEALTHCHECK_INTERVAL
+        healthcheck_jitter = BalancerConfig.DEFAULT_HEALTHCHECK_JITTER
+        healthcheck_xml_element = element.find('healthcheck')
+        if healthcheck_xml_element is not None:
+            healthcheck_interval = float(healthcheck_xml_element.findtext('interval', healthcheck_interval))
+            healthcheck_jitter = float(healthcheck_xml_element.findtext('jitter', healthcheck_jitter))
+
+        reload_interval = BalancerConfig.DEFAULT_RELOAD_INTERVAL
+        reload_xml_element = element.find('reload')
+        if reload_xml_element is not None:
+            reload_interval = float(reload_xml_element.findtext('interval', reload_interval))
 
-        return BalancerConfig(workers=workers_configs)
+        return BalancerConfig(workers=workers_configs,
+                              healthcheck_interval=healthcheck_interval,
+                              healthcheck_jitter=healthcheck_jitter,
+                              connection_pool=ConnectionPoolConfig.from_xml_element(element.find('connection_pool')),
+                              strategy=element.findtext('strategy', BalancerConfig.DEFAULT_STRATEGY).strip(),
+                              admission=AdmissionConfig.from_xml_element(element.find('admission')),
+                              tasks=TasksConfig.from_xml_element(element.find('tasks')),
+                              cache=CacheConfig.from_xml_element(element.find('cache')),
+                              retry=RetryConfig.from_xml_element(element.find('retry')),
+                              outlier_detection=OutlierDetectionConfig.from_xml_element(
+                                  element.find('outlier_detection')),
+                              reload_interval=reload_interval,
+                              proxy=ProxyConfig.from_xml_element(element.find('proxy')),
+                              affinity=AffinityConfig.from_xml_element(element.find('affinity')),
+                              hedging=HedgingConfig.from_xml_element(element.find('hedging')),
+                              rate_limit=RateLimitConfig.from_xml_element(element.find('rate_limit')),
+                              replication=ReplicationConfig.from_xml_element(element.find('replication')))
@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import socket
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import codec
+from models import WorkerStatus
+
+logger = logging.getLogger("Balancer")
+
+WorkerState = Tuple[int, int, float]
+
+
+class PeerState:
+    """
+    Последнее состояние воркеров, полученное от реплики: по адресу воркера - (подключения реплики к воркеру,
+    статус воркера по ее данным, когда (time.monotonic() этого процесса) она получила этот статус).
+    """
+    __slots__ = ("seq", "seen", "workers")
+
+    seq: int
+    seen: float
+    workers: Dict[str, WorkerState]
+
+    def __init__(self, seq: int, seen: float, workers: Dict[str, WorkerState]):
+        self.seq = seq
+        self.seen = seen
+        self.workers = workers
+
+
+class Gossip(asyncio.DatagramProtocol):
+    """Обмен состоянием воркеров между репликами балансера по UDP.
+
+    Раз в interval секунд реплика отправляет всем peers снимок своего состояния: сколько у нее подключений
+    к каждому воркеру и последний статус воркера с его возрастом. Отправляется полное состояние, а не изменения:
+    потерянный или пришедший не по порядку пакет (старые отбрасываются по seq) исправляется следующим,
+    и счетчики реплик не расходятся. Реплика, от которой ничего не было peer_timeout секунд, забывается
+    вместе со своими подключениями, так что упавшая реплика не держит воркеров занятыми.
+
+    Обмен идет в фоне и на пути запроса не участвует: чужая загруженность отстает от настоящей
+    не больше чем на interval (плюс доставка пакета).
+    Реплики различаются по случайному node, поэтому свой адрес можно оставить в peers (одинаковый конфиг
+    у всех реплик), а перезапущенная реплика считается новой.
+
+    Принимаются только пакеты с адресов из peers. Если задан secret, каждый пакет подписывается HMAC-SHA256
+    (подпись идет перед содержимым), и пакеты без верной подписи отбрасываются: иначе любой, кто может
+    отправить UDP-пакет, мог бы занять воркеров фиктивными подключениями или вывести их из ротации.
+
+    Attributes
+    ----------
+    _RESOLVE_INTERVAL : float
+        Как часто заново разрешать имена реплик в адреса, в секундах
+    _DIGEST_SIZE : int
+        Размер подписи пакета в байтах
+    node : str
+        Идентификатор реплики
+    listen : str
+        Адрес host:port, на котором реплика принимает пакеты
+    peers : List[str]
+        Адреса host:port реплик
+    interval : float
+        Интервал между отправками состояния в секундах
+    peer_timeout : float
+        Через сколько секунд без пакетов реплика забывается
+    sent : int
+        Сколько пакетов отправлено
+    received : int
+        Сколько пакетов принято
+    invalid : int
+        Сколько пакетов отброшено как некорректные
+    rejected : int
+        Сколько пакетов отброшено из-за чужого адреса или неверной подписи
+    _secret : Optional[bytes]
+        Ключ подписи пакетов, None - пакеты не подписываются
+    _snapshot : Callable[[], Dict[str, WorkerState]]
+        Состояние воркеров этой реплики: по адресу - (подключения, статус, возраст статуса в секундах)
+    _on_change : Callable[[], None]
+        Вызывается, когда изменилось состояние реплик (пришел пакет или реплика забыта)
+    _peers : Dict[str, PeerState]
+        Состояние реплик по node
+    _seq : int
+        Номер следующего пакета
+    _addresses : Dict[str, Tuple[str, int]]
+        Разрешенные адреса реплик
+    _sources : Set[Tuple[str, int]]
+        Адреса, с которых принимаются пакеты
+    _transport : Optional[asyncio.DatagramTransport]
+        UDP-сокет
+    _task : Optional[asyncio.Task]
+        Фоновая задача отправки
+
+    Methods
+    -------
+    start(self) -> None
+        Открыть сокет и начать отправку состояния.
+    stop(self) -> None
+        Остановить отправку и закрыть сокет.
+    connections(self, address: str) -> int
+        Сколько подключений к воркеру у остальных реплик.
+    freshest_status(self, address: str) -> Optional[Tuple[WorkerStatus, float]]
+        Самый свежий статус воркера по данным реплик.
+    live_peers(self) -> int
+        Сколько реплик сейчас присылают состояние.
+    """
+    _RESOLVE_INTERVAL: float = 10.0
+    _DIGEST_SIZE: int = hashlib.sha256().digest_size
+
+    node: str
+    listen: str
+    peers: List[str]
+    interval: float
+    peer_timeout: float
+    sent: int
+    received: int
+    invalid: int
+    rejected: int
+    _secret: Optional[bytes]
+    _snapshot: Callable[[], Dict[str, WorkerState]]
+    _on_change: Callable[[], None]
+    _peers: Dict[str, PeerState]
+    _seq: int
+    _addresses: Dict[str, Tuple[str, int]]
+    _sources: Set[Tuple[str, int]]
+    _transport: Optional[asyncio.DatagramTransport]
+    _task: Optional[asyncio.Task]
+
+    def __init__(self, listen: str, peers: List[str], interval: float, peer_timeout: float,
+                 snapshot: Callable[[], Dict[str, WorkerState]], on_change: Callable[[], None],
+                 secret: Optional[str] = None):
+        self.node = uuid.uuid4().hex
+        self.listen = listen
+        self.peers = peers
+        self.interval = interval
+        self.peer_timeout = peer_timeout
+        self.sent = 0
+        self.received = 0
+        self.invalid = 0
+        self.rejected = 0
+        self._secret = secret.encode() if secret else None
+        self._snapshot = snapshot
+        self._on_change = on_change
+        self._peers = {}
+        self._seq = 0
+        self._addresses = {}
+        self._sources = set()
+        self._transport = None
+        self._task = None
+
+    @property
+    def live_peers(self) -> int:
+        return len(self._peers)
+
+    async def start(self) -> None:
+        """
+        Открыть сокет и начать отправку состояния.
+
+        :return: None
+        """
+        host, port = split_address(self.listen)
+        self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: self, local_addr=(host, port), family=socket.AF_INET)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Gossip node {self.node} is listening on {self.listen}, peers: {', '.join(self.peers)}.")
+
+    async def stop(self) -> None:
+        """
+        Остановить отправку и закрыть сокет.
+
+        :return: None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass  # noqa
+            self._task = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def connections(self, address: str) -> int:
+        """
+        Сколько подключений к воркеру у остальных реплик.
+
+        :param address: str, адрес воркера.
+        :return: int
+        """
+        return sum(peer.workers[address][0] for peer in self._peers.values() if address in peer.workers)
+
+    def freshest_status(self, address: str) -> Optional[Tuple[WorkerStatus, float]]:
+        """
+        Самый свежий статус воркера по данным реплик.
+
+        :param address: str, адрес воркера.
+        :return: Optional[Tuple[WorkerStatus, float]], (статус, когда (time.monotonic()) реплика его получила),
+            None - если реплики о воркере не сообщали.
+        """
+        freshest = None
+        for peer in self._peers.values():
+            state = peer.workers.get(address)
+            if state is not None and (freshest is None or state[2] > freshest[1]):
+                freshest = (WorkerStatus(state[1]), state[2])
+        return freshest
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        if tuple(addr[:2]) not in self._sources:
+            self.rejected += 1
+            logger.debug(f"Gossip message from unknown address {addr[0]}:{addr[1]} dropped.")
+            return
+        if self._secret is not None:
+            signature, data = data[:self._DIGEST_SIZE], data[self._DIGEST_SIZE:]
+            if not hmac.compare_digest(signature, self._sign(data)):
+                self.rejected += 1
+                logger.debug(f"Gossip message from {addr[0]}:{addr[1]} has a wrong signature, dropped.")
+                return
+        now = time.monotonic()
+        try:
+            message = codec.loads(data)
+            node = str(message["node"])
+            seq = int(message["seq"])
+            workers = {str(address): (int(connections), int(WorkerStatus(status)), now - _age(age))
+                       for address, (connections, status, age) in message["workers"].items()}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.invalid += 1
+            return
+        if node == self.node:
+            return
+        self.received += 1
+        peer = self._peers.get(node)
+        if peer is not None and seq <= peer.seq:
+            return
+        self._peers[node] = PeerState(seq, now, workers)
+        self._on_change()
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP port unreachable от еще не запущенной реплики - обычное дело, реплика просто не получит пакет.
+        logger.debug(f"Gossip send failed: {exc}")
+
+    async def _run(self) -> None:
+        """
+        Бесконечный цикл: раз в interval секунд забывает молчащие реплики и отправляет остальным свое состояние.
+
+        :return: None
+        """
+        resolved = None
+        while True:
+            now = time.monotonic()
+            if resolved is None or now - resolved >= self._RESOLVE_INTERVAL:
+                await self._resolve()
+                resolved = now
+            expired = [node for node, peer in self._peers.items() if now - peer.seen > self.peer_timeout]
+            for node in expired:
+                logger.warning(f"Gossip peer {node} is silent for {self.peer_timeout}s, forgetting it.")
+                del self._peers[node]
+            if expired:
+                self._on_change()
+            self._send()
+            await asyncio.sleep(self.interval)
+
+    def _send(self) -> None:
+        """
+        Отправляет снимок состояния всем репликам.
+
+        :return: None
+        """
+        if self._transport is None or not self._addresses:
+            return
+        self._seq += 1
+        data = codec.dumps({"node": self.node, "seq": self._seq, "workers": self._snapshot()})
+        if self._secret is not None:
+            data = self._sign(data) + data
+        for address in self._addresses.values():
+            self._transport.sendto(data, address)
+            self.sent += 1
+
+    async def _resolve(self) -> None:
+        """
+        Разрешает имена реплик в адреса заранее: sendto с именем хоста разрешал бы его синхронно на каждый пакет.
+        Реплика, имя которой не разрешилось, пропускается до следующей попытки.
+
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        addresses = {}
+        for peer in self.peers:
+            host, port = split_address(peer)
+            try:
+                info = await loop.getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            except OSError as e:
+                logger.warning(f"Failed to resolve gossip peer {peer}: {e}")
+                continue
+            addresses[peer] = info[0][4]
+        self._addresses = addresses
+        self._sources = {address[:2] for address in addresses.values()}
+
+    def _sign(self, data: bytes) -> bytes:
+        return hmac.new(self._secret, data, hashlib.sha256).digest()
+
+
+def _age(value: float) -> float:
+    """
+    Возраст статуса из пакета реплики: отрицательный выдавал бы статус за полученный в будущем,
+    и он перекрывал бы собственные проверки.
+
+    :param value: float, возраст в секундах.
+    :return: float
+    :raises ValueError: если возраст отрицательный или не число.
+    """
+    age = float(value)
+    if not age >= 0:
+        raise ValueError(f"Invalid status age {value}!")
+    return age
+
+
+def split_address(address: str) -> Tuple[str, int]:
+    """
+    Разбирает адрес host:port.
+
+    :param address: str, адрес.
+    :return: Tuple[str, int], хост и порт.
+    """
+    host, _, port = address.rpartition(":")
+    return host or "0.0.0.0", int(port)
@@ -0,0 +1,119 @@
+import hashlib
+from bisect import bisect_right
+from typing import Dict, Generic, Iterator, List, TypeVar
+
+T = TypeVar('T')
+
+
+def ring_hash(key: str) -> int:
+    """
+    Хэш ключа на кольце: первые 8 байт blake2b. Встроенный hash() не подходит - он различается
+    между процессами балансера, а ключ должен попадать на одного воркера во всех процессах.
+
+    :param key: str, ключ.
+    :return: int, точка на кольце.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing(Generic[T]):
+    """Кольцо консистентного хэширования с виртуальными узлами.
+
+    Каждый воркер занимает на кольце virtual_nodes точек (хэши "адрес#номер"), ключ принадлежит
+    первой точке по часовой стрелке от своего хэша. Виртуальные узлы выравнивают доли воркеров,
+    а при добавлении или удалении воркера меняют владельца только его точки - около 1/N ключей.
+
+    Attributes
+    ----------
+    DEFAULT_VIRTUAL_NODES : int
+        Число виртуальных узлов на воркера по умолчанию
+    virtual_nodes : int
+        Число виртуальных узлов на воркера
+    _items : Dict[str, T]
+        Воркеры кольца по имени (адресу)
+    _points : List[int]
+        Отсортированные точки кольца
+    _owners : List[T]
+        Владелец каждой точки (параллельно _points)
+
+    Methods
+    -------
+    add(self, name: str, item: T) -> None
+        Добавить воркера на кольцо (если воркер с таким именем уже есть - заменить).
+    remove(self, name: str) -> None
+        Убрать воркера с кольца (если он там есть).
+    walk(self, key: str) -> Iterator[T]
+        Обойти различных воркеров по часовой стрелке, начиная с владельца ключа.
+    """
+    DEFAULT_VIRTUAL_NODES: int = 100
+
+    virtual_nodes: int
+    _items: Dict[str, T]
+    _points: List[int]
+    _owners: List[T]
+
+    def __init__(self, virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        if virtual_nodes < 1:
+            raise ValueError("Virtual nodes must be at least 1!")
+        self.virtual_nodes = virtual_nodes
+        self._items = {}
+        self._points = []
+        self._owners = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, name: str, item: T) -> None:
+        """
+        Добавить воркера на кольцо. Если воркер с таким именем уже есть, он заменяется.
+
+        :param name: str, имя воркера (адрес), от него зависят его точки на кольце.
+        :param item: T, воркер.
+        :return: None
+        """
+        self._items[name] = item
+        self._rebuild()
+
+    def remove(self, name: str) -> None:
+        """
+        Убрать воркера с кольца (если он там есть).
+
+        :param name: str, имя воркера (адрес).
+        :return: None
+        """
+        if self._items.pop(name, None) is not None:
+            self._rebuild()
+
+    def walk(self, key: str) -> Iterator[T]:
+        """
+        Обойти различных воркеров по часовой стрелке, начиная с владельца ключа. Обычно нужен только первый
+        или несколько первых, поэтому обход ленивый.
+
+        :param key: str, ключ.
+        :return: Iterator[T], воркеры в порядке обхода, каждый по одному разу.
+        """
+        points = len(self._points)
+        if not points:
+            return
+        seen = set()
+        start = bisect_right(self._points, ring_hash(key))
+        for offset in range(points):
+            owner = self._owners[(start + offset) % points]
+            if owner in seen:
+                continue
+            seen.add(owner)
+            yield owner
+            if len(seen) == len(self._items):
+                return
+
+    def _rebuild(self) -> None:
+        """
+        Пересобирает кольцо. Состав воркеров меняется редко (реконфигурация, регистрация),
+        поэтому кольцо просто строится заново за O(N * virtual_nodes * log).
+
+        :return: None
+        """
+        ring = sorted((ring_hash(f"{name}#{index}"), name)
+                      for name in self._items for index in range(self.virtual_nodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [self._items[name] for _, name in ring]
@@ -0,0 +1,122 @@
+import math
+import time
+from collections import deque
+from typing import Deque, Optional
+
+
+class PeakEwma:
+    """Peak-EWMA оценка задержки ответа воркера.
+
+    Обычное экспоненциальное скользящее среднее, но при всплеске (наблюдение больше
+    текущей оценки) оценка сразу поднимается до наблюдения, а затем плавно затухает.
+    Вес старых наблюдений зависит от прошедшего времени, а не от числа наблюдений:
+    через decay секунд влияние старой оценки уменьшается в e раз.
+
+    Attributes
+    ----------
+    decay : float
+        Характерное время затухания в секундах
+    value : float
+        Текущая оценка задержки в секундах
+    _timestamp : Optional[float]
+        Время последнего наблюдения (time.monotonic()), None - если наблюдений не было
+
+    Methods
+    -------
+    observe(self, sample: float) -> None
+        Учесть новое наблюдение задержки.
+    """
+    decay: float
+    value: float
+    _timestamp: Optional[float]
+
+    def __init__(self, decay: float = 10.0, initial: float = 0.0):
+        self.decay = decay
+        self.value = initial
+        self._timestamp = None
+
+    def observe(self, sample: float) -> None:
+        """
+        Учесть новое наблюдение задержки.
+
+        :param sample: float, наблюдаемая задержка в секундах.
+        :return: None
+        """
+        now = time.monotonic()
+        if self._timestamp is None or sample > self.value:
+            self.value = sample
+        else:
+            weight = math.exp(-(now - self._timestamp) / self.decay)
+            self.value = self.value * weight + sample * (1 - weight)
+        self._timestamp = now
+
+
+class LatencyWindow:
+    """Скользящее окно последних задержек для оценки перцентиля.
+
+    Хранит size последних наблюдений. Перцентиль пересчитывается сортировкой окна не на каждый запрос,
+    а раз в refresh новых наблюдений, так что чтение - O(1), а пересчет - O(size log size) на refresh наблюдений.
+
+    Attributes
+    ----------
+    DEFAULT_SIZE : int
+        Размер окна по умолчанию
+    MIN_SAMPLES : int
+        Сколько наблюдений нужно, чтобы оценка перцентиля имела смысл
+    percentile : float
+        Оцениваемый перцентиль (0-100)
+    refresh : int
+        Через сколько новых наблюдений пересчитывать перцентиль
+    _samples : Deque[float]
+        Последние наблюдения в секундах
+    _fresh : int
+        Сколько наблюдений добавлено с последнего пересчета
+    _value : Optional[float]
+        Последняя оценка перцентиля, None - наблюдений пока мало
+
+    Methods
+    -------
+    observe(self, sample: float) -> None
+        Учесть новое наблюдение задержки.
+    value(self) -> Optional[float]
+        Текущая оценка перцентиля в секундах.
+    """
+    DEFAULT_SIZE: int = 1000
+    MIN_SAMPLES: int = 20
+
+    percentile: float
+    refresh: int
+    _samples: Deque[float]
+    _fresh: int
+    _value: Optional[float]
+
+    def __init__(self, percentile: float, size: int = DEFAULT_SIZE):
+        self.percentile = percentile
+        self.refresh = max(1, size // 20)
+        self._samples = deque(maxlen=size)
+        self._fresh = 0
+        self._value = None
+
+    @property
+    def value(self) -> Optional[float]:
+        """
+        Текущая оценка перцентиля в секундах.
+
+        :return: Optional[float], None - если наблюдений меньше MIN_SAMPLES.
+        """
+        return self._value
+
+    def observe(self, sample: float) -> None:
+        """
+        Учесть новое наблюдение задержки.
+
+        :param sample: float, наблюдаемая задержка в секундах.
+        :return: None
+        """
+        self._samples.append(sample)
+        self._fresh += 1
+        if len(self._samples) < self.MIN_SAMPLES or (self._value is not None and self._fresh < self.refresh):
+            return
+        ordered = sorted(self._samples)
+        self._value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+        self._fresh = 0
@@ -0,0 +1,186 @@
+import random
+from collections import OrderedDict
+from typing import Dict, Generic, Iterator, List, Optional, Protocol, TypeVar
+
+
+class Loaded(Protocol):
+    load: int
+
+
+T = TypeVar('T', bound=Loaded)
+
+
+class LoadIndex(Generic[T]):
+    """Индекс загруженности воркеров для Least Connections.
+
+    Воркеры разложены по корзинам по загруженности (load: наши подключения и чужие таски воркера),
+    внутри корзины порядок - очередь, поэтому воркеры с одинаковой нагрузкой выбираются
+    по кругу, а не всегда первый по порядку в конфиге. Индекс помнит номер минимальной
+    непустой корзины, так что выбор самого незагруженного - O(1), а перемещение воркера
+    между корзинами при изменении числа подключений - O(1) (амортизированно).
+
+    Attributes
+    ----------
+    _buckets : Dict[int, OrderedDict[T, None]]
+        Корзины: загруженность -> воркеры с такой загруженностью
+    _positions : Dict[T, int]
+        В какой корзине лежит воркер
+    _items : List[T]
+        Все воркеры индекса в плоском списке (для случайного выбора за O(1))
+    _slots : Dict[T, int]
+        Позиция воркера в _items
+    _min_connections : int
+        Номер минимальной непустой корзины (имеет смысл, только если индекс не пуст)
+    _total_load : int
+        Суммарная загруженность воркеров индекса
+
+    Methods
+    -------
+    add(self, item: T) -> None
+        Добавить воркера в индекс (если его там еще нет).
+    remove(self, item: T) -> None
+        Убрать воркера из индекса (если он там есть).
+    update(self, item: T) -> None
+        Переложить воркера в корзину, соответствующую его текущей загруженности (load).
+    least_loaded(self, exclude: Optional[T] = None) -> Optional[T]
+        Получить самого незагруженного воркера (по кругу среди равных), кроме exclude.
+    sample(self, k: int) -> List[T]
+        Получить до k различных случайных воркеров.
+    total_load(self) -> int
+        Суммарная загруженность воркеров индекса (O(1)).
+    """
+    _buckets: Dict[int, 'OrderedDict[T, None]']
+    _positions: Dict[T, int]
+    _items: List[T]
+    _slots: Dict[T, int]
+    _min_connections: int
+    _total_load: int
+
+    def __init__(self):
+        self._buckets = {}
+        self._positions = {}
+        self._items = []
+        self._slots = {}
+        self._min_connections = 0
+        self._total_load = 0
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, item: T) -> bool:
+        return item in self._positions
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(list(self._positions))
+
+    @property
+    def total_load(self) -> int:
+        return self._total_load
+
+    def add(self, item: T) -> None:
+        """
+        Добавить воркера в индекс (если его там еще нет).
+
+        :param item: T, воркер.
+        :return: None
+        """
+        if item in self._positions:
+            return
+        self._put(item, item.load)
+        self._slots[item] = len(self._items)
+        self._items.append(item)
+
+    def remove(self, item: T) -> None:
+        """
+        Убрать воркера из индекса (если он там есть).
+
+        :param item: T, воркер.
+        :return: None
+        """
+        if item not in self._positions:
+            return
+        self._take(item)
+        slot = self._slots.pop(item)
+        last = self._items.pop()
+        if last is not item:
+            self._items[slot] = last
+            self._slots[last] = slot
+
+    def update(self, item: T) -> None:
+        """
+        Переложить воркера в корзину, соответствующую его текущей загруженности (load).
+        Воркеры, которых нет в индексе, игнорируются.
+
+        :param item: T, воркер.
+        :return: None
+        """
+        position = self._positions.get(item)
+        if position is None or position == item.load:
+            return
+        self._take(item)
+        self._put(item, item.load)
+
+    def least_loaded(self, exclude: Optional[T] = None) -> Optional[T]:
+        """
+        Получить самого незагруженного воркера. Среди воркеров с одинаковой нагрузкой
+        выбор идет по кругу.
+
+        :param exclude: Optional[T], воркер, которого выбирать нельзя (тогда вернется следующий по загруженности).
+        :return: T, если в индексе есть подходящий воркер, None - иначе.
+        """
+        if not self._positions:
+            return None
+        bucket = self._buckets[self._min_connections]
+        item = next(iter(bucket))
+        if item is exclude:
+            if len(bucket) > 1:
+                bucket.move_to_end(item)
+                item = next(iter(bucket))
+            else:
+                others = [connections for connections in self._buckets if connections != self._min_connections]
+                if not others:
+                    return None
+                bucket = self._buckets[min(others)]
+                item = next(iter(bucket))
+        bucket.move_to_end(item)
+        return item
+
+    def sample(self, k: int) -> List[T]:
+        """
+        Получить до k различных случайных воркеров. Работает за O(k), без обхода всего индекса.
+
+        :param k: int, сколько воркеров нужно.
+        :return: List[T], min(k, len(self)) различных воркеров.
+        """
+        if k >= len(self._items):
+            return list(self._items)
+        if k == 1:
+            return [random.choice(self._items)]
+        return random.sample(self._items, k)
+
+    def _put(self, item: T, connections: int) -> None:
+        bucket = self._buckets.get(connections)
+        if bucket is None:
+            bucket = self._buckets[connections] = OrderedDict()
+        bucket[item] = None
+        if len(self._positions) == 0 or connections < self._min_connections:
+            self._min_connections = connections
+        self._positions[item] = connections
+        self._total_load += connections
+
+    def _take(self, item: T) -> None:
+        connections = self._positions.pop(item)
+        self._total_load -= connections
+        bucket = self._buckets[connections]
+        del bucket[item]
+        if bucket:
+            return
+        del self._buckets[connections]
+        if connections == self._min_connections and self._buckets:
+            # Обычно следующая корзина лежит сразу за удаленной, поэтому ищем вверх,
+            # а к min() по всем корзинам прибегаем, только если разрыв слишком большой.
+            for candidate in range(connections + 1, connections + 1 + len(self._buckets)):
+                if candidate in self._buckets:
+                    self._min_connections = candidate
+                    return
+            self._min_connections = min(self._buckets)
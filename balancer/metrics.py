@@ -0,0 +1,223 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 60.0)
+HEALTHCHECK_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+PHASE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                 15.0, 30.0, 60.0)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Метрика в формате Prometheus.
+
+    Метрики обновляются на горячем пути, поэтому обновление - это пара операций со словарем
+    без блокировок (балансер однопоточный, все происходит в одном event loop'е), а вся работа по
+    форматированию откладывается до render(), т.е. до момента, когда метрики запросили.
+
+    Attributes
+    ----------
+    name : str
+        Имя метрики
+    documentation : str
+        Описание метрики (# HELP)
+    label_names : Tuple[str, ...]
+        Имена меток
+
+    Methods
+    -------
+    render(self) -> List[str]
+        Строки метрики в текстовом формате Prometheus.
+    """
+    type: str = "untyped"
+
+    name: str
+    documentation: str
+    label_names: Tuple[str, ...]
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        return ()
+
+
+class Counter(Metric):
+    """
+    Монотонно растущий счетчик.
+    """
+    type = "counter"
+
+    _values: Dict[Labels, float]
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """
+        Увеличить счетчик.
+
+        :param labels: str, значения меток в порядке label_names.
+        :param amount: float, на сколько увеличить.
+        :return: None
+        """
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+
+
+class Histogram(Metric):
+    """
+    Гистограмма с заранее заданными границами корзин. observe() - бинарный поиск корзины и инкремент,
+    кумулятивные значения считаются только при render().
+    """
+    type = "histogram"
+
+    buckets: Tuple[float, ...]
+    _counts: Dict[Labels, List[int]]
+    _sums: Dict[Labels, float]
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+        self._counts = {}
+        self._sums = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Учесть наблюдение.
+
+        :param value: float, наблюдаемое значение.
+        :param labels: str, значения меток в порядке label_names.
+        :return: None
+        """
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def _samples(self) -> Iterable[str]:
+        for labels, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, 'le="' + str(bound) + '"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            cumulative += counts[-1]
+            bucket_labels = _format_labels(self.label_names, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, labels)} {self._sums[labels]}"
+            yield f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}"
+
+
+class FunctionMetric(Metric):
+    """
+    Метрика, значения которой читаются функцией в момент запроса метрик (например, текущее число
+    подключений к воркерам). Функция возвращает пары (значения меток, значение) и не должна делать
+    сетевых запросов.
+    """
+    _collect: Callable[[], Iterable[Tuple[Labels, float]]]
+
+    def __init__(self, name: str, documentation: str, metric_type: str,
+                 collect: Callable[[], Iterable[Tuple[Labels, float]]], label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self.type = metric_type
+        self._collect = collect
+
+    def _samples(self) -> Iterable[str]:
+        for labels, value in self._collect():
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+
+
+class Registry:
+    """
+    Набор метрик, отдаваемых на /metrics.
+    """
+    _metrics: Dict[str, Metric]
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Зарегистрировать метрику. Метрика с тем же именем заменяется.
+
+        :param metric: Metric, метрика.
+        :return: Metric, та же метрика.
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        Все метрики в текстовом формате Prometheus.
+
+        :return: str
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    "balancer_requests_total", "Requests received by the balancer.", ("endpoint",)))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "balancer_request_duration_seconds", "End-to-end request latency, including queueing.", ("endpoint",)))
+ERROR_RESPONSES = REGISTRY.register(Counter(
+    "balancer_error_responses_total", "429 and 5xx responses returned by the balancer.", ("endpoint", "reason")))
+QUEUE_WAIT = REGISTRY.register(Histogram(
+    "balancer_queue_wait_seconds", "Time spent waiting in the admission queue.", ("class",)))
+DISPATCH_LATENCY = REGISTRY.register(Histogram(
+    "balancer_dispatch_duration_seconds", "Latency of successful calls to a worker.", ("worker", "endpoint")))
+DISPATCH_ERRORS = REGISTRY.register(Counter(
+    "balancer_dispatch_errors_total", "Failed calls to a worker.", ("worker", "endpoint", "reason")))
+HEALTHCHECK_LATENCY = REGISTRY.register(Histogram(
+    "balancer_healthcheck_duration_seconds", "Latency of worker health checks.", ("worker",),
+    buckets=HEALTHCHECK_BUCKETS))
+HEALTHCHECK_FAILURES = REGISTRY.register(Counter(
+    "balancer_healthcheck_failures_total", "Health checks that found the worker DEAD.", ("worker",)))
+CANCELLED = REGISTRY.register(Counter(
+    "balancer_cancelled_requests_total", "Requests cancelled because the client disconnected.", ("endpoint",)))
+DISPATCH_PHASE = REGISTRY.register(Histogram(
+    "balancer_dispatch_phase_seconds", "Time spent in each phase of handling a request.", ("phase",),
+    buckets=PHASE_BUCKETS))
+LOOP_LAG = REGISTRY.register(Histogram(
+    "balancer_event_loop_lag_seconds", "How late the event loop woke up from a timed sleep.",
+    buckets=LOOP_LAG_BUCKETS))
+AFFINITY = REGISTRY.register(Counter(
+    "balancer_affinity_routing_total",
+    "Keyed requests routed to their ring owner (hit) or to the next worker on the ring (spill).",
+    ("result",)))
+HEDGES_WON = REGISTRY.register(Counter(
+    "balancer_hedges_won_total", "Hedged requests where the duplicate answered before the primary."))
+RATE_LIMITED = REGISTRY.register(Counter(
+    "balancer_rate_limited_total", "Requests rejected with 429 by the per-tenant rate limit.", ("tenant",)))
@@ -3,6 +3,8 @@ from pydantic import BaseModel, UUID4
 from pydantic.class_validators import Optional
 from pydantic.validators import IntEnum
 
+from profiling import SamplingProfiler
+
 
 class WorkerStatus(IntEnum):
     """
@@ -32,7 +34,8 @@ class TaskStatus(IntEnum):
     CREATED = 0,  # CREATED
     IN_PROGRESS = 1,  # IN_PROGRESS
     DONE = 2,  # DONE
-    ERROR = 3  # ERROR
+    ERROR = 3,  # ERROR
+    CANCELLED = 4  # CANCELLED
 
 
 class Task(BaseModel):
@@ -57,3 +60,81 @@ class Task(BaseModel):
     result: Optional[float]
     payload: str
     status: TaskStatus
+
+
+class StrategyRequest(BaseModel):
+    """
+    Запрос на смену стратегии балансировки.
+
+    Attributes
+    ----------
+    name: str
+        Имя стратегии (см. strategies.STRATEGIES)
+    """
+    name: str
+
+
+class BatchResult(BaseModel):
+    """
+    Результат одного запроса из пакетного расчета (одна строка NDJSON в ответе /compute/batch).
+
+    Attributes
+    ----------
+    index: int
+        Индекс запроса в пакете
+    task: Optional[Task]
+        Посчитанная таска, None - в случае ошибки
+    detail: Optional[str]
+        Описание ошибки
+    """
+    index: int
+    task: Optional[Task]
+    detail: Optional[str]
+
+
+class RegisterRequest(BaseModel):
+    """
+    Запрос на регистрацию воркера (повторная регистрация - heartbeat).
+
+    Attributes
+    ----------
+    address: str
+        Адрес воркера (host:port), по которому до него может достучаться балансер
+    weight: float
+        Вес воркера для взвешенных стратегий
+    max_connections: int
+        Максимальное число единовременных подключений, 0 - без ограничений
+    ttl: float
+        Сколько секунд действует регистрация, если воркер не пришлет следующую
+    """
+    address: str
+    weight: float = 1.0
+    max_connections: int = 0
+    ttl: float = 15.0
+
+
+class DeregisterRequest(BaseModel):
+    """
+    Запрос на вывод воркера из пула.
+
+    Attributes
+    ----------
+    address: str
+        Адрес воркера
+    """
+    address: str
+
+
+class ProfilerRequest(BaseModel):
+    """
+    Запрос на включение или выключение сэмплирующего профайлера.
+
+    Attributes
+    ----------
+    enabled: bool
+        Включить (стеки предыдущего включения сбрасываются) или выключить профайлер
+    interval: float
+        Интервал сэмплирования в секундах
+    """
+    enabled: bool
+    interval: float = SamplingProfiler.DEFAULT_INTERVAL
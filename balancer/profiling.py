@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from types import CodeType, FrameType, SimpleNamespace
+from typing import Dict, Optional
+
+import aiohttp
+
+import metrics
+
+logger = logging.getLogger("Balancer")
+
+
+class LoopLagMonitor:
+    """Монитор задержки event loop.
+
+    Раз в interval секунд засыпает и смотрит, насколько позже заданного проснулся: если loop занят
+    синхронной работой (разбор JSON, тяжелый обработчик), задержка растет. Каждое измерение попадает
+    в гистограмму, а задержка больше WARNING_LAG пишется в лог.
+
+    Attributes
+    ----------
+    DEFAULT_INTERVAL : float
+        Интервал измерений по умолчанию в секундах
+    WARNING_LAG : float
+        Задержка в секундах, начиная с которой измерение пишется в лог
+    interval : float
+        Интервал измерений в секундах
+    lag : float
+        Последняя измеренная задержка в секундах
+    _histogram : metrics.Histogram
+        Гистограмма измерений
+
+    Methods
+    -------
+    run(self) -> None
+        Бесконечно измеряет задержку.
+    """
+    DEFAULT_INTERVAL: float = 0.1
+    WARNING_LAG: float = 0.1
+
+    interval: float
+    lag: float
+    _histogram: metrics.Histogram
+
+    def __init__(self, histogram: metrics.Histogram, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.lag = 0.0
+        self._histogram = histogram
+
+    async def run(self) -> None:
+        """
+        Бесконечно измеряет задержку event loop.
+
+        :return: None
+        """
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.monotonic() - expected)
+            self._histogram.observe(self.lag)
+            if self.lag >= self.WARNING_LAG:
+                logger.warning(f"Event loop lag: {self.lag * 1000:.0f} ms.")
+
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер потока event loop, включаемый на лету.
+
+    Пока профайлер включен, отдельный поток раз в interval секунд снимает стек потока, в котором профайлер
+    включили (поток event loop), и считает одинаковые стеки. Выключенный профайлер не делает ничего:
+    потока нет, обработка запросов не меняется. Результат - свернутые стеки (collapsed stacks) в формате
+    flamegraph.pl / speedscope: по строке "корень;...;лист число_сэмплов".
+
+    Attributes
+    ----------
+    DEFAULT_INTERVAL : float
+        Интервал сэмплирования по умолчанию в секундах
+    interval : float
+        Интервал сэмплирования в секундах
+    samples : int
+        Сколько сэмплов снято с последнего включения
+    started : Optional[float]
+        Когда профайлер включили последний раз (unix-время), None - если не включали
+    _target : Optional[int]
+        Идентификатор профилируемого потока
+    _thread : Optional[threading.Thread]
+        Поток сэмплирования, None - профайлер выключен
+    _stopped : threading.Event
+        Сигнал остановки потоку сэмплирования
+    _stacks : Dict[str, int]
+        Свернутый стек -> число сэмплов
+    _names : Dict[CodeType, str]
+        Кэш имен фреймов
+    _lock : threading.Lock
+        Защищает _stacks от одновременного чтения и записи
+
+    Methods
+    -------
+    start(self, interval: float = DEFAULT_INTERVAL) -> None
+        Включить профайлер для текущего потока (стеки предыдущего включения сбрасываются).
+    stop(self) -> None
+        Выключить профайлер. Снятые стеки сохраняются до следующего включения.
+    collapsed(self) -> str
+        Свернутые стеки для flamegraph.
+    """
+    DEFAULT_INTERVAL: float = 0.005
+
+    interval: float
+    samples: int
+    started: Optional[float]
+    _target: Optional[int]
+    _thread: Optional[threading.Thread]
+    _stopped: threading.Event
+    _stacks: Dict[str, int]
+    _names: Dict[CodeType, str]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self.interval = self.DEFAULT_INTERVAL
+        self.samples = 0
+        self.started = None
+        self._target = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._stacks = {}
+        self._names = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: float = DEFAULT_INTERVAL) -> None:
+        """
+        Включить профайлер для текущего потока. Стеки предыдущего включения сбрасываются.
+        Если профайлер уже включен, меняется только интервал.
+
+        :param interval: float, интервал сэмплирования в секундах.
+        :return: None
+        """
+        if interval <= 0:
+            raise ValueError("Sampling interval must be positive!")
+        self.interval = interval
+        if self.enabled:
+            return
+        with self._lock:
+            self._stacks = {}
+        self.samples = 0
+        self.started = time.time()
+        self._target = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Выключить профайлер. Снятые стеки сохраняются до следующего включения.
+
+        :return: None
+        """
+        if not self.enabled:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def collapsed(self) -> str:
+        """
+        Свернутые стеки в формате flamegraph.pl / speedscope, самые частые - первыми.
+
+        :return: str
+        """
+        with self._lock:
+            stacks = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)  # noqa
+            if frame is None:
+                continue
+            stack = self._collapse(frame)
+            with self._lock:
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def _collapse(self, frame: Optional[FrameType]) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            name = self._names.get(code)
+            if name is None:
+                name = self._names[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:" \
+                                           f"{code.co_firstlineno})"
+            names.append(name)
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+class ConnectTiming:
+    """
+    Сколько времени запрос к воркеру ждал соединения: свободного места в пуле и установки нового соединения.
+    Передается в aiohttp как trace_request_ctx и заполняется трассировкой connection_trace().
+    """
+    __slots__ = ("seconds",)
+
+    seconds: float
+
+    def __init__(self):
+        self.seconds = 0.0
+
+
+def connection_trace() -> aiohttp.TraceConfig:
+    """
+    Трассировка пула соединений aiohttp: время ожидания места в пуле и установки соединения складывается
+    в ConnectTiming запроса (если он передан как trace_request_ctx). Срабатывает только когда запрос ждет
+    пул или открывает новое соединение, запросы по готовым keep-alive соединениям не замедляет.
+
+    :return: aiohttp.TraceConfig
+    """
+    async def on_start(session: aiohttp.ClientSession, context: SimpleNamespace, params: object) -> None:
+        context.connect_started = time.monotonic()
+
+    async def on_end(session: aiohttp.ClientSession, context: SimpleNamespace, params: object) -> None:
+        if isinstance(context.trace_request_ctx, ConnectTiming):
+            context.trace_request_ctx.seconds += time.monotonic() - context.connect_started
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_queued_start.append(on_start)
+    trace.on_connection_queued_end.append(on_end)
+    trace.on_connection_create_start.append(on_start)
+    trace.on_connection_create_end.append(on_end)
+    return trace
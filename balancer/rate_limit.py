@@ -0,0 +1,119 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import metrics
+from admission import AdmissionError
+
+
+class RateLimitedError(AdmissionError):
+    """
+    Клиент превысил лимит запросов своего тенанта, запрос отброшен сразу (429).
+    """
+
+
+class TokenBucket:
+    """
+    Token bucket: токены копятся со скоростью rate в секунду, но не больше burst; запрос тратит один токен.
+    """
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    rate: float
+    burst: float
+    tokens: float
+    updated: float
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def try_acquire(self, now: float) -> float:
+        """
+        Потратить токен.
+
+        :param now: float, текущее время (time.monotonic()).
+        :return: float, 0 - если токен был, иначе - через сколько секунд он появится.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Лимиты запросов по тенантам (заголовок X-Tenant).
+
+    У каждого тенанта свой token bucket: с лимитом из tenants, если тенант там указан, иначе - с лимитом
+    по умолчанию (rate, burst). Запросы без тенанта и тенанты с нулевым rate не ограничиваются.
+    Бакеты тенантов по умолчанию создаются при первом запросе; чтобы поток случайных имен тенантов
+    не съел память, хранится не больше max_tenants самых недавних.
+
+    Attributes
+    ----------
+    DEFAULT_TENANT : str
+        Имя тенантов с лимитом по умолчанию в метриках
+    rate : float
+        Лимит по умолчанию, запросов в секунду, 0 - без лимита
+    burst : float
+        Сколько запросов по умолчанию можно отправить разом
+    tenants : Dict[str, Tuple[float, float]]
+        Лимиты отдельных тенантов: имя -> (rate, burst)
+    max_tenants : int
+        Сколько бакетов хранить
+    limited : int
+        Сколько запросов отброшено всего
+    _buckets : OrderedDict[str, TokenBucket]
+        Бакеты тенантов, недавно использованные - в конце
+
+    Methods
+    -------
+    acquire(self, tenant: Optional[str]) -> float
+        Учесть запрос тенанта.
+    """
+    DEFAULT_TENANT: str = "default"
+
+    rate: float
+    burst: float
+    tenants: Dict[str, Tuple[float, float]]
+    max_tenants: int
+    limited: int
+    _buckets: 'OrderedDict[str, TokenBucket]'
+
+    def __init__(self, rate: float = 0.0, burst: float = 0.0, tenants: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_tenants: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.tenants = tenants or {}
+        self.max_tenants = max_tenants
+        self.limited = 0
+        self._buckets = OrderedDict()
+
+    def acquire(self, tenant: Optional[str]) -> float:
+        """
+        Учесть запрос тенанта.
+
+        :param tenant: Optional[str], тенант, None - запрос без тенанта (не ограничивается).
+        :return: float, 0 - запрос разрешен, иначе - через сколько секунд тенанту можно повторить запрос.
+        """
+        if tenant is None:
+            return 0.0
+        rate, burst = self.tenants.get(tenant, (self.rate, self.burst))
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            bucket = self._buckets[tenant] = TokenBucket(rate, max(1.0, burst), now)
+            if len(self._buckets) > self.max_tenants:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(tenant)
+        wait = bucket.try_acquire(now)
+        if wait > 0:
+            self.limited += 1
+            metrics.RATE_LIMITED.inc(tenant if tenant in self.tenants else self.DEFAULT_TENANT)
+        return wait
@@ -1,8 +1,17 @@
+import datetime
+import time
+
 from pydantic import BaseModel
 from pydantic.class_validators import List
 
+from pydantic.class_validators import Optional
+from typing import Dict
+
+from admission import AdmissionQueue
+from cache import ResultCache
 from balancer import Worker
 from models import WorkerStatus
+from profiling import SamplingProfiler
 
 
 class BaseBalancerResponse(BaseModel):
@@ -27,8 +36,28 @@ class WorkerLoadResponse(BaseModel):
         Адрес endpoint'а
     number_of_connections: int
         Число единовременных подключений
+    peer_connections: int
+        Число подключений других реплик балансера (по данным gossip)
+    external_load: int
+        Оценка числа тасок воркера, пришедших не от реплик балансера (по нагрузке, которую сообщает воркер)
+    reported_capacity: int
+        Сколько тасок воркер считает одновременно по его же словам, 0 - без ограничений или неизвестно
+    max_connections: int
+        Максимальное число единовременных подключений, 0 - без ограничений
     status: WorkerStatus
         Статус воркера
+    weight: float
+        Вес воркера
+    latency: float
+        Peak-EWMA оценка времени ответа /compute в секундах
+    breaker: str
+        Состояние автомата отключения: closed, open или half_open
+    slow_start_limit: Optional[int]
+        Лимит одновременных запросов медленного старта, None - если медленный старт не идет
+    draining: bool
+        Выводится ли воркер из пула
+    registered: bool
+        Добавлен ли воркер через /register (а не из config.xml)
 
     Methods
     -------
@@ -37,18 +66,39 @@ class WorkerLoadResponse(BaseModel):
     """
     address: str
     number_of_connections: int
+    peer_connections: int
+    external_load: int
+    reported_capacity: int
+    max_connections: int
     status: WorkerStatus
+    weight: float
+    latency: float
+    breaker: str
+    slow_start_limit: Optional[int]
+    draining: bool
+    registered: bool
 
     @staticmethod
-    async def from_worker(worker: Worker) -> 'WorkerLoadResponse':
+    def from_worker(worker: Worker) -> 'WorkerLoadResponse':
         """
         Возвращает WorkerLoadResponse, используя данные экземпляра воркера.
+        Статус берется из кэша последней проверки, сетевых запросов не делает.
         :param worker: Worker, воркер
         :return: WorkerLoadResponse
         """
         return WorkerLoadResponse(address=worker.address,
                                   number_of_connections=worker.number_of_connections,
-                                  status=(await worker.status()))
+                                  peer_connections=worker.peer_connections,
+                                  external_load=worker.external_load,
+                                  reported_capacity=worker.reported_capacity,
+                                  max_connections=worker.max_connections,
+                                  status=worker.last_status,
+                                  weight=worker.weight,
+                                  latency=worker.latency.value,
+                                  breaker=worker.breaker.state.value,
+                                  slow_start_limit=worker.breaker.slow_start_limit(time.monotonic()),
+                                  draining=worker.draining,
+                                  registered=worker.registered_until is not None)
 
 
 class WorkersLoadResponse(BaseModel):
@@ -63,3 +113,174 @@ class WorkersLoadResponse(BaseModel):
     workers: List[WorkerLoadResponse]
 
 
+class StrategyResponse(BaseModel):
+    """
+    Информация о стратегии балансировки.
+
+    Attributes
+    ----------
+    name: str
+        Имя текущей стратегии
+    available: List[str]
+        Имена всех доступных стратегий
+    """
+    name: str
+    available: List[str]
+
+
+class QueueResponse(BaseModel):
+    """
+    Информация об очереди ожидания свободного воркера.
+
+    Attributes
+    ----------
+    depth: int
+        Текущее число ожидающих запросов
+    max_size: int
+        Максимальное число ожидающих запросов
+    timeout: float
+        Максимальное время ожидания в секундах
+    admitted: int
+        Сколько запросов допущено всего
+    queued: int
+        Сколько из допущенных запросов ждали в очереди
+    rejected: int
+        Сколько запросов отброшено из-за переполнения очереди
+    timed_out: int
+        Сколько запросов не дождались свободного воркера
+    average_wait: float
+        Среднее время ожидания ждавших запросов в секундах
+    max_wait: float
+        Максимальное время ожидания в секундах
+    classes: Dict[str, int]
+        Число ожидающих запросов по классам трафика
+
+    Methods
+    -------
+    from_queue(queue: AdmissionQueue) -> QueueResponse
+        возвращает QueueResponse, используя экземпляр очереди.
+    """
+    depth: int
+    max_size: int
+    timeout: float
+    admitted: int
+    queued: int
+    rejected: int
+    timed_out: int
+    average_wait: float
+    max_wait: float
+    classes: Dict[str, int]
+
+    @staticmethod
+    def from_queue(queue: AdmissionQueue) -> 'QueueResponse':
+        """
+        Возвращает QueueResponse, используя данные экземпляра очереди.
+        :param queue: AdmissionQueue, очередь
+        :return: QueueResponse
+        """
+        return QueueResponse(depth=queue.depth,
+                             max_size=queue.max_size,
+                             timeout=queue.timeout,
+                             admitted=queue.admitted,
+                             queued=queue.queued,
+                             rejected=queue.rejected,
+                             timed_out=queue.timed_out,
+                             average_wait=queue.total_wait / queue.queued if queue.queued else 0.0,
+                             max_wait=queue.max_wait,
+                             classes={name: queue.depth_of(name) for name in queue.weights})
+
+
+class CacheResponse(BaseModel):
+    """
+    Информация о кэше результатов.
+
+    Attributes
+    ----------
+    enabled: bool
+        Включен ли кэш
+    entries: int
+        Число записей
+    size: int
+        Примерный объем записей в байтах
+    hits: int
+        Сколько запросов получили результат из кэша
+    misses: int
+        Сколько запросов ушли на воркер
+    coalesced: int
+        Сколько запросов дождались такого же запроса, уже ушедшего на воркер
+    evictions: int
+        Сколько записей вытеснено
+    hit_ratio: float
+        Доля запросов, не ушедших на воркер
+
+    Methods
+    -------
+    from_cache(cache: Optional[ResultCache]) -> CacheResponse
+        возвращает CacheResponse, используя экземпляр кэша.
+    """
+    enabled: bool
+    entries: int = 0
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    hit_ratio: float = 0.0
+
+    @staticmethod
+    def from_cache(cache: Optional[ResultCache]) -> 'CacheResponse':
+        """
+        Возвращает CacheResponse, используя данные экземпляра кэша.
+        :param cache: Optional[ResultCache], кэш (None - если выключен)
+        :return: CacheResponse
+        """
+        if cache is None:
+            return CacheResponse(enabled=False)
+        total = cache.hits + cache.misses + cache.coalesced
+        return CacheResponse(enabled=True,
+                             entries=len(cache),
+                             size=cache.size,
+                             hits=cache.hits,
+                             misses=cache.misses,
+                             coalesced=cache.coalesced,
+                             evictions=cache.evictions,
+                             hit_ratio=(cache.hits + cache.coalesced) / total if total else 0.0)
+
+
+class ProfilerResponse(BaseModel):
+    """
+    Состояние сэмплирующего профайлера.
+
+    Attributes
+    ----------
+    enabled: bool
+        Включен ли профайлер
+    interval: float
+        Интервал сэмплирования в секундах
+    samples: int
+        Сколько сэмплов снято с последнего включения
+    started: Optional[datetime.datetime]
+        Когда профайлер включили последний раз, None - если не включали
+
+    Methods
+    -------
+    from_profiler(profiler: SamplingProfiler) -> ProfilerResponse
+        возвращает ProfilerResponse по состоянию профайлера.
+    """
+    enabled: bool
+    interval: float
+    samples: int
+    started: Optional[datetime.datetime]
+
+    @staticmethod
+    def from_profiler(profiler: SamplingProfiler) -> 'ProfilerResponse':
+        """
+        Возвращает ProfilerResponse по состоянию профайлера.
+        :param profiler: SamplingProfiler, профайлер
+        :return: ProfilerResponse
+        """
+        return ProfilerResponse(enabled=profiler.enabled,
+                                interval=profiler.interval,
+                                samples=profiler.samples,
+                                started=None if profiler.started is None
+                                else datetime.datetime.fromtimestamp(profiler.started))
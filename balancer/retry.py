@@ -0,0 +1,69 @@
+class RetryBudget:
+    """Бюджет повторных попыток (как retry budget в Envoy).
+
+    Повтор разрешен, только пока одновременных повторов меньше ratio от одновременных запросов
+    (но не меньше min_concurrency). Когда воркеры падают массово, повторяется лишь малая доля
+    запросов, а не каждый - повторы не умножают нагрузку на оставшиеся воркеры.
+
+    Attributes
+    ----------
+    ratio : float
+        Какая доля текущих запросов может одновременно повторяться
+    min_concurrency : int
+        Сколько повторов разрешено одновременно при любом трафике
+    active_requests : int
+        Сколько запросов сейчас обрабатывается
+    active_retries : int
+        Сколько повторов сейчас выполняется
+    retries : int
+        Сколько повторов сделано всего
+    exhausted : int
+        Сколько повторов не сделано из-за исчерпания бюджета
+
+    Methods
+    -------
+    request_started(self) -> None
+        Учесть начало обработки запроса.
+    request_finished(self) -> None
+        Учесть конец обработки запроса.
+    try_acquire(self) -> bool
+        Занять повтор из бюджета.
+    release(self) -> None
+        Вернуть повтор в бюджет.
+    """
+    ratio: float
+    min_concurrency: int
+    active_requests: int
+    active_retries: int
+    retries: int
+    exhausted: int
+
+    def __init__(self, ratio: float, min_concurrency: int):
+        self.ratio = ratio
+        self.min_concurrency = min_concurrency
+        self.active_requests = 0
+        self.active_retries = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def request_started(self) -> None:
+        self.active_requests += 1
+
+    def request_finished(self) -> None:
+        self.active_requests -= 1
+
+    def try_acquire(self) -> bool:
+        """
+        Занять повтор из бюджета.
+
+        :return: bool, True - если повтор разрешен (тогда после него нужно вызвать release()).
+        """
+        if self.active_retries >= max(self.min_concurrency, self.ratio * self.active_requests):
+            self.exhausted += 1
+            return False
+        self.active_retries += 1
+        self.retries += 1
+        return True
+
+    def release(self) -> None:
+        self.active_retries -= 1
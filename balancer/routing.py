@@ -0,0 +1,132 @@
+import time
+from collections import OrderedDict
+from typing import Generic, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class TaskRoute(Generic[T]):
+    """
+    Маршрут асинхронной таски: на какой воркер и когда она отправлена.
+    """
+    __slots__ = ("worker", "submitted")
+
+    worker: T
+    submitted: float
+
+    def __init__(self, worker: T, submitted: float):
+        self.worker = worker
+        self.submitted = submitted
+
+
+class TaskRoutes(Generic[T]):
+    """Таблица маршрутизации асинхронных тасок: uuid таски -> воркер.
+
+    Пока таска считается, она занимает слот воркера. Слот освобождается, когда
+    балансер увидит таску в конечном статусе (complete) или когда истечет pending_timeout -
+    балансер не держит соединений с воркером ради асинхронных тасок, поэтому о завершении
+    таски, которую никто не запросил, он узнать не может. Сами маршруты хранятся retention секунд
+    (не меньше pending_timeout).
+    Обе очереди упорядочены по времени отправки, так что expire() работает за O(число истекших).
+
+    Attributes
+    ----------
+    pending_timeout : float
+        Через сколько секунд после отправки таска перестает учитываться в нагрузке воркера
+    retention : float
+        Сколько секунд хранится маршрут
+    _routes : OrderedDict[str, TaskRoute[T]]
+        Все маршруты в порядке отправки
+    _pending : OrderedDict[str, TaskRoute[T]]
+        Маршруты еще не завершенных тасок в порядке отправки
+
+    Methods
+    -------
+    add(self, task_uuid: str, worker: T) -> None
+        Запомнить, что таска отправлена воркеру.
+    get(self, task_uuid: str) -> Optional[T]
+        Получить воркера таски.
+    complete(self, task_uuid: str) -> Optional[T]
+        Отметить таску завершенной. Вернет воркера, если таска до этого учитывалась в его нагрузке.
+    expire(self) -> List[T]
+        Удалить старые маршруты и снять с учета зависшие таски. Вернет воркеров снятых тасок.
+    """
+    pending_timeout: float
+    retention: float
+    _routes: 'OrderedDict[str, TaskRoute[T]]'
+    _pending: 'OrderedDict[str, TaskRoute[T]]'
+
+    def __init__(self, pending_timeout: float, retention: float):
+        self.pending_timeout = pending_timeout
+        self.retention = max(retention, pending_timeout)
+        self._routes = OrderedDict()
+        self._pending = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __contains__(self, task_uuid: str) -> bool:
+        return task_uuid in self._routes
+
+    @property
+    def pending(self) -> int:
+        """
+        Сколько тасок еще учитывается в нагрузке воркеров.
+
+        :return: int
+        """
+        return len(self._pending)
+
+    def add(self, task_uuid: str, worker: T) -> None:
+        """
+        Запомнить, что таска отправлена воркеру.
+
+        :param task_uuid: str, идентификатор таски.
+        :param worker: T, воркер.
+        :return: None
+        """
+        route = TaskRoute(worker, time.monotonic())
+        self._routes[task_uuid] = route
+        self._pending[task_uuid] = route
+
+    def get(self, task_uuid: str) -> Optional[T]:
+        """
+        Получить воркера таски.
+
+        :param task_uuid: str, идентификатор таски.
+        :return: T, None - если маршрута нет.
+        """
+        route = self._routes.get(task_uuid)
+        return None if route is None else route.worker
+
+    def complete(self, task_uuid: str) -> Optional[T]:
+        """
+        Отметить таску завершенной.
+
+        :param task_uuid: str, идентификатор таски.
+        :return: T, если таска до этого учитывалась в нагрузке воркера, None - иначе.
+        """
+        route = self._pending.pop(task_uuid, None)
+        return None if route is None else route.worker
+
+    def expire(self) -> List[T]:
+        """
+        Удалить маршруты старше retention и снять с учета таски старше pending_timeout.
+
+        :return: List[T], воркеры, с которых сняты зависшие таски (по одному на таску).
+        """
+        now = time.monotonic()
+        released = self._pop_older(self._pending, now - self.pending_timeout)
+        self._pop_older(self._routes, now - self.retention)
+        return [route.worker for route in released]
+
+    @staticmethod
+    def _pop_older(routes: 'OrderedDict[str, TaskRoute[T]]', threshold: float) -> List[TaskRoute[T]]:
+        popped = []
+        while routes:
+            task_uuid, route = next(iter(routes.items()))
+            if route.submitted > threshold:
+                break
+            routes.popitem(last=False)
+            popped.append(route)
+        return popped
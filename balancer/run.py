@@ -2,6 +2,7 @@ import uvicorn
 
 from balancer import Balancer
 from config import BalancerConfig
+from supervisor import Supervisor
 import views
 import argparse
 
@@ -10,7 +11,16 @@ if __name__ == "__main__":
     arg_parser.add_argument('--host', type=str, required=False, default='0.0.0.0')
     arg_parser.add_argument('--port', type=int, required=False, default=8000)
     arg_parser.add_argument('--config', type=str, required=False, default=None)
+    arg_parser.add_argument('--processes', type=int, required=False, default=1)
+    arg_parser.add_argument('--replication-listen', type=str, required=False, default=None)
     args = arg_parser.parse_args()
 
-    views.balancer = Balancer.from_config(BalancerConfig.from_xml(args.config))
-    uvicorn.run(views.app, host=args.host, port=args.port, reload=False)
+    config = BalancerConfig.from_xml(args.config)
+    if args.replication_listen is not None:
+        # Реплики на одном хосте могут делить config.xml, различаясь только адресом gossip.
+        config.replication.listen = args.replication_listen
+    if args.processes > 1:
+        Supervisor(args.processes, args.host, args.port, config, config_path=args.config).run()
+    else:
+        views.balancer = Balancer.from_config(config, config_path=args.config)
+        uvicorn.run(views.app, host=args.host, port=args.port, reload=False)
@@ -0,0 +1,280 @@
+import mmap
+import multiprocessing
+from typing import List, Tuple
+
+from models import WorkerStatus
+
+
+class SharedState:
+    """Общее для нескольких процессов балансера состояние воркеров в разделяемой памяти.
+
+    Создается до fork'а процессов (см. supervisor.py) поверх анонимного mmap, поэтому все процессы
+    видят одну и ту же память. Память разбита на слоты, по слоту на воркера, слот воркера ищется по адресу,
+    так что процессы сходятся на одном слоте и для воркеров, добавленных на лету.
+
+    В слоте у каждого процесса своя ячейка с числом его подключений к воркеру. Процесс пишет только в свою
+    ячейку (запись выровненного 8-байтового числа атомарна), поэтому на горячем пути блокировок нет,
+    а общее число подключений - сумма ячеек. Если процесс упал, супервизор обнуляет его ячейки
+    (reset_process), и подключения упавшего процесса не висят на воркерах вечно.
+
+    Там же хранится последний статус воркера и время последней проверки: проверку делает тот процесс,
+    который первым успел ее занять (claim_check), остальные берут статус из памяти.
+    Регистрация воркера через /register приходит в один процесс, поэтому ее срок, вес и лимит подключений
+    тоже пишутся в слот (set_registration), а остальные процессы подхватывают их (registrations).
+    Подключения к воркеру других реплик балансера (gossip.py) узнает процесс 0 и пишет их в слот
+    (set_peer_connections), остальные процессы читают (peer_connections).
+    Ссылки на слот тоже считаются по процессам, в своей ячейке у каждого: слот свободен, когда ссылок нет
+    ни у одного процесса, а reset_process вместе с подключениями снимает и ссылки упавшего процесса,
+    так что перезапуски процессов не занимают слоты навсегда.
+    Блокировка нужна только для занятия слотов, проверок и регистраций.
+
+    Attributes
+    ----------
+    processes : int
+        Число процессов балансера
+    capacity : int
+        Максимальное число воркеров
+    process_index : int
+        Номер текущего процесса (выставляется после fork'а)
+    _lock : multiprocessing.Lock
+        Блокировка для занятия слотов, проверок и регистраций
+    _mmap : mmap.mmap
+        Разделяемая память
+    _cells : memoryview
+        Та же память как массив int64
+
+    Methods
+    -------
+    attach(self, address: str) -> int
+        Найти или занять слот воркера.
+    detach(self, slot: int) -> None
+        Отпустить слот воркера.
+    add_connections(self, slot: int, delta: int) -> int
+        Изменить число подключений текущего процесса к воркеру.
+    connections(self, slot: int) -> int
+        Общее число подключений к воркеру по всем процессам.
+    status(self, slot: int) -> Tuple[WorkerStatus, int]
+        Последний статус воркера и время его проверки.
+    set_status(self, slot: int, status: WorkerStatus) -> None
+        Записать статус воркера.
+    claim_check(self, slot: int, now_ns: int, min_age_ns: int) -> bool
+        Занять проверку воркера.
+    set_registration(self, slot: int, until_ns: int, weight: float, max_connections: int) -> None
+        Записать регистрацию воркера.
+    registrations(self) -> List[Tuple[str, int, float, int]]
+        Регистрации всех воркеров.
+    set_peer_connections(self, slot: int, connections: int) -> None
+        Записать число подключений к воркеру других реплик балансера.
+    peer_connections(self, slot: int) -> int
+        Число подключений к воркеру других реплик балансера.
+    reset_process(self, process_index: int) -> None
+        Обнулить подключения и ссылки процесса.
+    """
+    DEFAULT_CAPACITY: int = 256
+    ADDRESS_SIZE: int = 128
+
+    _ADDRESS_CELLS: int = ADDRESS_SIZE // 8
+    _STATUS: int = _ADDRESS_CELLS
+    _CHECKED: int = _ADDRESS_CELLS + 1
+    _REGISTERED: int = _ADDRESS_CELLS + 2
+    _WEIGHT: int = _ADDRESS_CELLS + 3
+    _MAX_CONNECTIONS: int = _ADDRESS_CELLS + 4
+    _PEER_CONNECTIONS: int = _ADDRESS_CELLS + 5
+    _CONNECTIONS: int = _ADDRESS_CELLS + 6
+    _WEIGHT_SCALE: int = 1000
+
+    processes: int
+    capacity: int
+    process_index: int
+    _refs: int
+    _slot_cells: int
+
+    def __init__(self, processes: int, capacity: int = DEFAULT_CAPACITY):
+        if processes < 1:
+            raise ValueError("Number of processes must be at least 1!")
+        self.processes = processes
+        self.capacity = capacity
+        self.process_index = 0
+        self._refs = self._CONNECTIONS + processes
+        self._slot_cells = self._refs + processes
+        self._lock = multiprocessing.Lock()
+        self._mmap = mmap.mmap(-1, capacity * self._slot_cells * 8)
+        self._cells = memoryview(self._mmap).cast('q')
+
+    def attach(self, address: str) -> int:
+        """
+        Найти слот воркера по адресу или занять свободный. Каждый процесс, знающий воркера, держит ссылку на слот.
+
+        :param address: str, адрес воркера.
+        :return: int, номер слота.
+        """
+        encoded = address.encode()
+        if len(encoded) > self.ADDRESS_SIZE:
+            raise ValueError(f"Worker address is longer than {self.ADDRESS_SIZE} bytes!")
+        key = encoded.ljust(self.ADDRESS_SIZE, b'\0')
+        with self._lock:
+            free = None
+            for slot in range(self.capacity):
+                base = slot * self._slot_cells
+                if not self._attached(base):
+                    if free is None:
+                        free = slot
+                    continue
+                if self._address(slot) == key:
+                    self._cells[base + self._refs + self.process_index] += 1
+                    return slot
+            if free is None:
+                raise ValueError(f"Shared state can hold at most {self.capacity} workers!")
+            base = free * self._slot_cells
+            self._mmap[base * 8:base * 8 + self.ADDRESS_SIZE] = key
+            self._cells[base + self._STATUS] = WorkerStatus.DEAD
+            for cell in (self._CHECKED, self._REGISTERED, self._WEIGHT, self._MAX_CONNECTIONS, self._PEER_CONNECTIONS):
+                self._cells[base + cell] = 0
+            for index in range(self.processes):
+                self._cells[base + self._CONNECTIONS + index] = 0
+                self._cells[base + self._refs + index] = 0
+            self._cells[base + self._refs + self.process_index] = 1
+            return free
+
+    def detach(self, slot: int) -> None:
+        """
+        Отпустить слот воркера. Слот освобождается, когда его отпустят все процессы.
+
+        :param slot: int, номер слота.
+        :return: None
+        """
+        with self._lock:
+            self._cells[slot * self._slot_cells + self._refs + self.process_index] -= 1
+
+    def add_connections(self, slot: int, delta: int) -> int:
+        """
+        Изменить число подключений текущего процесса к воркеру. Без блокировок: в ячейку пишет только этот процесс.
+
+        :param slot: int, номер слота.
+        :param delta: int, на сколько изменить.
+        :return: int, общее число подключений к воркеру после изменения.
+        """
+        self._cells[slot * self._slot_cells + self._CONNECTIONS + self.process_index] += delta
+        return self.connections(slot)
+
+    def connections(self, slot: int) -> int:
+        """
+        Общее число подключений к воркеру по всем процессам.
+
+        :param slot: int, номер слота.
+        :return: int
+        """
+        start = slot * self._slot_cells + self._CONNECTIONS
+        return sum(self._cells[start:start + self.processes])
+
+    def status(self, slot: int) -> Tuple[WorkerStatus, int]:
+        """
+        Последний статус воркера и время его проверки.
+
+        :param slot: int, номер слота.
+        :return: Tuple[WorkerStatus, int], статус и время проверки (time.monotonic_ns(), 0 - проверок не было).
+        """
+        base = slot * self._slot_cells
+        return WorkerStatus(self._cells[base + self._STATUS]), self._cells[base + self._CHECKED]
+
+    def set_status(self, slot: int, status: WorkerStatus) -> None:
+        """
+        Записать статус воркера (время проверки не меняется).
+
+        :param slot: int, номер слота.
+        :param status: WorkerStatus, статус.
+        :return: None
+        """
+        self._cells[slot * self._slot_cells + self._STATUS] = status
+
+    def claim_check(self, slot: int, now_ns: int, min_age_ns: int) -> bool:
+        """
+        Занять проверку воркера: удается, только если последней проверке не меньше min_age_ns наносекунд.
+        time.monotonic_ns() в Linux общий для всех процессов.
+
+        :param slot: int, номер слота.
+        :param now_ns: int, текущее время (time.monotonic_ns()).
+        :param min_age_ns: int, минимальный возраст последней проверки.
+        :return: bool, True - если проверку должен сделать этот процесс.
+        """
+        checked = slot * self._slot_cells + self._CHECKED
+        with self._lock:
+            if self._cells[checked] and now_ns - self._cells[checked] < min_age_ns:
+                return False
+            self._cells[checked] = now_ns
+            return True
+
+    def set_registration(self, slot: int, until_ns: int, weight: float, max_connections: int) -> None:
+        """
+        Записать регистрацию воркера через /register, чтобы ее подхватили остальные процессы.
+
+        :param slot: int, номер слота.
+        :param until_ns: int, до какого момента (time.monotonic_ns()) действует регистрация.
+        :param weight: float, вес воркера.
+        :param max_connections: int, лимит подключений к воркеру.
+        :return: None
+        """
+        base = slot * self._slot_cells
+        with self._lock:
+            self._cells[base + self._REGISTERED] = until_ns
+            self._cells[base + self._WEIGHT] = round(weight * self._WEIGHT_SCALE)
+            self._cells[base + self._MAX_CONNECTIONS] = max_connections
+
+    def registrations(self) -> List[Tuple[str, int, float, int]]:
+        """
+        Регистрации всех воркеров, добавленных через /register (в любом процессе).
+
+        :return: List[Tuple[str, int, float, int]], четверки (адрес, до какого момента действует
+            регистрация в time.monotonic_ns(), вес, лимит подключений).
+        """
+        result = []
+        with self._lock:
+            for slot in range(self.capacity):
+                base = slot * self._slot_cells
+                if not self._attached(base) or self._cells[base + self._REGISTERED] == 0:
+                    continue
+                result.append((self._address(slot).rstrip(b'\0').decode(),
+                               self._cells[base + self._REGISTERED],
+                               self._cells[base + self._WEIGHT] / self._WEIGHT_SCALE,
+                               self._cells[base + self._MAX_CONNECTIONS]))
+        return result
+
+    def set_peer_connections(self, slot: int, connections: int) -> None:
+        """
+        Записать число подключений к воркеру других реплик балансера. Пишет только процесс 0, поэтому без блокировки.
+
+        :param slot: int, номер слота.
+        :param connections: int, число подключений.
+        :return: None
+        """
+        self._cells[slot * self._slot_cells + self._PEER_CONNECTIONS] = connections
+
+    def peer_connections(self, slot: int) -> int:
+        """
+        Число подключений к воркеру других реплик балансера.
+
+        :param slot: int, номер слота.
+        :return: int
+        """
+        return self._cells[slot * self._slot_cells + self._PEER_CONNECTIONS]
+
+    def reset_process(self, process_index: int) -> None:
+        """
+        Обнулить подключения и ссылки процесса на все слоты (процесс упал и больше их не освободит).
+
+        :param process_index: int, номер процесса.
+        :return: None
+        """
+        # Без блокировки: в ячейки упавшего процесса больше никто не пишет, а он мог упасть, держа блокировку.
+        for slot in range(self.capacity):
+            base = slot * self._slot_cells
+            self._cells[base + self._CONNECTIONS + process_index] = 0
+            self._cells[base + self._refs + process_index] = 0
+
+    def _attached(self, base: int) -> bool:
+        start = base + self._refs
+        return any(self._cells[start:start + self.processes])
+
+    def _address(self, slot: int) -> bytes:
+        start = slot * self._slot_cells * 8
+        return self._mmap[start:start + self.ADDRESS_SIZE]
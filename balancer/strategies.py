@@ -0,0 +1,106 @@
+from abc import abstractmethod
+from typing import Dict, Optional, Type
+
+from load_index import LoadIndex
+
+
+class Strategy:
+    """Стратегия выбора воркера для очередной задачи.
+
+    Стратегия получает индекс загруженности живых воркеров балансера и возвращает
+    одного из них. Состояния между вызовами стратегии не хранят, поэтому их можно
+    подменять на лету (см. Balancer.strategy).
+
+    Attributes
+    ----------
+    name : str
+        Имя стратегии в конфиге и в API
+
+    Methods
+    -------
+    select(self, workers: LoadIndex) -> Optional[Worker]
+        Выбрать воркера. None - если живых воркеров нет.
+    """
+    name: str
+
+    @abstractmethod
+    def select(self, workers: LoadIndex) -> Optional['Worker']: pass  # noqa
+
+
+class LeastConnectionsStrategy(Strategy):
+    """
+    Least Connections: самый незагруженный воркер, по кругу среди равных. O(1).
+    """
+    name = "least_connections"
+
+    def select(self, workers: LoadIndex) -> Optional['Worker']:  # noqa
+        return workers.least_loaded()
+
+
+class PowerOfTwoChoicesStrategy(Strategy):
+    """
+    Power of two choices: из двух случайных живых воркеров выбирается менее загруженный.
+    Не требует обхода всех воркеров, O(1).
+    """
+    name = "power_of_two_choices"
+
+    def select(self, workers: LoadIndex) -> Optional['Worker']:  # noqa
+        candidates = workers.sample(2)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda worker: worker.load)
+
+
+class WeightedLeastConnectionsStrategy(Strategy):
+    """
+    Weighted Least Connections: минимум (load + 1) / weight, где load - загруженность воркера, weight -
+    вес воркера из конфига (<worker><weight>). Воркер с весом 2 получит вдвое больше задач,
+    чем воркер с весом 1. O(N) по живым воркерам, сетевых запросов не делает.
+    """
+    name = "weighted_least_connections"
+
+    def select(self, workers: LoadIndex) -> Optional['Worker']:  # noqa
+        if not workers:
+            return None
+        return min(workers, key=lambda worker: (worker.load + 1) / worker.weight)
+
+
+class PeakEwmaStrategy(Strategy):
+    """
+    Peak-EWMA: минимум ожидаемой задержки latency.value * (load + 1), где
+    latency - Peak-EWMA оценка времени ответа /compute воркера. Медленные воркеры получают
+    меньше задач, а всплески задержки учитываются сразу. O(N) по живым воркерам.
+    Воркеры без наблюдений считаются быстрыми (MIN_LATENCY) - так они быстрее получат первые задачи,
+    а между собой делятся по числу подключений.
+    """
+    MIN_LATENCY: float = 1e-3
+    name = "peak_ewma"
+
+    def select(self, workers: LoadIndex) -> Optional['Worker']:  # noqa
+        if not workers:
+            return None
+        return min(workers, key=lambda worker: max(worker.latency.value, self.MIN_LATENCY) *
+                   (worker.load + 1))
+
+
+STRATEGIES: Dict[str, Type[Strategy]] = {
+    strategy.name: strategy for strategy in (
+        LeastConnectionsStrategy,
+        PowerOfTwoChoicesStrategy,
+        WeightedLeastConnectionsStrategy,
+        PeakEwmaStrategy,
+    )
+}
+
+
+def strategy_from_name(name: str) -> Strategy:
+    """
+    Создает стратегию по имени.
+
+    :param name: str, имя стратегии (см. STRATEGIES).
+    :return: Strategy
+    """
+    strategy = STRATEGIES.get(name)
+    if strategy is None:
+        raise ValueError(f"Unknown strategy '{name}'! Available: {', '.join(STRATEGIES)}.")
+    return strategy()
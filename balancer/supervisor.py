@@ -0,0 +1,156 @@
+import os
+import signal
+import socket
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+from balancer import Balancer, logger
+from config import BalancerConfig
+from shared import SharedState
+import views
+
+
+class Supervisor:
+    """Запускает балансер в несколько процессов на одном порту, чтобы он занимал больше одного ядра.
+
+    Супервизор открывает слушающий сокет и создает общее состояние (SharedState) до fork'а, поэтому все
+    процессы принимают соединения с одного сокета и видят одни и те же счетчики подключений к воркерам
+    и их статусы: Least Connections выбирает воркера по общей загруженности, а не по загруженности
+    своего процесса. Упавший процесс перезапускается, а его подключения к воркерам обнуляются.
+    SIGTERM и SIGINT передаются процессам как SIGTERM, после их завершения супервизор выходит.
+
+    Attributes
+    ----------
+    _RESTART_DELAY : float
+        Через сколько секунд перезапускать процесс, упавший сразу после старта (например, из-за ошибки в конфиге)
+    _BACKLOG : int
+        Длина очереди входящих соединений слушающего сокета (как у uvicorn)
+    processes : int
+        Число процессов балансера
+    host : str
+        Адрес, на котором слушает балансер
+    port : int
+        Порт, на котором слушает балансер
+    config : BalancerConfig
+        Конфигурация балансера
+    config_path : Optional[str]
+        Путь к config.xml, чтобы процессы подхватывали его изменения на лету
+    shared : SharedState
+        Общее состояние процессов
+    _children : Dict[int, int]
+        Номера работающих процессов по pid
+    _stopping : bool
+        Получен сигнал остановки
+
+    Methods
+    -------
+    run(self) -> None
+        Запустить процессы и следить за ними до остановки.
+    """
+    _RESTART_DELAY: float = 1.0
+    _BACKLOG: int = 2048
+    processes: int
+    host: str
+    port: int
+    config: BalancerConfig
+    config_path: Optional[str]
+    shared: SharedState
+    _children: Dict[int, int]
+    _stopping: bool
+
+    def __init__(self, processes: int, host: str, port: int, config: BalancerConfig,
+                 config_path: Optional[str] = None):
+        self.processes = processes
+        self.host = host
+        self.port = port
+        self.config = config
+        self.config_path = config_path
+        self.shared = SharedState(processes)
+        self._children = {}
+        self._stopping = False
+
+    def run(self) -> None:
+        """
+        Открыть сокет, запустить процессы и перезапускать упавшие, пока не придет SIGTERM или SIGINT.
+
+        :return: None
+        """
+        sock = self._bind()
+        started: Dict[int, float] = {}
+        for index in range(self.processes):
+            started[index] = time.monotonic()
+            self._spawn(index, sock)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        logger.info(f"Balancer is running in {self.processes} processes on {self.host}:{self.port}.")
+        while self._children:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            index = self._children.pop(pid, None)
+            if index is None:
+                continue
+            self.shared.reset_process(index)
+            if self._stopping:
+                continue
+            logger.warning(f"Balancer process {index} (pid {pid}) exited unexpectedly, restarting.")
+            if time.monotonic() - started[index] < self._RESTART_DELAY:
+                time.sleep(self._RESTART_DELAY)
+            started[index] = time.monotonic()
+            self._spawn(index, sock)
+        sock.close()
+
+    def _bind(self) -> socket.socket:
+        """
+        Открыть слушающий сокет для процессов. Сокет создается с явным IPPROTO_TCP: asyncio включает TCP_NODELAY
+        на принятых соединениях, только если у слушающего сокета proto == IPPROTO_TCP, а у сокета
+        uvicorn.Config.bind_socket() proto == 0. Без TCP_NODELAY алгоритм Нейгла вместе с отложенным ACK
+        добавляют около 40 мс к каждому запросу по keep-alive соединению.
+
+        :return: socket.socket
+        """
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self._BACKLOG)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, index: int, sock: socket.socket) -> None:
+        """
+        Запустить процесс балансера с номером index, принимающий соединения с сокета sock.
+
+        :param index: int, номер процесса (его ячейка в общем состоянии).
+        :param sock: socket.socket, слушающий сокет.
+        :return: None
+        """
+        pid = os.fork()
+        if pid != 0:
+            self._children[pid] = index
+            return
+        code = 0
+        try:
+            # Своя группа процессов: Ctrl+C в терминале получает только супервизор, а он передает SIGTERM сам.
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            self.shared.process_index = index
+            views.balancer = Balancer.from_config(self.config, config_path=self.config_path, shared=self.shared)
+            uvicorn.Server(uvicorn.Config(views.app)).run(sockets=[sock])
+        except BaseException as e:  # noqa
+            logger.exception(f"Balancer process {index} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _stop(self, signum, frame) -> None:  # noqa
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass  # noqa
@@ -1,22 +1,170 @@
 import asyncio
+import time
+from typing import Awaitable, List, Optional, TypeVar
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import UUID4
+from pydantic.error_wrappers import ErrorWrapper
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
 
-from balancer import Balancer
-from models import TaskRequest, Task
-from responses import BaseBalancerResponse, WorkersLoadResponse, WorkerLoadResponse
+import codec
+import metrics
+from admission import AdmissionError, QueueFullError
+from balancer import (Balancer, DeadlineExceededError, TaskNotFoundError, TIMEOUT_HEADER, ROUTING_KEY_HEADER,
+                      PRIORITY_HEADER, TENANT_HEADER)
+from breaker import BreakerState
+from config import WorkerConfig
+from models import (TaskRequest, Task, StrategyRequest, BatchResult, RegisterRequest, DeregisterRequest,
+                    ProfilerRequest)
+from profiling import SamplingProfiler
+from rate_limit import RateLimitedError
+from responses import (BaseBalancerResponse, WorkersLoadResponse, WorkerLoadResponse, StrategyResponse,
+                       QueueResponse, CacheResponse, ProfilerResponse)
+from strategies import STRATEGIES, strategy_from_name
+
+MAX_WAIT = 60
+MAX_BATCH_SIZE = 10000
+# Тело /compute разбирается вручную (см. BalancerView.compute), поэтому его схема для Swagger задается явно.
+COMPUTE_REQUEST_BODY = {"requestBody": {"content": {"application/json": {"schema": TaskRequest.schema()}},
+                                        "required": True}}
+
+T = TypeVar('T')
 
 app = FastAPI()
 router = InferringRouter()
 balancer = Balancer()
+profiler = SamplingProfiler()
 
 
 def get_balancer():
     return balancer
 
 
+def get_profiler() -> SamplingProfiler:
+    return profiler
+
+
+def rejected(endpoint: str, error: AdmissionError) -> HTTPException:
+    """
+    Ответ на запрос, не допущенный к расчету: 429, если тенант превысил лимит, иначе 503.
+
+    :param endpoint: str, обработчик (для метрик).
+    :param error: AdmissionError, причина.
+    :return: HTTPException
+    """
+    if isinstance(error, RateLimitedError):
+        reason, status_code = "rate_limited", status.HTTP_429_TOO_MANY_REQUESTS
+    else:
+        reason = "queue_full" if isinstance(error, QueueFullError) else "queue_timeout"
+        status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    metrics.ERROR_RESPONSES.inc(endpoint, reason)
+    return HTTPException(
+        status_code=status_code,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+def deadline_exceeded(endpoint: str, error: DeadlineExceededError) -> HTTPException:
+    """
+    Ответ 504 на запрос, не уложившийся в дедлайн.
+
+    :param endpoint: str, обработчик (для метрик).
+    :param error: DeadlineExceededError, причина.
+    :return: HTTPException
+    """
+    metrics.ERROR_RESPONSES.inc(endpoint, "deadline")
+    return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(error))
+
+
+def request_timeout(request: Request) -> Optional[float]:
+    """
+    Таймаут клиента из заголовка X-Request-Timeout (в секундах). Балансер передает воркеру остаток этого таймаута.
+
+    :param request: Request, запрос.
+    :return: Optional[float], None - если заголовка нет.
+    """
+    value = request.headers.get(TIMEOUT_HEADER)
+    if value is None:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        timeout = -1.0
+    if not timeout > 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"{TIMEOUT_HEADER} must be a positive number of seconds!")
+    return timeout
+
+
+async def wait_disconnect(request: Request) -> None:
+    """
+    Дождаться, пока клиент закроет соединение. Тело запроса к этому моменту должно быть прочитано.
+
+    :param request: Request, запрос.
+    :return: None
+    """
+    while (await request.receive())["type"] != "http.disconnect":
+        pass  # noqa
+
+
+async def cancel_on_disconnect(endpoint: str, request: Request, coroutine: Awaitable[T]) -> T:
+    """
+    Выполнить coroutine, а если клиент отключится раньше - отменить ее (вместе с запросом к воркеру,
+    который тогда тоже прерывает расчет) и ответить 499: ответ уже никто не прочтет.
+
+    :param endpoint: str, обработчик (для метрик).
+    :param request: Request, запрос.
+    :param coroutine: Awaitable[T], обработка запроса.
+    :return: T, результат coroutine.
+    """
+    work = asyncio.ensure_future(coroutine)
+    disconnect = asyncio.ensure_future(wait_disconnect(request))
+    try:
+        await asyncio.wait((work, disconnect), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+        if not work.done():
+            work.cancel()
+    if not work.done() or work.cancelled():
+        metrics.CANCELLED.inc(endpoint)
+        raise HTTPException(status_code=499, detail="Client closed request!")
+    return work.result()
+
+
+def parse_task_request(body: bytes) -> TaskRequest:
+    """
+    Разбирает тело запроса на расчет через codec (orjson, если установлен) и валидирует его pydantic'ом.
+    Ошибки - 422 в том же формате, что у FastAPI.
+
+    :param body: bytes, тело запроса.
+    :return: TaskRequest
+    """
+    try:
+        return TaskRequest.parse_obj(codec.loads(body))
+    except ValueError as e:  # в том числе ValidationError
+        raise RequestValidationError([ErrorWrapper(e, ("body",))])
+
+
+def check_task_request(body: bytes) -> None:
+    """
+    Быстрая проверка тела запроса на расчет без построения модели: JSON-объект со строковым payload.
+    Ошибки - 422 в том же формате, что у FastAPI.
+
+    :param body: bytes, тело запроса.
+    :return: None
+    """
+    try:
+        data = codec.loads(body)
+    except ValueError as e:
+        raise RequestValidationError([ErrorWrapper(e, ("body",))])
+    if not isinstance(data, dict) or not isinstance(data.get("payload"), str):
+        raise RequestValidationError([ErrorWrapper(TypeError("payload must be a string"), ("body", "payload"))])
+
+
 @cbv(router)
 class BalancerView:
     _balancer: Balancer = Depends(get_balancer)
@@ -29,30 +177,328 @@ class BalancerView:
         """
         return BaseBalancerResponse(message="pong")
 
-    @router.post("/compute")
-    async def compute(self, task_request: TaskRequest) -> Task:
+    @router.post("/compute", response_model=Task, openapi_extra=COMPUTE_REQUEST_BODY)
+    async def compute(self, request: Request):
+        """
+        Обработчик запроса расчета (тело - TaskRequest, ответ - Task). Если свободных воркеров нет и очередь
+        переполнена (или не дождались слота) - 503 с заголовком Retry-After.
+        Тело разбирается и ответ сериализуется через codec, минуя FastAPI. В режиме <proxy><passthrough>
+        тела запроса и ответа пересылаются как есть, а запрос только проверяется (<validate>) или не проверяется вовсе.
+        Таймаут клиента (X-Request-Timeout) ограничивает ожидание в очереди и передается воркеру, по его истечении -
+        504. Если клиент отключился, расчет на воркере прерывается. При включенной привязке (<affinity>) запрос
+        с одинаковым ключом (X-Routing-Key, без него - payload) попадает на одного воркера.
+        Класс трафика (X-Priority) выбирает очередь допуска, тенант (X-Tenant) - лимит запросов, при его
+        превышении - 429 с заголовком Retry-After.
+        :param request: Request
+        :return: Response
+        """
+        metrics.REQUESTS.inc("compute")
+        started = time.monotonic()
+        timeout = request_timeout(request)
+        routing_key = request.headers.get(ROUTING_KEY_HEADER)
+        traffic_class = request.headers.get(PRIORITY_HEADER)
+        body = await request.body()
+        try:
+            self._balancer.check_rate_limit(request.headers.get(TENANT_HEADER))
+            if self._balancer.proxy.passthrough:
+                if self._balancer.proxy.validate:
+                    check_task_request(body)
+                metrics.DISPATCH_PHASE.observe(time.monotonic() - started, "parse")
+                response = await cancel_on_disconnect("compute", request,
+                                                      self._balancer.compute_raw(body, timeout, routing_key,
+                                                                                 traffic_class))
+            else:
+                task_request = parse_task_request(body)
+                metrics.DISPATCH_PHASE.observe(time.monotonic() - started, "parse")
+                task = await cancel_on_disconnect("compute", request,
+                                                  self._balancer.compute(task_request, timeout, routing_key,
+                                                                         traffic_class))
+                serialization_started = time.monotonic()
+                response = None if task is None else (status.HTTP_200_OK, codec.dumps(task.dict()))
+                metrics.DISPATCH_PHASE.observe(time.monotonic() - serialization_started, "serialize")
+        except AdmissionError as e:
+            raise rejected("compute", e)
+        except DeadlineExceededError as e:
+            raise deadline_exceeded("compute", e)
+        finally:
+            metrics.REQUEST_LATENCY.observe(time.monotonic() - started, "compute")
+        if response is None:
+            metrics.ERROR_RESPONSES.inc("compute", "upstream")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f'Task was failed due to internal server error!',
+            )
+        return Response(content=response[1], status_code=response[0], media_type="application/json")
+
+    @router.post("/compute/batch", response_class=StreamingResponse)
+    async def compute_batch(self, task_requests: List[TaskRequest], request: Request):
+        """
+        Обработчик пакетного расчета. Результаты отдаются потоком NDJSON (по строке BatchResult на запрос)
+        по мере готовности, порядок строк не совпадает с порядком запросов. Пакет учитывается в лимите тенанта
+        как один запрос.
+        :param task_requests: List[TaskRequest]
+        :param request: Request
+        :return: StreamingResponse
+        """
+        if len(task_requests) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f"Batch size must not exceed {MAX_BATCH_SIZE}!")
+
+        metrics.REQUESTS.inc("compute_batch")
+        started = time.monotonic()
+        traffic_class = request.headers.get(PRIORITY_HEADER)
+        try:
+            self._balancer.check_rate_limit(request.headers.get(TENANT_HEADER))
+        except RateLimitedError as e:
+            raise rejected("compute_batch", e)
+
+        async def stream():
+            try:
+                async for index, task, detail in self._balancer.compute_batch(task_requests, traffic_class):
+                    yield BatchResult(index=index, task=task, detail=detail).json() + "\n"
+            finally:
+                metrics.REQUEST_LATENCY.observe(time.monotonic() - started, "compute_batch")
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @router.post("/tasks", status_code=status.HTTP_202_ACCEPTED)
+    async def submit_task(self, task_request: TaskRequest, request: Request) -> Task:
         """
-        Обработчик запроса расчета.
+        Отправить задачу на асинхронный расчет. Возвращает таску сразу, результат - через GET /tasks/{uuid}.
+        Класс трафика и лимит тенанта - как у /compute.
         :param task_request: TaskRequest
+        :param request: Request
         :return: Task
         """
-        task = await self._balancer.compute(task_request)
+        metrics.REQUESTS.inc("submit")
+        started = time.monotonic()
+        try:
+            self._balancer.check_rate_limit(request.headers.get(TENANT_HEADER))
+            task = await self._balancer.submit(task_request, request.headers.get(PRIORITY_HEADER))
+        except AdmissionError as e:
+            raise rejected("submit", e)
+        finally:
+            metrics.REQUEST_LATENCY.observe(time.monotonic() - started, "submit")
         if task is None:
+            metrics.ERROR_RESPONSES.inc("submit", "upstream")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f'Task was failed due to internal server error!',
             )
         return task
 
+    @router.get("/tasks/{task_uuid}")
+    async def get_task(self, task_uuid: UUID4, wait: float = Query(0, ge=0, le=MAX_WAIT)) -> Task:
+        """
+        Получить асинхронную таску. Если wait > 0 - дождаться окончания расчета, но не дольше wait секунд.
+        :param task_uuid: UUID4
+        :param wait: float
+        :return: Task
+        """
+        metrics.REQUESTS.inc("get_task")
+        started = time.monotonic()
+        try:
+            task = await self._balancer.get_task(str(task_uuid), wait)
+        except TaskNotFoundError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found!")
+        finally:
+            metrics.REQUEST_LATENCY.observe(time.monotonic() - started, "get_task")
+        if task is None:
+            metrics.ERROR_RESPONSES.inc("get_task", "upstream")
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Worker did not return the task!")
+        return task
+
     @router.get("/workers")
     async def workers_info(self) -> WorkersLoadResponse:
         """
         Получить информацию о загруженности воркеров.
         :return: WorkersLoadResponse
         """
-        gathered = [asyncio.create_task(WorkerLoadResponse.from_worker(worker)) for worker in self._balancer.workers]
-        workers_loads_results = await asyncio.gather(*gathered)
-        return WorkersLoadResponse(workers=list(workers_loads_results))
+        return WorkersLoadResponse(workers=[WorkerLoadResponse.from_worker(worker)
+                                            for worker in self._balancer.workers])
+
+    @router.post("/register")
+    async def register(self, register_request: RegisterRequest) -> WorkerLoadResponse:
+        """
+        Зарегистрировать воркера (или продлить регистрацию). Воркер, не приславший повторную регистрацию
+        за ttl секунд, выводится из пула.
+        :param register_request: RegisterRequest
+        :return: WorkerLoadResponse
+        """
+        if register_request.ttl <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="TTL must be positive!")
+        try:
+            config = WorkerConfig(address=register_request.address,
+                                  weight=register_request.weight,
+                                  max_connections=register_request.max_connections)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        worker = self._balancer.register(config, register_request.ttl)
+        return WorkerLoadResponse.from_worker(worker)
+
+    @router.post("/deregister")
+    async def deregister(self, deregister_request: DeregisterRequest) -> WorkerLoadResponse:
+        """
+        Вывести воркера из пула: новые запросы ему не отправляются, текущие досчитываются.
+        :param deregister_request: DeregisterRequest
+        :return: WorkerLoadResponse
+        """
+        worker = self._balancer.deregister(deregister_request.address)
+        if worker is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Worker not found!")
+        return WorkerLoadResponse.from_worker(worker)
+
+    @router.get("/queue")
+    async def queue_info(self) -> QueueResponse:
+        """
+        Получить информацию об очереди ожидания свободного воркера.
+        :return: QueueResponse
+        """
+        return QueueResponse.from_queue(self._balancer.admission_queue)
+
+    @router.get("/cache")
+    async def cache_info(self) -> CacheResponse:
+        """
+        Получить информацию о кэше результатов.
+        :return: CacheResponse
+        """
+        return CacheResponse.from_cache(self._balancer.cache)
+
+    @router.get("/metrics", response_class=PlainTextResponse)
+    async def get_metrics(self):
+        """
+        Метрики балансера в текстовом формате Prometheus. Собираются из памяти, к воркерам не ходит.
+        :return: PlainTextResponse
+        """
+        return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    @router.get("/profiler")
+    async def profiler_info(self) -> ProfilerResponse:
+        """
+        Получить состояние сэмплирующего профайлера этого процесса балансера.
+        :return: ProfilerResponse
+        """
+        return ProfilerResponse.from_profiler(get_profiler())
+
+    @router.put("/profiler")
+    async def set_profiler(self, profiler_request: ProfilerRequest) -> ProfilerResponse:
+        """
+        Включить или выключить сэмплирующий профайлер на лету. Выключенный профайлер не дает накладных расходов.
+        :param profiler_request: ProfilerRequest
+        :return: ProfilerResponse
+        """
+        if not profiler_request.enabled:
+            get_profiler().stop()
+        else:
+            try:
+                get_profiler().start(profiler_request.interval)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return ProfilerResponse.from_profiler(get_profiler())
+
+    @router.get("/profiler/stacks", response_class=PlainTextResponse)
+    async def profiler_stacks(self):
+        """
+        Свернутые стеки последнего включения профайлера (формат flamegraph.pl / speedscope).
+        :return: PlainTextResponse
+        """
+        return PlainTextResponse(get_profiler().collapsed())
+
+    @router.get("/strategy")
+    async def get_strategy(self) -> StrategyResponse:
+        """
+        Получить текущую стратегию балансировки.
+        :return: StrategyResponse
+        """
+        return StrategyResponse(name=self._balancer.strategy.name, available=list(STRATEGIES))
+
+    @router.put("/strategy")
+    async def set_strategy(self, strategy_request: StrategyRequest) -> StrategyResponse:
+        """
+        Сменить стратегию балансировки на лету.
+        :param strategy_request: StrategyRequest
+        :return: StrategyResponse
+        """
+        try:
+            self._balancer.strategy = strategy_from_name(strategy_request.name)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return StrategyResponse(name=self._balancer.strategy.name, available=list(STRATEGIES))
+
+
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_worker_connections", "Requests currently in flight to a worker.", "gauge",
+    lambda: (((worker.address,), worker.number_of_connections) for worker in get_balancer().workers),
+    ("worker",)))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_worker_up", "Whether the last health check found the worker alive.", "gauge",
+    lambda: (((worker.address,), int(worker.is_alive)) for worker in get_balancer().workers),
+    ("worker",)))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_worker_ejected", "Whether the worker is out of rotation due to its circuit breaker.", "gauge",
+    lambda: (((worker.address,), int(worker.breaker.state != BreakerState.CLOSED))
+             for worker in get_balancer().workers),
+    ("worker",)))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_queue_depth", "Requests waiting in the admission queue.", "gauge",
+    lambda: [((), get_balancer().admission_queue.depth)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_class_queue_depth", "Requests waiting in the admission queue by traffic class.", "gauge",
+    lambda: (((name,), get_balancer().admission_queue.depth_of(name))
+             for name in get_balancer().admission_queue.weights),
+    ("class",)))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_queue_rejected_total", "Requests rejected because the admission queue was full.", "counter",
+    lambda: [((), get_balancer().admission_queue.rejected)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_queue_timed_out_total", "Requests that timed out in the admission queue.", "counter",
+    lambda: [((), get_balancer().admission_queue.timed_out)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_retries_total", "Requests re-dispatched to another worker after a connection failure.", "counter",
+    lambda: [((), get_balancer().retry_budget.retries)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_retry_budget_exhausted_total", "Retries skipped because the retry budget was exhausted.", "counter",
+    lambda: [((), get_balancer().retry_budget.exhausted)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_hedges_total", "Duplicate requests sent to a second worker because the first was slow.", "counter",
+    lambda: [((), get_balancer().hedge_budget.retries)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_hedge_budget_exhausted_total", "Hedges skipped because the hedge budget was exhausted.", "counter",
+    lambda: [((), get_balancer().hedge_budget.exhausted)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_worker_peer_connections", "Requests in flight to a worker from other balancer replicas.", "gauge",
+    lambda: (((worker.address,), worker.peer_connections) for worker in get_balancer().workers),
+    ("worker",)))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_gossip_peers", "Balancer replicas currently sending their state.", "gauge",
+    lambda: [] if get_balancer().gossip is None else [((), get_balancer().gossip.live_peers)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_gossip_messages_total", "Gossip messages by direction.", "counter",
+    lambda: [] if get_balancer().gossip is None else [
+        (("sent",), get_balancer().gossip.sent),
+        (("received",), get_balancer().gossip.received),
+        (("invalid",), get_balancer().gossip.invalid),
+        (("rejected",), get_balancer().gossip.rejected),
+    ],
+    ("direction",)))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "balancer_cache_requests_total", "Result cache lookups by outcome.", "counter",
+    lambda: [] if get_balancer().cache is None else [
+        (("hit",), get_balancer().cache.hits),
+        (("miss",), get_balancer().cache.misses),
+        (("coalesced",), get_balancer().cache.coalesced),
+    ],
+    ("result",)))
+
+
+@app.on_event("startup")
+async def on_startup():
+    await get_balancer().start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await get_balancer().stop()
 
 
 app.include_router(router)
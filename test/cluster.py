@@ -0,0 +1,259 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from aiohttp import ClientSession, ClientError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BALANCER_DIR = os.path.join(ROOT, "balancer")
+WORKER_DIR = os.path.join(ROOT, "worker")
+
+CONFIG_TEMPLATE = """<balancer>
+    <workers>
+{workers}
+    </workers>
+    <strategy>{strategy}</strategy>
+    <healthcheck>
+        <interval>{healthcheck_interval}</interval>
+        <jitter>0</jitter>
+    </healthcheck>
+    <admission>
+        <max_queue_size>{max_queue_size}</max_queue_size>
+    </admission>
+{replication}</balancer>
+"""
+
+REPLICATION_TEMPLATE = """    <replication>
+        <enabled>true</enabled>
+        <peers>
+{peers}
+        </peers>
+        <interval>{interval}</interval>
+    </replication>
+"""
+
+
+class Cluster:
+    """Балансер и воркеры, запущенные на localhost отдельными процессами (без Docker).
+
+    Воркеры и балансер запускаются тем же интерпретатором, что и бенчмарк, из своих папок репозитория,
+    с конфигом балансера во временной папке. Логи процессов пишутся туда же (см. log_dir).
+    С replicas > 1 запускается несколько реплик балансера с общим конфигом: реплика i слушает HTTP
+    на balancer_port + i и обменивается состоянием (gossip) через replication_port + i.
+
+    Attributes
+    ----------
+    _START_TIMEOUT : float
+        Сколько секунд ждать, пока балансер увидит всех воркеров живыми
+    workers : int
+        Число воркеров
+    computation_time : float
+        Время расчета одной таски на воркере в секундах (--computation-time воркера)
+    balancer_port : int
+        Порт балансера (первой реплики)
+    worker_port : int
+        Порт первого воркера, остальные - следующие по порядку
+    processes : int
+        Число процессов балансера (--processes балансера)
+    replicas : int
+        Число реплик балансера
+    replication_port : int
+        Порт обмена состоянием первой реплики, остальные - следующие по порядку
+    replication_interval : float
+        Интервал обмена состоянием между репликами в секундах
+    strategy : str
+        Стратегия балансировки
+    healthcheck_interval : float
+        Интервал проверки состояния воркеров в секундах
+    max_queue_size : int
+        Максимальная длина очереди ожидания балансера
+    log_dir : str
+        Папка с конфигом и логами процессов
+    _balancers : List[Optional[subprocess.Popen]]
+        Процессы реплик балансера
+    _workers : List[Optional[subprocess.Popen]]
+        Процессы воркеров, None - воркер остановлен
+
+    Methods
+    -------
+    start(self) -> None
+        Запустить воркеров и балансер и дождаться, пока все реплики балансера увидят всех воркеров живыми.
+    stop(self) -> None
+        Остановить все процессы.
+    kill_worker(self, index: int) -> None
+        Убить воркера через SIGKILL.
+    restart_worker(self, index: int) -> None
+        Запустить убитого воркера заново.
+    wait_until_ready(self) -> None
+        Дождаться, пока все реплики балансера увидят всех воркеров живыми.
+    """
+    _START_TIMEOUT: float = 30.0
+
+    workers: int
+    computation_time: float
+    balancer_port: int
+    worker_port: int
+    processes: int
+    replicas: int
+    replication_port: int
+    replication_interval: float
+    strategy: str
+    healthcheck_interval: float
+    max_queue_size: int
+    log_dir: str
+    _balancers: List[Optional[subprocess.Popen]]
+    _workers: List[Optional[subprocess.Popen]]
+
+    def __init__(self,
+                 workers: int,
+                 computation_time: float,
+                 balancer_port: int = 8000,
+                 worker_port: int = 8001,
+                 processes: int = 1,
+                 strategy: str = "least_connections",
+                 healthcheck_interval: float = 0.5,
+                 max_queue_size: int = 100000,
+                 replicas: int = 1,
+                 replication_port: int = 9100,
+                 replication_interval: float = 0.1):
+        if replicas < 1:
+            raise ValueError("Number of replicas must be at least 1!")
+        if balancer_port < worker_port + workers and worker_port < balancer_port + replicas:
+            raise ValueError(f"Balancer ports {balancer_port}-{balancer_port + replicas - 1} overlap "
+                             f"worker ports {worker_port}-{worker_port + workers - 1}!")
+        self.workers = workers
+        self.computation_time = computation_time
+        self.balancer_port = balancer_port
+        self.worker_port = worker_port
+        self.processes = processes
+        self.replicas = replicas
+        self.replication_port = replication_port
+        self.replication_interval = replication_interval
+        self.strategy = strategy
+        self.healthcheck_interval = healthcheck_interval
+        self.max_queue_size = max_queue_size
+        self.log_dir = tempfile.mkdtemp(prefix="balancer-bench-")
+        self._balancers = [None] * replicas
+        self._workers = [None] * workers
+
+    @property
+    def url(self) -> str:
+        return self.replica_url(0)
+
+    @property
+    def urls(self) -> List[str]:
+        return [self.replica_url(index) for index in range(self.replicas)]
+
+    def replica_url(self, index: int) -> str:
+        return f"http://127.0.0.1:{self.balancer_port + index}"
+
+    def worker_address(self, index: int) -> str:
+        return f"127.0.0.1:{self.worker_port + index}"
+
+    async def start(self) -> None:
+        """
+        Запустить воркеров и балансер и дождаться, пока все реплики балансера увидят всех воркеров живыми.
+
+        :return: None
+        """
+        config_path = os.path.join(self.log_dir, "config.xml")
+        with open(config_path, "w") as config:
+            config.write(CONFIG_TEMPLATE.format(
+                workers="\n".join(f"        <worker><address>{self.worker_address(index)}</address></worker>"
+                                  for index in range(self.workers)),
+                strategy=self.strategy,
+                healthcheck_interval=self.healthcheck_interval,
+                max_queue_size=self.max_queue_size,
+                replication="" if self.replicas == 1 else REPLICATION_TEMPLATE.format(
+                    peers="\n".join(f"            <peer>127.0.0.1:{self.replication_port + index}</peer>"
+                                    for index in range(self.replicas)),
+                    interval=self.replication_interval)))
+        for index in range(self.workers):
+            self.restart_worker(index)
+        for index in range(self.replicas):
+            args = ["--host", "127.0.0.1", "--port", str(self.balancer_port + index),
+                    "--config", config_path, "--processes", str(self.processes)]
+            if self.replicas > 1:
+                args += ["--replication-listen", f"127.0.0.1:{self.replication_port + index}"]
+            self._balancers[index] = self._spawn(BALANCER_DIR, "balancer" if self.replicas == 1 else
+                                                 f"balancer{index}", args)
+        await self.wait_until_ready()
+
+    def stop(self) -> None:
+        """
+        Остановить все процессы (SIGTERM, через несколько секунд - SIGKILL).
+
+        :return: None
+        """
+        processes = [process for process in self._balancers + self._workers if process is not None]
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        for process in processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        self._balancers = [None] * self.replicas
+        self._workers = [None] * self.workers
+
+    def kill_worker(self, index: int) -> None:
+        """
+        Убить воркера через SIGKILL (без корректного завершения, как при падении).
+
+        :param index: int, номер воркера.
+        :return: None
+        """
+        process = self._workers[index]
+        if process is None:
+            return
+        process.kill()
+        process.wait()
+        self._workers[index] = None
+
+    def restart_worker(self, index: int) -> None:
+        """
+        Запустить воркера заново (если он запущен - ничего не делает).
+
+        :param index: int, номер воркера.
+        :return: None
+        """
+        if self._workers[index] is not None:
+            return
+        self._workers[index] = self._spawn(WORKER_DIR, f"worker{index}",
+                                           ["--host", "127.0.0.1", "--port", str(self.worker_port + index),
+                                            "--computation-time", str(self.computation_time)])
+
+    def _spawn(self, cwd: str, name: str, args: List[str]) -> subprocess.Popen:
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "ab")
+        return subprocess.Popen([sys.executable, "run.py"] + args, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+
+    async def wait_until_ready(self) -> None:
+        """
+        Ждет, пока все реплики балансера ответят и увидят всех воркеров живыми.
+
+        :return: None
+        """
+        deadline = time.monotonic() + self._START_TIMEOUT
+        ready = set()
+        async with ClientSession() as session:
+            while time.monotonic() < deadline:
+                if any(balancer.poll() is not None for balancer in self._balancers):
+                    raise RuntimeError(f"Balancer exited, see logs in {self.log_dir}")
+                for index in range(self.replicas):
+                    try:
+                        async with session.get(f"{self.replica_url(index)}/workers") as response:
+                            workers = (await response.json())["workers"]
+                            if sum(worker["status"] != 2 for worker in workers) == self.workers:
+                                ready.add(index)
+                    except (ClientError, ValueError, KeyError):
+                        pass  # noqa
+                if len(ready) == self.replicas:
+                    return
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"Cluster did not start in {self._START_TIMEOUT} seconds, see logs in {self.log_dir}")
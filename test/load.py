@@ -0,0 +1,132 @@
+import asyncio
+import time
+from typing import Dict, List, Set, Tuple
+
+from aiohttp import ClientSession, ClientError, ClientTimeout
+
+
+class Recorder:
+    """Результаты запросов бенчмарка.
+
+    Attributes
+    ----------
+    started : float
+        Начало нагрузки (time.monotonic())
+    results : List[Tuple[float, float, str]]
+        Тройки (момент отправки от начала нагрузки, задержка в секундах, исход: HTTP-код или имя исключения)
+    """
+    started: float
+    results: List[Tuple[float, float, str]]
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.results = []
+
+    def record(self, sent: float, outcome: str) -> None:
+        """
+        Записать результат запроса.
+
+        :param sent: float, когда запрос должен был уйти (time.monotonic()).
+        :param outcome: str, HTTP-код или имя исключения.
+        :return: None
+        """
+        self.results.append((sent - self.started, time.monotonic() - sent, outcome))
+
+
+async def send(session: ClientSession, url: str, payload: str, recorder: Recorder, sent: float) -> None:
+    """
+    Отправить один запрос /compute и записать результат.
+
+    :param session: ClientSession, сессия.
+    :param url: str, адрес балансера.
+    :param payload: str, payload запроса.
+    :param recorder: Recorder, куда записать результат.
+    :param sent: float, когда запрос должен был уйти (time.monotonic()) - от этого момента считается задержка.
+    :return: None
+    """
+    try:
+        async with session.post(f"{url}/compute", json={"payload": payload}) as response:
+            await response.read()
+            recorder.record(sent, str(response.status))
+    except (ClientError, asyncio.TimeoutError) as e:
+        recorder.record(sent, type(e).__name__)
+
+
+async def open_loop(session: ClientSession, urls: List[str], rate: float, duration: float,
+                    recorder: Recorder) -> None:
+    """
+    Нагрузка с фиксированной интенсивностью: rate запросов в секунду независимо от того, успевает ли балансер.
+    Задержка считается от запланированного момента отправки, поэтому отставание самого генератора
+    тоже попадает в задержку, а не прячется (coordinated omission).
+
+    :param session: ClientSession, сессия.
+    :param urls: List[str], адреса реплик балансера, запросы раздаются им по очереди.
+    :param rate: float, запросов в секунду.
+    :param duration: float, длительность нагрузки в секундах.
+    :param recorder: Recorder, куда записывать результаты.
+    :return: None
+    """
+    in_flight: Set[asyncio.Task] = set()
+    started = time.monotonic()
+    total = int(rate * duration)
+    for number in range(total):
+        planned = started + number / rate
+        delay = planned - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        request = asyncio.create_task(send(session, urls[number % len(urls)], f"bench-{number}", recorder, planned))
+        in_flight.add(request)
+        request.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+async def closed_loop(session: ClientSession, urls: List[str], concurrency: int, duration: float,
+                      recorder: Recorder) -> None:
+    """
+    Нагрузка с фиксированным числом клиентов: каждый отправляет следующий запрос, как только получил ответ.
+
+    :param session: ClientSession, сессия.
+    :param urls: List[str], адреса реплик балансера, клиенты распределяются по ним по очереди.
+    :param concurrency: int, число клиентов.
+    :param duration: float, длительность нагрузки в секундах.
+    :param recorder: Recorder, куда записывать результаты.
+    :return: None
+    """
+    deadline = time.monotonic() + duration
+
+    async def client(index: int) -> None:
+        number = 0
+        url = urls[index % len(urls)]
+        while time.monotonic() < deadline:
+            await send(session, url, f"bench-{index}-{number}", recorder, time.monotonic())
+            number += 1
+
+    await asyncio.gather(*(client(index) for index in range(concurrency)))
+
+
+async def sample_connections(session: ClientSession, url: str, interval: float, recorder: Recorder,
+                             series: Dict[str, List[Tuple[float, int]]]) -> None:
+    """
+    Бесконечно опрашивает GET /workers балансера и складывает число подключений к каждому воркеру
+    (вместе с подключениями других реплик).
+
+    :param session: ClientSession, сессия.
+    :param url: str, адрес балансера.
+    :param interval: float, интервал опроса в секундах.
+    :param recorder: Recorder, от начала его нагрузки считается время.
+    :param series: Dict[str, List[Tuple[float, int]]], куда складывать пары (время, число подключений)
+        по адресу воркера.
+    :return: None
+    """
+    timeout = ClientTimeout(total=interval * 4)
+    while True:
+        moment = time.monotonic() - recorder.started
+        try:
+            async with session.get(f"{url}/workers", timeout=timeout) as response:
+                for worker in (await response.json())["workers"]:
+                    series.setdefault(worker["address"], []).append(
+                        (round(moment, 3), worker["number_of_connections"] + worker["peer_connections"]))
+        except (ClientError, asyncio.TimeoutError, ValueError, KeyError):
+            pass  # noqa
+        await asyncio.sleep(interval)
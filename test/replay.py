@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+import time
+from typing import Any, Dict, IO, Iterator, List, Optional, Set, Tuple
+
+from aiohttp import ClientSession, ClientError, ClientTimeout, TCPConnector
+
+from cluster import Cluster
+from report import summarize
+
+
+class Record:
+    """
+    Запрос из журнала трафика: строка JSONL вида {"timestamp": 1697040000.25, "payload": "...", "path": "/compute"}.
+    timestamp - unix-время в секундах или строка ISO 8601, path необязателен (по умолчанию /compute).
+    """
+    __slots__ = ("line", "timestamp", "path", "body")
+
+    line: int
+    timestamp: float
+    path: str
+    body: Dict[str, Any]
+
+    def __init__(self, line: int, timestamp: float, path: str, body: Dict[str, Any]):
+        self.line = line
+        self.timestamp = timestamp
+        self.path = path
+        self.body = body
+
+
+def parse_timestamp(value: Any) -> float:
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+def read_records(log: IO[str]) -> Iterator[Record]:
+    """
+    Читает журнал построчно, не загружая его в память целиком. Пустые строки пропускаются,
+    битые - пропускаются с предупреждением.
+
+    :param log: IO[str], журнал.
+    :return: Iterator[Record]
+    """
+    for line, text in enumerate(log, start=1):
+        if not text.strip():
+            continue
+        try:
+            data = json.loads(text)
+            yield Record(line, parse_timestamp(data["timestamp"]), data.get("path", "/compute"),
+                         {"payload": data["payload"]})
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Skipping line {line}: {e}", file=sys.stderr)
+
+
+async def replay(session: ClientSession, url: str, records: Iterator[Record], speedup: float, concurrency: int,
+                 output: Optional[IO[str]]) -> List[Tuple[float, float, str]]:
+    """
+    Воспроизводит журнал: запрос уходит через (timestamp - timestamp первого запроса) / speedup секунд после начала.
+    Одновременно в полете не больше concurrency запросов; если лимит занят, запрос ждет и уходит позже
+    (отставание записывается в lag). Журнал читается по мере воспроизведения.
+
+    :param session: ClientSession, сессия.
+    :param url: str, адрес балансера.
+    :param records: Iterator[Record], запросы.
+    :param speedup: float, во сколько раз сжать время между запросами, 0 - не ждать вовсе.
+    :param concurrency: int, максимальное число запросов в полете.
+    :param output: Optional[IO[str]], куда писать результат каждого запроса (JSONL).
+    :return: List[Tuple[float, float, str]], тройки (момент отправки от начала, задержка, исход) - см. report.summarize.
+    """
+    results: List[Tuple[float, float, str]] = []
+    in_flight: Set[asyncio.Task] = set()
+    slots = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+    first: Optional[float] = None
+
+    async def send(record: Record, scheduled: float) -> None:
+        sent = time.monotonic()
+        try:
+            async with session.post(f"{url}{record.path}", json=record.body) as response:
+                await response.read()
+                outcome = str(response.status)
+        except (ClientError, asyncio.TimeoutError) as e:
+            outcome = type(e).__name__
+        finally:
+            slots.release()
+        latency = time.monotonic() - sent
+        results.append((sent - started, latency, outcome))
+        if output is not None:
+            output.write(json.dumps({"line": record.line, "scheduled": round(scheduled - started, 6),
+                                     "lag": round(sent - scheduled, 6), "latency": round(latency, 6),
+                                     "status": outcome}) + "\n")
+
+    for record in records:
+        if first is None:
+            first = record.timestamp
+        scheduled = started + (record.timestamp - first) / speedup if speedup > 0 else time.monotonic()
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+        request = asyncio.create_task(send(record, scheduled))
+        in_flight.add(request)
+        request.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return results
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    cluster = None
+    url = args.url
+    if url is None:
+        cluster = Cluster(workers=args.workers, computation_time=args.computation_time,
+                          balancer_port=args.balancer_port, worker_port=args.worker_port, processes=args.processes,
+                          strategy=args.strategy)
+        print(f"Starting {args.workers} workers and balancer, logs in {cluster.log_dir}", file=sys.stderr)
+        await cluster.start()
+        url = cluster.url
+    output = open(args.output, "w") if args.output is not None else None
+    started = time.monotonic()
+    try:
+        with open(args.log) as log:
+            async with ClientSession(connector=TCPConnector(limit=0),
+                                     timeout=ClientTimeout(total=args.timeout)) as session:
+                results = await replay(session, url, read_records(log), args.speedup, args.concurrency, output)
+    finally:
+        if output is not None:
+            output.close()
+        if cluster is not None:
+            cluster.stop()
+    return summarize(results, 0, time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Replay a JSONL traffic log against the balancer.")
+    arg_parser.add_argument('log', type=str, help="JSONL log: {\"timestamp\": ..., \"payload\": ...} per line")
+    arg_parser.add_argument('--url', type=str, default=None,
+                            help="balancer to replay against; without it a local cluster is started")
+    arg_parser.add_argument('--speedup', type=float, default=1.0, help="time compression factor, 0 - no delays")
+    arg_parser.add_argument('--concurrency', type=int, default=1000, help="max requests in flight")
+    arg_parser.add_argument('--timeout', type=float, default=60, help="client timeout of one request")
+    arg_parser.add_argument('--output', type=str, default=None, help="per-request results (JSONL)")
+    arg_parser.add_argument('--workers', type=int, default=5)
+    arg_parser.add_argument('--computation-time', type=float, default=0.05)
+    arg_parser.add_argument('--processes', type=int, default=1)
+    arg_parser.add_argument('--strategy', type=str, default="least_connections")
+    arg_parser.add_argument('--balancer-port', type=int, default=8000)
+    arg_parser.add_argument('--worker-port', type=int, default=8001)
+    print(json.dumps(asyncio.run(main(arg_parser.parse_args())), indent=2))
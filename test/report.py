@@ -0,0 +1,70 @@
+import math
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+PERCENTILES: Dict[str, float] = {"p50": 50, "p95": 95, "p99": 99, "p999": 99.9}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Перцентиль по методу nearest-rank.
+
+    :param values: List[float], отсортированные значения.
+    :param q: float, перцентиль от 0 до 100.
+    :return: float, 0 - если значений нет.
+    """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def summarize(results: List[Tuple[float, float, str]], warmup: float, duration: float) -> Dict[str, Any]:
+    """
+    Сводка по результатам запросов: пропускная способность, перцентили задержки успешных запросов, ошибки.
+    Запросы, отправленные в первые warmup секунд, не учитываются.
+
+    :param results: List[Tuple[float, float, str]], тройки (момент отправки, задержка, исход) - см. load.Recorder.
+    :param warmup: float, длительность прогрева в секундах.
+    :param duration: float, длительность нагрузки в секундах (вместе с прогревом).
+    :return: Dict[str, Any]
+    """
+    measured = [result for result in results if result[0] >= warmup]
+    latencies = sorted(latency for _, latency, outcome in measured if outcome == "200")
+    outcomes = Counter(outcome for _, _, outcome in measured)
+    errors = {outcome: count for outcome, count in outcomes.items() if outcome != "200"}
+    window = max(duration - warmup, 1e-9)
+    return {
+        "requests": len(measured),
+        "succeeded": len(latencies),
+        "throughput": len(latencies) / window,
+        "error_rate": sum(errors.values()) / len(measured) if measured else 0.0,
+        "errors": errors,
+        "latency": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            **{name: percentile(latencies, q) for name, q in PERCENTILES.items()},
+            "max": latencies[-1] if latencies else 0.0,
+        },
+    }
+
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Сравнить сводку с сохраненной: пропускная способность не должна упасть, а задержка и доля ошибок -
+    вырасти больше, чем на tolerance (доля от значения в baseline).
+
+    :param summary: Dict[str, Any], текущая сводка (см. summarize).
+    :param baseline: Dict[str, Any], сохраненная сводка.
+    :param tolerance: float, допустимое ухудшение, например 0.1 - на 10%.
+    :return: List[str], описания регрессий, пустой - если регрессий нет.
+    """
+    regressions = []
+    if summary["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(f"throughput {summary['throughput']:.1f}/s < baseline {baseline['throughput']:.1f}/s")
+    for name in PERCENTILES:
+        current, previous = summary["latency"][name], baseline["latency"][name]
+        if current > previous * (1 + tolerance):
+            regressions.append(f"{name} latency {current * 1000:.1f}ms > baseline {previous * 1000:.1f}ms")
+    # Запас в 0.1 п.п.: единичные ошибки при нулевой доле ошибок в baseline - не регрессия.
+    if summary["error_rate"] > baseline["error_rate"] * (1 + tolerance) + 0.001:
+        regressions.append(f"error rate {summary['error_rate']:.2%} > baseline {baseline['error_rate']:.2%}")
+    return regressions
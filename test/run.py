@@ -1,66 +1,318 @@
+import argparse
 import asyncio
 import json
 import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
 
-from aiohttp import ClientSession
+from aiohttp import ClientSession, ClientError, ClientTimeout, TCPConnector
 
+from cluster import Cluster
+from load import Recorder, open_loop, closed_loop, sample_connections
+from report import summarize, compare
 
-ADDRESS = "http://localhost:8000/compute"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CHECK_POLL_INTERVAL = 0.02
+CHECK_TIMEOUT = 10.0
+PING_COUNT = 50
+PING_LATENCY_LIMIT = 0.01
 
 
-async def send_compute_request(session: ClientSession, payload: str, delay: int):
-    await asyncio.sleep(delay)
-    message = f'{{"payload": "{payload}"}}'
-    response = await session.post(f"{ADDRESS}", json=json.loads(message))
-    return await response.text()
+def parse_event(value: str) -> Tuple[int, float]:
+    """
+    Разбирает событие вида WORKER@SECONDS, например 0@10 - с воркером 0 на 10-й секунде нагрузки.
+
+    :param value: str, событие.
+    :return: Tuple[int, float], номер воркера и время от начала нагрузки в секундах.
+    """
+    try:
+        worker, moment = value.split("@")
+        return int(worker), float(moment)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected WORKER@SECONDS, got '{value}'")
+
+
+async def inject(cluster: Cluster, kills: List[Tuple[int, float]], restarts: List[Tuple[int, float]],
+                 recorder: Recorder, done: List[Dict[str, Any]]) -> None:
+    """
+    Убивает и перезапускает воркеров по расписанию.
+
+    :param cluster: Cluster, кластер.
+    :param kills: List[Tuple[int, float]], когда каких воркеров убить.
+    :param restarts: List[Tuple[int, float]], когда каких воркеров перезапустить.
+    :param recorder: Recorder, от начала его нагрузки считается время.
+    :param done: List[Dict[str, Any]], куда записывать, что и когда было сделано.
+    :return: None
+    """
+    events = sorted([(moment, "kill", worker) for worker, moment in kills] +
+                    [(moment, "restart", worker) for worker, moment in restarts])
+    loop = asyncio.get_running_loop()
+    for moment, action, worker in events:
+        await asyncio.sleep(max(0.0, recorder.started + moment - loop.time()))
+        if action == "kill":
+            cluster.kill_worker(worker)
+        else:
+            cluster.restart_worker(worker)
+        print(f"[{moment:.1f}s] {action} worker {worker} ({cluster.worker_address(worker)})", file=sys.stderr)
+        done.append({"at": moment, "action": action, "worker": cluster.worker_address(worker)})
+
+
+async def fetch_workers(session: ClientSession, url: str) -> Dict[str, Dict[str, Any]]:
+    """
+    GET /workers реплики балансера.
+
+    :param session: ClientSession, сессия.
+    :param url: str, адрес реплики.
+    :return: Dict[str, Dict[str, Any]], воркеры по адресу, пустой словарь - если реплика не ответила.
+    """
+    try:
+        async with session.get(f"{url}/workers") as response:
+            return {worker["address"]: worker for worker in (await response.json())["workers"]}
+    except (ClientError, asyncio.TimeoutError, ValueError, KeyError):
+        return {}
 
 
-async def os_execute(command: str, delay: int):
-    await asyncio.sleep(delay)
-    print(f"Executing '{command}'")
-    os.system(command)
+def peers_converged(states: List[Dict[str, Dict[str, Any]]]) -> bool:
+    """
+    Сошлись ли реплики: у каждой peer_connections воркера равно сумме number_of_connections остальных.
+
+    :param states: List[Dict[str, Dict[str, Any]]], GET /workers каждой реплики (см. fetch_workers).
+    :return: bool
+    """
+    if not all(states):
+        return False
+    for index, state in enumerate(states):
+        for address, worker in state.items():
+            others = sum(other.get(address, {}).get("number_of_connections", 0)
+                         for other_index, other in enumerate(states) if other_index != index)
+            if worker["peer_connections"] != others:
+                return False
+    return True
 
 
-async def main():
+async def check_replication(cluster: Cluster, session: ClientSession) -> Tuple[Dict[str, Any], List[str]]:
     """
-    Достаточными условиями для успешного тестирования при заданных настройках
-    (время выполнения задачи 15сек, 5 воркеров, 1 секунда задержки) будут:
-        1) Ни в один из моментов времени количество подключений у каждого сервера не может быть больше 4
-        2) Нагрузка распределяется линейно, относительно общего числа подключений в момент времени
-        2.1) При отключении воркера, нагрузка перераспределяется между оставшимися
-             (см. AsynchronousBalancer/test/proof3.png)
-        2.2) При повторном подключении воркера, нагрузка распределяется между ним и всеми живыми воркерами
-             (см. AsynchronousBalancer/test/proof4.png)
-
-    P.S.
-    Аргументацию пункта (1) см. в AsynchronousBalancer/test/proof1.png. Учитываем, что есть запросы посылаются
-    и обрабатываются не точно каждую 1 секунду, в связи с чем картинка proof1.png является идеальным примером
-    Least Connections при заданных настройках.
-
-    Также на AsynchronousBalancer/test/proof2.png заметим, что после отключения крайних двух сессий воркер стал
-    самым незагруженным, в связи с чем следующие два подключения отдали ему.
-
-    Недостатком моего решения является то, что с появлением неактивного воркера время распределения задачи увеличивается
-    с AVERAGE_RESPONSE_TIME до HEALTHCHECK_TIMEOUT. Решается это добавлением ручки /register в балансер
-    (что лишает смысла писать для него конфиг), либо Scheduled проверкой воркеров на живучесть и хранением status
-    как свойства balancer.Worker, что тоже имеет свои недостатки(например, некоторые запросы могут пятисотить
-    просто потому, что мы распределили их в неработающий воркер до проверки на хелсчек).
-
-    -----------------------------------------------------------------------------------------------------------
-    В любом случае таймаут = 1 секунде, очевидно, не самое адекватное решение, но в целях демонстрации подойдет.
+    Проверяет обмен состоянием между репликами балансера перед нагрузкой:
+
+    1. В каждую реплику отправляется по таске на воркера через POST /tasks: таска учитывается в нагрузке воркера,
+    пока ее не заберут, так что подключения стоят на месте, и peer_connections каждой реплики должны сойтись
+    с number_of_connections остальных. Потом таски забираются.
+    2. Последний воркер убивается, и в первую реплику сразу отправляется по запросу на воркера: она видит воркера
+    DEAD по неудачной отправке, не дожидаясь проверки (проверки реплик, запущенных одновременно, идут в такт).
+    Остальные реплики должны вывести его из ротации за несколько интервалов обмена. Потом воркер перезапускается.
+
+    :param cluster: Cluster, кластер с несколькими репликами.
+    :param session: ClientSession, сессия.
+    :return: Tuple[Dict[str, Any], List[str]], результат проверки и список провалов.
     """
-    os.system("cd ../")
-    async with ClientSession() as session:
-        tasks = []
-        for i in range(250):
-            if i == 100:
-                tasks.append(os_execute("docker-compose kill -s SIGKILL worker1", delay=i))
-            elif i == 200:
-                tasks.append(os_execute("docker-compose restart worker1", delay=i))
+    result: Dict[str, Any] = {"converged_after": None, "ejection_lag": None}
+    failures = []
+
+    tasks = []
+    for url in cluster.urls:
+        for number in range(cluster.workers):
+            async with session.post(f"{url}/tasks", json={"payload": f"replication-{number}"}) as response:
+                tasks.append((url, (await response.json())["uuid"]))
+    started = time.monotonic()
+    while time.monotonic() - started < CHECK_TIMEOUT:
+        if peers_converged([await fetch_workers(session, url) for url in cluster.urls]):
+            result["converged_after"] = round(time.monotonic() - started, 3)
+            break
+        await asyncio.sleep(CHECK_POLL_INTERVAL)
+    else:
+        failures.append(f"peer_connections of the replicas did not converge in {CHECK_TIMEOUT}s")
+    wait = min(60.0, cluster.computation_time + 1)
+
+    async def collect(url: str, uuid: str) -> None:
+        async with session.get(f"{url}/tasks/{uuid}", params={"wait": wait}) as collected:
+            await collected.read()
+
+    await asyncio.gather(*(collect(url, uuid) for url, uuid in tasks))
+
+    victim = cluster.workers - 1
+    address = cluster.worker_address(victim)
+    bound = 3 * cluster.replication_interval + 0.1
+    if cluster.healthcheck_interval <= bound:
+        print(f"WARNING: healthcheck interval {cluster.healthcheck_interval}s is not longer than the gossip bound "
+              f"{bound:.2f}s, replicas may eject the worker by their own checks", file=sys.stderr)
+    cluster.kill_worker(victim)
+
+    async def probe(number: int) -> None:
+        try:
+            async with session.post(f"{cluster.url}/compute", json={"payload": f"probe-{number}"}) as probed:
+                await probed.read()
+        except (ClientError, asyncio.TimeoutError):
+            pass  # noqa
+
+    probes = asyncio.gather(*(probe(number) for number in range(cluster.workers)))
+    seen: Dict[str, float] = {}
+    deadline = time.monotonic() + cluster.healthcheck_interval * 4 + CHECK_TIMEOUT
+    while len(seen) < cluster.replicas and time.monotonic() < deadline:
+        for url in cluster.urls:
+            if url not in seen and (await fetch_workers(session, url)).get(address, {}).get("status") == 2:
+                seen[url] = time.monotonic()
+        await asyncio.sleep(CHECK_POLL_INTERVAL)
+    await probes
+    if len(seen) < cluster.replicas:
+        failures.append(f"worker {address} was not ejected by {', '.join(set(cluster.urls) - set(seen))}")
+    else:
+        result["ejection_lag"] = round(max(seen.values()) - min(seen.values()), 3)
+        if result["ejection_lag"] > bound:
+            failures.append(f"worker {address} was ejected by the last replica {result['ejection_lag']}s after "
+                            f"the first one (expected at most {bound:.2f}s)")
+    cluster.restart_worker(victim)
+    await cluster.wait_until_ready()
+    return result, failures
+
+
+async def check_keepalive_latency(cluster: Cluster, session: ClientSession) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Проверяет задержку GET /ping по keep-alive соединению перед нагрузкой: запросы идут один за другим,
+    поэтому переиспользуют одно соединение. Ответ балансера на /ping не зависит от воркеров, и медиана
+    должна быть порядка миллисекунды. Заметно больше (около 40 мс) - признак того, что на принятых
+    соединениях не включен TCP_NODELAY (например, у слушающего сокета процессов из --processes).
+
+    :param cluster: Cluster, кластер.
+    :param session: ClientSession, сессия.
+    :return: Tuple[Dict[str, Any], List[str]], медиана задержки по репликам и список провалов.
+    """
+    result: Dict[str, Any] = {}
+    failures = []
+    for url in cluster.urls:
+        latencies = []
+        for _ in range(PING_COUNT):
+            started = time.monotonic()
+            async with session.get(f"{url}/ping") as response:
+                await response.read()
+            latencies.append(time.monotonic() - started)
+        # Первый запрос открывает соединение и в медиану не входит.
+        latencies = sorted(latencies[1:])
+        median = latencies[len(latencies) // 2]
+        result[url] = round(median, 4)
+        if median > PING_LATENCY_LIMIT:
+            failures.append(f"keep-alive /ping latency of {url} is {median * 1000:.1f}ms "
+                            f"(expected at most {PING_LATENCY_LIMIT * 1000:.0f}ms)")
+    return result, failures
+
+
+async def bench(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Поднимает кластер, дает нагрузку и собирает результат.
+
+    :param args: argparse.Namespace, аргументы командной строки.
+    :return: Dict[str, Any], результат (см. README).
+    """
+    cluster = Cluster(workers=args.workers, computation_time=args.computation_time,
+                      balancer_port=args.balancer_port, worker_port=args.worker_port, processes=args.processes,
+                      strategy=args.strategy, healthcheck_interval=args.healthcheck_interval,
+                      replicas=args.replicas, replication_port=args.replication_port)
+    print(f"Starting {args.workers} workers and {args.replicas} balancer replica(s), logs in {cluster.log_dir}",
+          file=sys.stderr)
+    await cluster.start()
+    replication = None
+    keepalive = None
+    try:
+        connector = TCPConnector(limit=0)
+        async with ClientSession(connector=connector, timeout=ClientTimeout(total=args.timeout)) as session:
+            keepalive, failures = await check_keepalive_latency(cluster, session)
+            keepalive = {"ping_p50": keepalive, "failures": failures}
+            if args.replicas > 1:
+                replication, failures = await check_replication(cluster, session)
+                replication["failures"] = failures
+            recorder = Recorder()
+            series: Dict[str, List[Tuple[float, int]]] = {}
+            events: List[Dict[str, Any]] = []
+            sampler = asyncio.create_task(sample_connections(session, cluster.url, args.sample_interval,
+                                                             recorder, series))
+            injector = asyncio.create_task(inject(cluster, args.kill, args.restart, recorder, events))
+            if args.mode == "open":
+                await open_loop(session, cluster.urls, args.rate, args.duration, recorder)
             else:
-                tasks.append(send_compute_request(session=session, payload="test_payload", delay=i))
-        results = await asyncio.gather(*tasks, return_exceptions=False)
-        print(results)
+                await closed_loop(session, cluster.urls, args.concurrency, args.duration, recorder)
+            sampler.cancel()
+            injector.cancel()
+    finally:
+        cluster.stop()
+    result = {
+        "parameters": {name: value for name, value in vars(args).items()
+                       if name not in ("output", "baseline", "save_baseline", "tolerance")},
+        "summary": summarize(recorder.results, args.warmup, args.duration),
+        "events": events,
+        "connections": series,
+    }
+    if keepalive is not None:
+        result["keepalive"] = keepalive
+    if replication is not None:
+        result["replication"] = replication
+    return result
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Benchmark of the balancer on localhost.")
+    arg_parser.add_argument('--workers', type=int, default=5)
+    arg_parser.add_argument('--computation-time', type=float, default=0.05)
+    arg_parser.add_argument('--processes', type=int, default=1)
+    arg_parser.add_argument('--strategy', type=str, default="least_connections")
+    arg_parser.add_argument('--healthcheck-interval', type=float, default=0.5)
+    arg_parser.add_argument('--replicas', type=int, default=1, help="number of balancer replicas")
+    arg_parser.add_argument('--balancer-port', type=int, default=8000)
+    arg_parser.add_argument('--worker-port', type=int, default=None, help="default: right after the replicas")
+    arg_parser.add_argument('--replication-port', type=int, default=9100)
+    arg_parser.add_argument('--mode', choices=("open", "closed"), default="open")
+    arg_parser.add_argument('--rate', type=float, default=200, help="open loop: requests per second")
+    arg_parser.add_argument('--concurrency', type=int, default=50, help="closed loop: number of clients")
+    arg_parser.add_argument('--duration', type=float, default=30)
+    arg_parser.add_argument('--warmup', type=float, default=2, help="seconds excluded from the summary")
+    arg_parser.add_argument('--timeout', type=float, default=60, help="client timeout of one request")
+    arg_parser.add_argument('--kill', type=parse_event, action='append', default=[], metavar="WORKER@SECONDS")
+    arg_parser.add_argument('--restart', type=parse_event, action='append', default=[], metavar="WORKER@SECONDS")
+    arg_parser.add_argument('--sample-interval', type=float, default=0.5)
+    arg_parser.add_argument('--output', type=str, default=None, help="where to write the JSON result")
+    arg_parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE)
+    arg_parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    arg_parser.add_argument('--tolerance', type=float, default=0.1)
+    args = arg_parser.parse_args()
+    if args.worker_port is None:
+        args.worker_port = args.balancer_port + args.replicas
+
+    result = asyncio.run(bench(args))
+    summary = result["summary"]
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump({"parameters": result["parameters"], "summary": summary}, baseline_file, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["parameters"] != result["parameters"]:
+            print("WARNING: baseline was recorded with different parameters, comparison may be meaningless",
+                  file=sys.stderr)
+        result["baseline"] = baseline["summary"]
+        result["regressions"] = compare(summary, baseline["summary"], args.tolerance)
+
+    output = json.dumps(result, indent=2)
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    print(f"throughput {summary['throughput']:.1f}/s, error rate {summary['error_rate']:.2%}, " +
+          ", ".join(f"{name} {value * 1000:.1f}ms" for name, value in summary["latency"].items()), file=sys.stderr)
+    for regression in result.get("regressions", []):
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+    keepalive = result.get("keepalive")
+    if keepalive is not None:
+        for failure in keepalive["failures"]:
+            print(f"LATENCY: {failure}", file=sys.stderr)
+    replication = result.get("replication")
+    if replication is not None:
+        print(f"replicas converged in {replication['converged_after']}s, "
+              f"dead worker ejected by all replicas within {replication['ejection_lag']}s", file=sys.stderr)
+        for failure in replication["failures"]:
+            print(f"REPLICATION: {failure}", file=sys.stderr)
+    failed = (keepalive and keepalive["failures"]) or (replication and replication["failures"])
+    return 1 if result.get("regressions") or failed else 0
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "balancer"))
+
+from balancer import Balancer, Worker  # noqa: E402
+from config import AffinityConfig  # noqa: E402
+from hash_ring import HashRing  # noqa: E402
+from models import WorkerStatus  # noqa: E402
+
+KEYS = [f"key-{number}" for number in range(10000)]
+
+
+def owners(ring: HashRing) -> dict:
+    return {key: next(ring.walk(key)) for key in KEYS}
+
+
+class HashRingTest(unittest.TestCase):
+    """Кольцо детерминированное (blake2b), поэтому доли ключей одинаковы от запуска к запуску."""
+
+    def test_add_moves_about_one_nth(self):
+        ring = HashRing()
+        for index in range(10):
+            ring.add(f"127.0.0.1:{8001 + index}", index)
+        before = owners(ring)
+        ring.add("127.0.0.1:8011", 10)
+        after = owners(ring)
+        moved = [key for key in KEYS if before[key] != after[key]]
+        self.assertAlmostEqual(len(moved) / len(KEYS), 1 / 11, delta=0.03)
+        self.assertTrue(all(after[key] == 10 for key in moved))
+
+    def test_remove_moves_only_its_keys(self):
+        ring = HashRing()
+        for index in range(10):
+            ring.add(f"127.0.0.1:{8001 + index}", index)
+        before = owners(ring)
+        ring.remove("127.0.0.1:8004")
+        after = owners(ring)
+        moved = [key for key in KEYS if before[key] != after[key]]
+        self.assertAlmostEqual(len(moved) / len(KEYS), 1 / 10, delta=0.03)
+        self.assertTrue(all(before[key] == 3 for key in moved))
+
+    def test_walk_visits_each_item_once(self):
+        ring = HashRing(virtual_nodes=10)
+        for index in range(5):
+            ring.add(f"127.0.0.1:{8001 + index}", index)
+        self.assertEqual(sorted(ring.walk("key")), list(range(5)))
+
+
+class SelectAffineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workers = [Worker(f"127.0.0.1:{8001 + index}") for index in range(4)]
+        self.balancer = Balancer(workers=self.workers, affinity=AffinityConfig(enabled=True, load_factor=1.25))
+        for worker in self.workers:
+            worker._set_status(WorkerStatus.IDLE)
+            worker._notify_state_changed()
+
+    def load(self, worker: Worker, connections: int) -> None:
+        worker.number_of_connections = connections
+        worker._notify_state_changed()
+
+    def test_owner_gets_key_under_bound(self):
+        owner, _, _, _ = self.balancer._hash_ring.walk("key")
+        self.assertIs(self.balancer._select_affine("key"), owner)
+
+    def test_spills_to_next_node_at_bound(self):
+        owner, second, third, _ = self.balancer._hash_ring.walk("key")
+        # Граница - ceil(1.25 * (суммарная нагрузка + 1) / 4): при нагрузке 2 - 1, при нагрузке 4 - 2.
+        self.load(owner, 2)
+        self.assertIs(self.balancer._select_affine("key"), second)
+        self.load(second, 2)
+        self.assertIs(self.balancer._select_affine("key"), third)
+        self.load(owner, 0)
+        self.assertIs(self.balancer._select_affine("key"), owner)
+
+
+if __name__ == "__main__":
+    unittest.main()
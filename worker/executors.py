@@ -0,0 +1,153 @@
+import asyncio
+import os
+import threading
+from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Type
+
+from utils import simulate_computation, simulate_cpu_computation, BASE_COMPUTATION_TIME
+
+
+class ComputeExecutor:
+    """Бэкенд, на котором воркер считает таски.
+
+    Расчет, занимающий процессор, нельзя выполнять прямо в event loop: пока он идет, воркер не отвечает
+    ни на /status, ни на другие запросы, и балансер считает его мертвым. Поэтому расчет вынесен за этот интерфейс:
+    asyncio - в самом event loop (для расчетов, которые только ждут), thread - в пуле потоков (для кода,
+    отпускающего GIL: numpy, ввод-вывод), process - в пуле процессов (для расчетов на чистом Python).
+
+    Attributes
+    ----------
+    name : str
+        Имя бэкенда в аргументах командной строки
+    size : int
+        Сколько тасок бэкенд считает одновременно, 0 - без ограничения
+    computation_time : float
+        Время расчета одной таски в секундах
+
+    Methods
+    -------
+    run(self, payload: str) -> float
+        Посчитать таску. Ошибка расчета выбрасывается как есть.
+    close(self) -> None
+        Освободить ресурсы бэкенда (потоки, процессы).
+    """
+    name: str
+    size: int
+    computation_time: float
+
+    def __init__(self, size: int, computation_time: float):
+        self.size = size
+        self.computation_time = computation_time
+
+    @abstractmethod
+    async def run(self, payload: str) -> float: pass  # noqa
+
+    def close(self) -> None:
+        pass  # noqa
+
+
+class AsyncioExecutor(ComputeExecutor):
+    """
+    Расчет в самом event loop. Подходит только для расчетов, которые не занимают процессор.
+    Число одновременных расчетов не ограничено.
+    """
+    name = "asyncio"
+
+    def __init__(self, size: int, computation_time: float):
+        super().__init__(0, computation_time)
+
+    async def run(self, payload: str) -> float:
+        return await simulate_computation(payload, self.computation_time)
+
+
+class ThreadExecutor(ComputeExecutor):
+    """
+    Расчет в пуле из size потоков. Отмененный расчет прерывается по сигналу (threading.Event),
+    который расчет проверяет сам.
+
+    Attributes
+    ----------
+    _pool : ThreadPoolExecutor
+        Пул потоков
+    """
+    name = "thread"
+
+    _pool: ThreadPoolExecutor
+
+    def __init__(self, size: int, computation_time: float):
+        super().__init__(size, computation_time)
+        self._pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="compute")
+
+    async def run(self, payload: str) -> float:
+        cancelled = threading.Event()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool, simulate_cpu_computation, payload, self.computation_time, cancelled)
+        finally:
+            cancelled.set()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessExecutor(ComputeExecutor):
+    """
+    Расчет в пуле из size процессов. Уже начатый расчет в другом процессе прервать нельзя: при отмене таска
+    сразу помечается CANCELLED, а процесс досчитывает ее вхолостую. Если процесс пула упал, пул пересоздается,
+    а таска завершается с ошибкой.
+
+    Attributes
+    ----------
+    _pool : ProcessPoolExecutor
+        Пул процессов
+    """
+    name = "process"
+
+    _pool: ProcessPoolExecutor
+
+    def __init__(self, size: int, computation_time: float):
+        super().__init__(size, computation_time)
+        self._pool = ProcessPoolExecutor(max_workers=size)
+
+    async def run(self, payload: str) -> float:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool, simulate_cpu_computation, payload, self.computation_time)
+        except BrokenProcessPool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = ProcessPoolExecutor(max_workers=self.size)
+            raise
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+EXECUTORS: Dict[str, Type[ComputeExecutor]] = {
+    executor.name: executor for executor in (
+        AsyncioExecutor,
+        ThreadExecutor,
+        ProcessExecutor,
+    )
+}
+
+
+def executor_from_name(name: str, size: Optional[int] = None,
+                       computation_time: float = BASE_COMPUTATION_TIME) -> ComputeExecutor:
+    """
+    Создает бэкенд расчета по имени.
+
+    :param name: str, имя бэкенда (см. EXECUTORS).
+    :param size: Optional[int], размер пула, None - по числу ядер (asyncio размер не использует).
+    :param computation_time: float, время расчета одной таски в секундах.
+    :return: ComputeExecutor
+    """
+    executor = EXECUTORS.get(name)
+    if executor is None:
+        raise ValueError(f"Unknown executor '{name}'! Available: {', '.join(EXECUTORS)}.")
+    if size is None:
+        size = os.cpu_count() or 1
+    if size < 1:
+        raise ValueError("Executor size must be at least 1!")
+    return executor(size, computation_time)
@@ -4,6 +4,8 @@ from pydantic import BaseModel, UUID4
 from pydantic.class_validators import Optional
 from pydantic.validators import IntEnum
 
+from profiling import SamplingProfiler
+
 
 class TaskStatus(IntEnum):
     """
@@ -12,7 +14,8 @@ class TaskStatus(IntEnum):
     CREATED = 0,  # CREATED
     IN_PROGRESS = 1,  # IN_PROGRESS
     DONE = 2,  # DONE
-    ERROR = 3  # ERROR
+    ERROR = 3,  # ERROR
+    CANCELLED = 4  # CANCELLED
 
 
 class TaskRequest(BaseModel):
@@ -57,3 +60,18 @@ class WorkerStatus(IntEnum):
     """
     IDLE = 0,  # IDLE
     BUSY = 1  # BUSY
+
+
+class ProfilerRequest(BaseModel):
+    """
+    Запрос на включение или выключение сэмплирующего профайлера.
+
+    Attributes
+    ----------
+    enabled: bool
+        Включить (стеки предыдущего включения сбрасываются) или выключить профайлер
+    interval: float
+        Интервал сэмплирования в секундах
+    """
+    enabled: bool
+    interval: float = SamplingProfiler.DEFAULT_INTERVAL
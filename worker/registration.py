@@ -0,0 +1,119 @@
+import asyncio
+
+import aiohttp
+from aiohttp import ClientError
+from pydantic.class_validators import Optional
+
+from worker import logger
+
+
+class Registration:
+    """Регистрация воркера в балансере.
+
+    На старте воркер регистрируется через POST /register балансера и затем повторяет регистрацию
+    раз в interval секунд (heartbeat). Регистрация действует 3 * interval секунд, так что балансер
+    выведет воркера из пула, только если пропадут три heartbeat'а подряд. При остановке воркер
+    сам выводит себя из пула через POST /deregister, и балансер дает ему досчитать текущие запросы.
+
+    Attributes
+    ----------
+    balancer_url : str
+        Адрес балансера (http://host:port)
+    address : str
+        Адрес воркера (host:port), по которому до него может достучаться балансер
+    weight : float
+        Вес воркера для взвешенных стратегий
+    max_connections : int
+        Максимальное число единовременных подключений, 0 - без ограничений
+    interval : float
+        Интервал между heartbeat'ами в секундах
+    _session : Optional[aiohttp.ClientSession]
+        Соединение с балансером
+    _heartbeat_task : Optional[asyncio.Task]
+        Фоновая задача heartbeat'ов
+
+    Methods
+    -------
+    start(self) -> None
+        Запустить регистрацию и heartbeat'ы.
+    stop(self) -> None
+        Остановить heartbeat'ы и вывести воркера из пула.
+    """
+    DEFAULT_INTERVAL = 5.0
+    TTL_FACTOR = 3
+    _TIMEOUT = 2
+
+    balancer_url: str
+    address: str
+    weight: float
+    max_connections: int
+    interval: float
+    _session: Optional[aiohttp.ClientSession]
+    _heartbeat_task: Optional[asyncio.Task]
+
+    def __init__(self, balancer_url: str, address: str, weight: float = 1.0, max_connections: int = 0,
+                 interval: float = DEFAULT_INTERVAL):
+        self.balancer_url = balancer_url.rstrip("/")
+        self.address = address
+        self.weight = weight
+        self.max_connections = max_connections
+        self.interval = interval
+        self._session = None
+        self._heartbeat_task = None
+
+    async def start(self) -> None:
+        """
+        Запустить регистрацию и heartbeat'ы. Должен вызываться внутри работающего event loop'а.
+
+        :return: None
+        """
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self._TIMEOUT))
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self) -> None:
+        """
+        Остановить heartbeat'ы и вывести воркера из пула.
+
+        :return: None
+        """
+        if self._heartbeat_task is None:
+            return
+        self._heartbeat_task.cancel()
+        try:
+            await self._heartbeat_task
+        except asyncio.CancelledError:
+            pass  # noqa
+        self._heartbeat_task = None
+        try:
+            async with self._session.post(f"{self.balancer_url}/deregister", json={"address": self.address}):
+                pass
+        except (ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Failed to deregister from balancer {self.balancer_url}: {e!r}")
+        await self._session.close()
+        self._session = None
+
+    async def _heartbeat(self) -> None:
+        """
+        Бесконечный цикл регистрации в балансере. Недоступность балансера не мешает воркеру работать.
+
+        :return: None
+        """
+        registered = False
+        while True:
+            try:
+                async with self._session.post(f"{self.balancer_url}/register",
+                                              json={"address": self.address,
+                                                    "weight": self.weight,
+                                                    "max_connections": self.max_connections,
+                                                    "ttl": self.interval * self.TTL_FACTOR}) as response:
+                    if response.status == 200:
+                        if not registered:
+                            logger.info(f"Registered in balancer {self.balancer_url} as {self.address}.")
+                        registered = True
+                    else:
+                        registered = False
+                        logger.warning(f"Balancer {self.balancer_url} rejected registration: {response.status}.")
+            except (ClientError, asyncio.TimeoutError) as e:
+                registered = False
+                logger.warning(f"Failed to register in balancer {self.balancer_url}: {e!r}")
+            await asyncio.sleep(self.interval)
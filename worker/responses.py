@@ -1,6 +1,10 @@
+import datetime
+
 from pydantic import BaseModel
+from pydantic.class_validators import Optional
 
-from models import WorkerStatus
+from models import WorkerStatus, Task
+from profiling import SamplingProfiler
 
 
 class BaseWorkerResponse(BaseModel):
@@ -23,5 +27,77 @@ class StatusResponse(BaseModel):
     ----------
     status: WorkerStatus
         Статус воркера
+    active: int
+        Сколько тасок сейчас считается
+    queued: int
+        Сколько тасок ждут свободного слота
+    capacity: int
+        Сколько тасок воркер считает одновременно, 0 - без ограничений
+    loop_lag: float
+        Последняя измеренная задержка event loop в секундах
+    compute_time_p95: Optional[float]
+        95-й перцентиль времени расчета последних тасок в секундах, None - если тасок еще не было
+    executor: str
+        Бэкенд расчета (asyncio, thread, process)
     """
     status: WorkerStatus
+    active: int
+    queued: int
+    capacity: int
+    loop_lag: float
+    compute_time_p95: Optional[float]
+    executor: str
+
+
+class BatchItemResponse(BaseModel):
+    """
+    Результат одного запроса из пакетного расчета (одна строка NDJSON).
+
+    Attributes
+    ----------
+    index: int
+        Индекс запроса в пакете
+    task: Task
+        Посчитанная таска
+    """
+    index: int
+    task: Task
+
+
+class ProfilerResponse(BaseModel):
+    """
+    Состояние сэмплирующего профайлера.
+
+    Attributes
+    ----------
+    enabled: bool
+        Включен ли профайлер
+    interval: float
+        Интервал сэмплирования в секундах
+    samples: int
+        Сколько сэмплов снято с последнего включения
+    started: Optional[datetime.datetime]
+        Когда профайлер включили последний раз, None - если не включали
+
+    Methods
+    -------
+    from_profiler(profiler: SamplingProfiler) -> ProfilerResponse
+        возвращает ProfilerResponse по состоянию профайлера.
+    """
+    enabled: bool
+    interval: float
+    samples: int
+    started: Optional[datetime.datetime]
+
+    @staticmethod
+    def from_profiler(profiler: SamplingProfiler) -> 'ProfilerResponse':
+        """
+        Возвращает ProfilerResponse по состоянию профайлера.
+        :param profiler: SamplingProfiler, профайлер
+        :return: ProfilerResponse
+        """
+        return ProfilerResponse(enabled=profiler.enabled,
+                                interval=profiler.interval,
+                                samples=profiler.samples,
+                                started=None if profiler.started is None
+                                else datetime.datetime.fromtimestamp(profiler.started))
@@ -1,17 +1,44 @@
 import asyncio
+import socket
 
 from uvicorn import Config, Server
 
 import views
 import argparse
+from executors import EXECUTORS, executor_from_name
+from registration import Registration
+from worker import Worker
 
 
 async def main():
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('--host', type=str, required=False, default='0.0.0.0')
     arg_parser.add_argument('--port', type=int, required=False, default=8000)
+    arg_parser.add_argument('--task-capacity', type=int, required=False, default=Worker.DEFAULT_TASK_CAPACITY)
+    arg_parser.add_argument('--task-ttl', type=float, required=False, default=Worker.DEFAULT_TASK_TTL)
+    arg_parser.add_argument('--computation-time', type=float, required=False,
+                            default=Worker.DEFAULT_COMPUTATION_TIME)
+    arg_parser.add_argument('--capacity', type=int, required=False, default=Worker.DEFAULT_CAPACITY,
+                            help="tasks computed at once, the rest wait in a queue; 0 - unlimited")
+    arg_parser.add_argument('--executor', type=str, required=False, default="asyncio", choices=list(EXECUTORS),
+                            help="where tasks are computed: asyncio (in the event loop), thread or process pool")
+    arg_parser.add_argument('--executor-size', type=int, required=False, default=None,
+                            help="pool size; default - --capacity if set, else the number of CPU cores")
+    arg_parser.add_argument('--balancer-url', type=str, required=False, default=None)
+    arg_parser.add_argument('--advertise-address', type=str, required=False, default=None)
+    arg_parser.add_argument('--heartbeat-interval', type=float, required=False, default=Registration.DEFAULT_INTERVAL)
+    arg_parser.add_argument('--weight', type=float, required=False, default=1.0)
+    arg_parser.add_argument('--max-connections', type=int, required=False, default=0)
     args = arg_parser.parse_args()
 
+    executor = executor_from_name(args.executor, args.executor_size or args.capacity or None, args.computation_time)
+    views.worker = Worker(task_capacity=args.task_capacity, task_ttl=args.task_ttl,
+                          computation_time=args.computation_time, capacity=args.capacity, executor=executor)
+    if args.balancer_url is not None:
+        address = args.advertise_address or f"{socket.gethostname()}:{args.port}"
+        views.registration = Registration(balancer_url=args.balancer_url, address=address, weight=args.weight,
+                                          max_connections=args.max_connections, interval=args.heartbeat_interval)
+
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     config = Config(app=views.app, loop=loop, port=args.port, host=args.host, reload=False)  # noqa
@@ -19,7 +46,8 @@ async def main():
 
     await asyncio.gather(
         server.serve(),
-        views.get_worker().periodically_log_connections(10)
+        views.get_worker().periodically_log_connections(10),
+        views.get_worker().loop_lag_monitor.run()
     )
 
 
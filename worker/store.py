@@ -0,0 +1,188 @@
+import datetime
+import itertools
+import time
+from collections import OrderedDict
+from typing import Union
+
+from pydantic.annotated_types import Dict
+from pydantic.class_validators import Optional, List
+
+from models import Task, TaskStatus
+
+
+class TaskRecord:
+    """
+    Компактная запись посчитанной таски. Хранится вместо pydantic-модели, чтобы не держать
+    в памяти валидаторы и __dict__ на каждую из тысяч завершенных тасок.
+    """
+    __slots__ = ("uuid", "date", "result", "payload", "status", "accessed")
+
+    uuid: str
+    date: Optional[datetime.datetime]
+    result: Optional[float]
+    payload: str
+    status: TaskStatus
+    accessed: float
+
+    def __init__(self, task: Task, accessed: float):
+        self.uuid = str(task.uuid)
+        self.date = task.date
+        self.result = task.result
+        self.payload = task.payload
+        self.status = task.status
+        self.accessed = accessed
+
+    def to_task(self) -> Task:
+        """
+        Собрать Task из записи (без повторной валидации).
+
+        :return: Task
+        """
+        return Task.construct(uuid=self.uuid, date=self.date, result=self.result,
+                              payload=self.payload, status=self.status)
+
+
+class TaskStore:
+    """Хранилище тасок воркера с ограниченным размером.
+
+    Таски в работе (CREATED, IN_PROGRESS) хранятся как есть и никогда не вытесняются.
+    Посчитанные таски хранятся компактными записями (TaskRecord) в LRU: при превышении
+    capacity вытесняются давно не запрошенные, а записи, к которым не обращались дольше ttl
+    секунд, удаляются. Порядок LRU совпадает с порядком последнего обращения, поэтому
+    вытеснение по ttl - это снятие записей с начала очереди.
+
+    Для выборки по статусу таски дополнительно разложены по статусам (_by_status) и перекладываются
+    при каждой смене статуса, поэтому страница с фильтром по статусу не требует обхода всех тасок.
+    Статусы тасок в работе и посчитанных не пересекаются, так что в каждом статусе тоже сначала идут
+    таски в работе, а затем посчитанные в порядке LRU.
+
+    Attributes
+    ----------
+    capacity : int
+        Максимальное число хранимых посчитанных тасок
+    ttl : float
+        Сколько секунд хранится посчитанная таска после последнего обращения к ней
+    _active : Dict[str, Task]
+        Таски в работе
+    _finished : OrderedDict[str, TaskRecord]
+        Посчитанные таски в порядке последнего обращения
+    _by_status : Dict[TaskStatus, OrderedDict[str, Union[Task, TaskRecord]]]
+        Все таски, разложенные по статусам
+
+    Methods
+    -------
+    add(self, task: Task) -> None
+        Добавить таску в работе.
+    set_status(self, task: Task, status: TaskStatus) -> None
+        Сменить статус таски в работе.
+    finish(self, task: Task) -> None
+        Перенести посчитанную таску в LRU посчитанных.
+    get(self, task_uuid: str) -> Optional[Task]
+        Получить таску.
+    list(self, status: Optional[TaskStatus] = None, offset: int = 0, limit: int = 100) -> List[Task]
+        Получить страницу тасок (сначала в работе, затем посчитанные), опционально - только с заданным статусом.
+    """
+    capacity: int
+    ttl: float
+    _active: Dict[str, Task]
+    _finished: 'OrderedDict[str, TaskRecord]'
+    _by_status: 'Dict[TaskStatus, OrderedDict[str, Union[Task, TaskRecord]]]'
+
+    def __init__(self, capacity: int, ttl: float):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._active = {}
+        self._finished = OrderedDict()
+        self._by_status = {status: OrderedDict() for status in TaskStatus}
+
+    def __len__(self) -> int:
+        return len(self._active) + len(self._finished)
+
+    def add(self, task: Task) -> None:
+        """
+        Добавить таску в работе.
+
+        :param task: Task, таска.
+        :return: None
+        """
+        task_uuid = str(task.uuid)
+        self._active[task_uuid] = task
+        self._by_status[task.status][task_uuid] = task
+
+    def set_status(self, task: Task, status: TaskStatus) -> None:
+        """
+        Сменить статус таски в работе. Статус нужно менять только так, иначе таска останется в выборке
+        по старому статусу.
+
+        :param task: Task, таска.
+        :param status: TaskStatus, новый статус.
+        :return: None
+        """
+        task_uuid = str(task.uuid)
+        self._by_status[task.status].pop(task_uuid, None)
+        task.status = status
+        if task_uuid in self._active:
+            self._by_status[status][task_uuid] = task
+
+    def finish(self, task: Task) -> None:
+        """
+        Перенести посчитанную таску в LRU посчитанных и вытеснить лишние записи.
+
+        :param task: Task, таска.
+        :return: None
+        """
+        task_uuid = str(task.uuid)
+        self._active.pop(task_uuid, None)
+        self._by_status[task.status].pop(task_uuid, None)
+        now = time.monotonic()
+        record = self._finished[task_uuid] = TaskRecord(task, now)
+        self._by_status[record.status][task_uuid] = record
+        self._evict(now)
+
+    def get(self, task_uuid: str) -> Optional[Task]:
+        """
+        Получить таску. Обращение к посчитанной таске продлевает ей жизнь.
+
+        :param task_uuid: str, идентификатор таски.
+        :return: Task, None - если таски нет (или она вытеснена).
+        """
+        task = self._active.get(task_uuid)
+        if task is not None:
+            return task
+        record = self._finished.get(task_uuid)
+        if record is None:
+            return None
+        now = time.monotonic()
+        if now - record.accessed > self.ttl:
+            self._evict(now)
+            return None
+        record.accessed = now
+        self._finished.move_to_end(task_uuid)
+        self._by_status[record.status].move_to_end(task_uuid)
+        return record.to_task()
+
+    def list(self, status: Optional[TaskStatus] = None, offset: int = 0, limit: int = 100) -> List[Task]:
+        """
+        Получить страницу тасок: сначала в работе, затем посчитанные (от давно запрошенных к недавним).
+        Работает за O(offset + limit) и с фильтром по статусу. Обращением к таскам не считается.
+
+        :param status: Optional[TaskStatus], вернуть только таски с этим статусом.
+        :param offset: int, сколько тасок пропустить.
+        :param limit: int, сколько тасок вернуть.
+        :return: List[Task]
+        """
+        self._evict(time.monotonic())
+        if status is None:
+            tasks = itertools.chain(self._active.values(), self._finished.values())
+        else:
+            tasks = self._by_status[status].values()
+        page = itertools.islice(tasks, offset, offset + limit)
+        return [item.to_task() if isinstance(item, TaskRecord) else item for item in page]
+
+    def _evict(self, now: float) -> None:
+        while self._finished:
+            task_uuid, record = next(iter(self._finished.items()))
+            if len(self._finished) <= self.capacity and now - record.accessed <= self.ttl:
+                break
+            self._finished.popitem(last=False)
+            del self._by_status[record.status][task_uuid]
@@ -1,7 +1,9 @@
 import asyncio
-import datetime
+import hashlib
+import threading
+import time
+from typing import Optional
 
-from models import Task, TaskStatus
 import random
 
 BASE_COMPUTATION_TIME = 15
@@ -9,19 +11,38 @@ LOWER_RANDOM_CONSTRAINTS = 0
 UPPER_RANDOM_CONSTRAINTS = 100
 
 
-async def simulate_computation(task: Task, seconds: int = BASE_COMPUTATION_TIME):
-    """
-    Симулирует какие-то расчеты с таской.
+def random_result() -> float:
+    return random.randint(LOWER_RANDOM_CONSTRAINTS, UPPER_RANDOM_CONSTRAINTS) + random.random()
+
 
-    :param task: Task, Таска, с которой надо работать
-    :param seconds: int, Сколько времени будет выполняться симуляция
-    :return: None
+async def simulate_computation(payload: str, seconds: float = BASE_COMPUTATION_TIME) -> float:
     """
-    task.status = TaskStatus.IN_PROGRESS
+    Симулирует какие-то расчеты, не занимая процессор (просто ждет).
 
+    :param payload: str, информация для расчета.
+    :param seconds: float, сколько времени будет выполняться симуляция.
+    :return: float, результат расчета.
+    """
     await asyncio.sleep(seconds)
+    return random_result()
 
-    task.result = random.randint(LOWER_RANDOM_CONSTRAINTS, UPPER_RANDOM_CONSTRAINTS) + random.random()
 
-    task.date = datetime.datetime.now()
-    task.status = TaskStatus.DONE
+def simulate_cpu_computation(payload: str, seconds: float = BASE_COMPUTATION_TIME,
+                             cancelled: Optional[threading.Event] = None) -> float:
+    """
+    Симулирует расчеты, занимающие процессор: seconds секунд хэширует payload. Вызывается в пуле потоков
+    или процессов (см. executors.py), поэтому функция модульная: ее можно передать в другой процесс.
+
+    :param payload: str, информация для расчета.
+    :param seconds: float, сколько времени будет выполняться симуляция.
+    :param cancelled: Optional[threading.Event], сигнал прервать расчет (только для пула потоков), None - не прерывать.
+    :return: float, результат расчета.
+    """
+    deadline = time.monotonic() + seconds
+    digest = payload.encode()
+    while time.monotonic() < deadline:
+        if cancelled is not None and cancelled.is_set():
+            break
+        for _ in range(1000):
+            digest = hashlib.sha256(digest).digest()
+    return random_result()
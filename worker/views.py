@@ -1,23 +1,96 @@
-from fastapi import FastAPI, Depends
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import UUID4
 from pydantic.class_validators import Optional, List
 
-from responses import BaseWorkerResponse, StatusResponse
+import metrics
+from profiling import SamplingProfiler
+from registration import Registration
+from responses import BaseWorkerResponse, StatusResponse, BatchItemResponse, ProfilerResponse
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
-from models import TaskRequest, Task
+from models import TaskRequest, Task, TaskStatus, ProfilerRequest
 from worker import Worker
 
+MAX_WAIT = 60
+MAX_BATCH_SIZE = 10000
+MAX_PAGE_SIZE = 1000
+# Сколько секунд осталось у запроса до дедлайна (выставляет балансер).
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+T = TypeVar('T')
+
 app = FastAPI()
 router = InferringRouter()
 
 worker = Worker()
+registration: Optional[Registration] = None
+profiler = SamplingProfiler()
 
 
 def get_worker() -> Worker:
     return worker
 
 
+def get_profiler() -> SamplingProfiler:
+    return profiler
+
+
+def request_timeout(request: Request) -> Optional[float]:
+    """
+    Таймаут запроса из заголовка X-Request-Timeout.
+
+    :param request: Request, запрос.
+    :return: Optional[float], секунды до дедлайна, None - если заголовка нет.
+    """
+    value = request.headers.get(TIMEOUT_HEADER)
+    if value is None:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        timeout = -1.0
+    if not timeout > 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"{TIMEOUT_HEADER} must be a positive number of seconds!")
+    return timeout
+
+
+async def wait_disconnect(request: Request) -> None:
+    """
+    Дождаться, пока клиент закроет соединение. Тело запроса к этому моменту должно быть прочитано.
+
+    :param request: Request, запрос.
+    :return: None
+    """
+    while (await request.receive())["type"] != "http.disconnect":
+        pass  # noqa
+
+
+async def cancel_on_disconnect(request: Request, coroutine: Awaitable[T]) -> T:
+    """
+    Выполнить coroutine, а если клиент отключится раньше - отменить ее и ответить 499 (ответ уже никто не прочтет).
+
+    :param request: Request, запрос.
+    :param coroutine: Awaitable[T], обработка запроса.
+    :return: T, результат coroutine.
+    """
+    work = asyncio.ensure_future(coroutine)
+    disconnect = asyncio.ensure_future(wait_disconnect(request))
+    try:
+        await asyncio.wait((work, disconnect), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+        if not work.done():
+            work.cancel()
+    if not work.done() or work.cancelled():
+        raise HTTPException(status_code=499, detail="Client closed request!")
+    return work.result()
+
+
 @cbv(router)
 class WorkerView:
     _worker: Worker = Depends(get_worker)
@@ -27,21 +100,108 @@ class WorkerView:
         return BaseWorkerResponse(message="pong")
 
     @router.post("/compute")
-    async def compute(self, task_request: TaskRequest) -> Task:
-        result = await self._worker.compute(task_request)
+    async def compute(self, task_request: TaskRequest, request: Request, response: Response) -> Task:
+        metrics.REQUESTS.inc("compute")
+        try:
+            result = await cancel_on_disconnect(request, self._worker.compute(task_request, request_timeout(request)))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Deadline exceeded!")
+        response.headers.update(self._worker.load_headers())
         return result
 
+    @router.post("/compute/batch", response_class=StreamingResponse)
+    async def compute_batch(self, task_requests: List[TaskRequest]):
+        metrics.REQUESTS.inc("compute_batch")
+        if len(task_requests) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f"Batch size must not exceed {MAX_BATCH_SIZE}!")
+
+        async def stream():
+            async for index, task in self._worker.compute_batch(task_requests):
+                yield BatchItemResponse(index=index, task=task).json() + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
     @router.get("/task/{task_uuid}/")
     async def get_task(self, task_uuid: UUID4) -> Optional[Task]:
-        return self._worker.tasks.get(str(task_uuid), None)
+        return self._worker.tasks.get(str(task_uuid))
 
     @router.get("/task/")
-    async def get_tasks(self) -> List[Task]:
-        return list(self._worker.tasks.values())
+    async def get_tasks(self,
+                        task_status: Optional[TaskStatus] = Query(None, alias="status"),
+                        offset: int = Query(0, ge=0),
+                        limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)) -> List[Task]:
+        return self._worker.tasks.list(status=task_status, offset=offset, limit=limit)
+
+    @router.post("/tasks", status_code=status.HTTP_202_ACCEPTED)
+    async def submit_task(self, task_request: TaskRequest) -> Task:
+        metrics.REQUESTS.inc("submit")
+        return await self._worker.submit(task_request)
+
+    @router.get("/tasks/{task_uuid}")
+    async def wait_task(self, task_uuid: UUID4, wait: float = Query(0, ge=0, le=MAX_WAIT)) -> Task:
+        metrics.REQUESTS.inc("get_task")
+        task = await self._worker.wait_task(str(task_uuid), wait)
+        if task is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found!")
+        return task
+
+    @router.get("/metrics", response_class=PlainTextResponse)
+    async def get_metrics(self):
+        return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    @router.get("/profiler")
+    async def profiler_info(self) -> ProfilerResponse:
+        return ProfilerResponse.from_profiler(get_profiler())
+
+    @router.put("/profiler")
+    async def set_profiler(self, profiler_request: ProfilerRequest) -> ProfilerResponse:
+        if not profiler_request.enabled:
+            get_profiler().stop()
+        else:
+            try:
+                get_profiler().start(profiler_request.interval)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return ProfilerResponse.from_profiler(get_profiler())
+
+    @router.get("/profiler/stacks", response_class=PlainTextResponse)
+    async def profiler_stacks(self):
+        return PlainTextResponse(get_profiler().collapsed())
 
     @router.get("/status")
     async def status(self) -> StatusResponse:
-        return StatusResponse(status=self._worker.status)
+        return StatusResponse(status=self._worker.status,
+                              active=self._worker.active_connections,
+                              queued=self._worker.queued,
+                              capacity=self._worker.capacity,
+                              loop_lag=self._worker.loop_lag,
+                              compute_time_p95=self._worker.compute_time_p95,
+                              executor=self._worker.executor.name)
+
+
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "worker_active_computations", "Tasks currently being computed.", "gauge",
+    lambda: [((), get_worker().active_connections)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "worker_queued_computations", "Tasks waiting for a free computation slot.", "gauge",
+    lambda: [((), get_worker().queued)]))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    "worker_stored_tasks", "Tasks held in the task store.", "gauge",
+    lambda: [((), len(get_worker().tasks))]))
+
+
+@app.on_event("startup")
+async def on_startup():
+    if registration is not None:
+        await registration.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if registration is not None:
+        await registration.stop()
+    get_worker().close()
 
 
 app.include_router(router)
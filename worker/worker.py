@@ -1,12 +1,22 @@
 import asyncio
+import datetime
 import logging
+import math
+import time
 import uuid
 import sys
+from collections import deque
 
 from pydantic.annotated_types import Dict
+from pydantic.class_validators import Optional, Set, List, Tuple
+from typing import AsyncIterator, Deque
 
+import metrics
+from executors import ComputeExecutor, AsyncioExecutor
+from profiling import LoopLagMonitor
 from models import TaskRequest, Task, WorkerStatus, TaskStatus
-from utils import simulate_computation
+from store import TaskStore
+from utils import BASE_COMPUTATION_TIME
 
 formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s')
 handler = logging.StreamHandler(sys.stdout)
@@ -16,47 +26,247 @@ logger = logging.getLogger("Worker")
 logger.setLevel(logging.DEBUG)
 logger.addHandler(handler)
 
+# Заголовки ответа /compute с нагрузкой воркера: балансер обновляет по ним свой индекс загруженности.
+ACTIVE_HEADER = "X-Worker-Active"
+QUEUED_HEADER = "X-Worker-Queued"
+CAPACITY_HEADER = "X-Worker-Capacity"
+
 
 class Worker:
-    _tasks: Dict[str, Task]
+    DEFAULT_TASK_CAPACITY = 10000
+    DEFAULT_TASK_TTL = 3600
+    DEFAULT_COMPUTATION_TIME = BASE_COMPUTATION_TIME
+    DEFAULT_CAPACITY = 0
+    COMPUTE_TIME_WINDOW = 100
+
+    computation_time: float
+    executor: ComputeExecutor
+    capacity: int
+    loop_lag_monitor: LoopLagMonitor
+    _tasks: TaskStore
     _active_connection_num: int
+    _queued_num: int
+    _slots: Optional[asyncio.Semaphore]
+    _compute_times: Deque[float]
+    _done_events: Dict[str, asyncio.Event]
+    _background_computations: Set[asyncio.Task]
 
-    def __init__(self):
-        self._tasks = {}
+    def __init__(self, task_capacity: int = DEFAULT_TASK_CAPACITY, task_ttl: float = DEFAULT_TASK_TTL,
+                 computation_time: float = DEFAULT_COMPUTATION_TIME, capacity: int = DEFAULT_CAPACITY,
+                 executor: Optional[ComputeExecutor] = None):
+        if executor is None:
+            executor = AsyncioExecutor(0, computation_time)
+        if capacity == 0:
+            # Пул считает не больше size тасок одновременно - столько воркер и объявляет балансеру,
+            # а остальные таски видны ему как очередь (X-Worker-Queued), а не как активные.
+            capacity = executor.size
+        self.computation_time = computation_time
+        self.executor = executor
+        self.capacity = capacity
+        self.loop_lag_monitor = LoopLagMonitor(metrics.LOOP_LAG)
+        self._tasks = TaskStore(capacity=task_capacity, ttl=task_ttl)
         self._active_connection_num = 0
+        self._queued_num = 0
+        self._slots = asyncio.Semaphore(capacity) if capacity > 0 else None
+        self._compute_times = deque(maxlen=self.COMPUTE_TIME_WINDOW)
+        self._done_events = {}
+        self._background_computations = set()
 
     @property
-    def tasks(self):
+    def tasks(self) -> TaskStore:
         """
         Получить таски
 
-        :return: Dict[str, Task]
+        :return: TaskStore
         """
         return self._tasks
 
-    async def compute(self, task_request: TaskRequest) -> Task:
+    async def compute(self, task_request: TaskRequest, timeout: Optional[float] = None) -> Task:
         """
-        Запускает расчет запроса. Возвращает посчитанную таску.
+        Запускает расчет запроса. Возвращает посчитанную таску. Если расчет не уложился в timeout
+        или вызывающий отменил ожидание, расчет прерывается, а таска остается в хранилище со статусом CANCELLED.
 
         :param task_request: TaskRequest, запрос на расчет.
+        :param timeout: Optional[float], сколько секунд ждать расчета, None - без ограничения.
         :return: Task
+        :raises asyncio.TimeoutError: если расчет не уложился в timeout.
+        """
+        task = self._create_task(task_request)
+        await asyncio.wait_for(self._compute_task(task), timeout)
+        return task
+
+    async def compute_batch(self, task_requests: List[TaskRequest]) -> AsyncIterator[Tuple[int, Task]]:
+        """
+        Запускает расчет всех запросов одновременно и отдает таски по мере готовности.
+        Если генератор закрыт досрочно (клиент ушел), недосчитанные расчеты отменяются.
+
+        :param task_requests: List[TaskRequest], запросы на расчет.
+        :return: AsyncIterator[Tuple[int, Task]], пары (индекс запроса в task_requests, посчитанная таска)
+        """
+        async def compute_one(index: int, task_request: TaskRequest) -> Tuple[int, Task]:
+            return index, await self.compute(task_request)
+
+        computations = [asyncio.create_task(compute_one(index, task_request))
+                        for index, task_request in enumerate(task_requests)]
+        try:
+            for computation in asyncio.as_completed(computations):
+                yield await computation
+        finally:
+            for computation in computations:
+                computation.cancel()
+
+    async def submit(self, task_request: TaskRequest) -> Task:
+        """
+        Запускает расчет запроса в фоне. Возвращает таску сразу, не дожидаясь расчета.
+
+        :param task_request: TaskRequest, запрос на расчет.
+        :return: Task
+        """
+        task = self._create_task(task_request)
+        computation = asyncio.create_task(self._compute_task(task))
+        self._background_computations.add(computation)
+        computation.add_done_callback(self._background_computations.discard)
+        return task
+
+    async def wait_task(self, task_uuid: str, timeout: float = 0) -> Optional[Task]:
+        """
+        Получить таску, дождавшись окончания расчета, но не дольше timeout секунд (long-poll).
+
+        :param task_uuid: str, идентификатор таски.
+        :param timeout: float, сколько секунд ждать окончания расчета, 0 - не ждать.
+        :return: Task, None - если таски с таким идентификатором нет.
         """
-        self._active_connection_num += 1
-        logger.info(f"Active connections: {self._active_connection_num}.")
+        task = self._tasks.get(task_uuid)
+        if task is None:
+            return None
+        done = self._done_events.get(task_uuid)
+        if done is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass  # noqa
+        return task
+
+    def _create_task(self, task_request: TaskRequest) -> Task:
+        """
+        Создает и регистрирует таску для запроса.
 
+        :param task_request: TaskRequest, запрос на расчет.
+        :return: Task
+        """
         task = Task(uuid=uuid.uuid4(),
                     payload=task_request.payload,
                     status=TaskStatus.CREATED)
-        self._tasks[str(task.uuid)] = task
+        self._tasks.add(task)
+        self._done_events[str(task.uuid)] = asyncio.Event()
+        return task
 
-        logger.info(f"Computation for task {task.uuid} started!")
-        await simulate_computation(task)
-        logger.info(f"Computation for task {task.uuid} done!")
+    async def _compute_task(self, task: Task) -> None:
+        """
+        Считает таску, учитывая ее как активное подключение, и будит ожидающих ее окончания.
+        Если одновременно считается capacity тасок, таска ждет своей очереди (CREATED).
+        Считает таску executor; ошибка расчета не выбрасывается, а помечает таску ERROR.
+        При отмене расчета таска помечается CANCELLED, и подключение сразу освобождается.
 
-        self._active_connection_num -= 1
-        logger.info(f"Active connections: {self._active_connection_num}.")
+        :param task: Task, таска.
+        :return: None
+        """
+        started = None
+        self._queued_num += 1
+        try:
+            if self._slots is not None:
+                await self._slots.acquire()
+            self._queued_num -= 1
+            self._active_connection_num += 1
+            logger.info(f"Active connections: {self._active_connection_num}.")
 
-        return task
+            started = time.monotonic()
+            logger.info(f"Computation for task {task.uuid} started!")
+            self._tasks.set_status(task, TaskStatus.IN_PROGRESS)
+            try:
+                task.result = await self.executor.run(task.payload)
+                self._tasks.set_status(task, TaskStatus.DONE)
+                logger.info(f"Computation for task {task.uuid} done!")
+                metrics.COMPUTED.inc()
+            except Exception as e:
+                self._tasks.set_status(task, TaskStatus.ERROR)
+                logger.error(f"Computation for task {task.uuid} failed: {e!r}")
+                metrics.FAILED.inc()
+            task.date = datetime.datetime.now()
+            self._compute_times.append(time.monotonic() - started)
+        except asyncio.CancelledError:
+            self._tasks.set_status(task, TaskStatus.CANCELLED)
+            logger.info(f"Computation for task {task.uuid} cancelled!")
+            metrics.CANCELLED.inc()
+            raise
+        finally:
+            if started is None:
+                self._queued_num -= 1
+            else:
+                metrics.COMPUTE_DURATION.observe(time.monotonic() - started)
+                self._active_connection_num -= 1
+                if self._slots is not None:
+                    self._slots.release()
+                logger.info(f"Active connections: {self._active_connection_num}.")
+            self._tasks.finish(task)
+            self._done_events.pop(str(task.uuid)).set()
+
+    @property
+    def active_connections(self) -> int:
+        """
+        Получить число таск, которые сейчас считаются
+
+        :return: int
+        """
+        return self._active_connection_num
+
+    @property
+    def queued(self) -> int:
+        """
+        Получить число таск, которые ждут свободного слота (см. capacity)
+
+        :return: int
+        """
+        return self._queued_num
+
+    @property
+    def loop_lag(self) -> float:
+        """
+        Последняя измеренная задержка event loop в секундах (см. loop_lag_monitor)
+
+        :return: float
+        """
+        return self.loop_lag_monitor.lag
+
+    @property
+    def compute_time_p95(self) -> Optional[float]:
+        """
+        95-й перцентиль времени расчета последних COMPUTE_TIME_WINDOW тасок.
+
+        :return: Optional[float], секунды, None - если посчитанных тасок еще не было.
+        """
+        if not self._compute_times:
+            return None
+        times = sorted(self._compute_times)
+        return times[max(0, math.ceil(0.95 * len(times)) - 1)]
+
+    def load_headers(self) -> Dict[str, str]:
+        """
+        Заголовки с текущей нагрузкой воркера для ответа /compute.
+
+        :return: Dict[str, str]
+        """
+        return {ACTIVE_HEADER: str(self._active_connection_num),
+                QUEUED_HEADER: str(self._queued_num),
+                CAPACITY_HEADER: str(self.capacity)}
+
+    def close(self) -> None:
+        """
+        Остановить бэкенд расчета (пулы потоков и процессов).
+
+        :return: None
+        """
+        self.executor.close()
 
     @property
     def status(self):
@@ -72,7 +282,7 @@ class Worker:
 
     async def periodically_log_connections(self, period: int):
         """
-        Логгирует Количество подключений каждые period секунд.
+        Логгирует Количество подключений и задержку event loop каждые period секунд.
 
         :param period: int, промежутки между логами в секундах.
         :return: None
@@ -80,4 +290,5 @@ class Worker:
         logger.info(f"[Scheduled Message] Periodically logging connections every {period} seconds.")
         while True:
             await asyncio.sleep(period)
-            logger.info(f"[Scheduled Message] Active connections: {self._active_connection_num}.")
+            logger.info(f"[Scheduled Message] Active connections: {self._active_connection_num}, "
+                        f"event loop lag: {self.loop_lag * 1000:.1f} ms.")